@@ -1,12 +1,22 @@
+import cProfile
+import io
+import itertools
+import logging
+import marshal
+import pstats
+import time
 from urllib.parse import urlencode
 
 from django.conf import settings
+from django.db import connection
 from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import resolve_url
 from django.utils.http import url_has_allowed_host_and_scheme
 
 SAFE_METHODS = {"GET", "HEAD", "OPTIONS", "TRACE"}
 
+logger = logging.getLogger(__name__)
+
 
 class RequireAuthenticationMiddleware:
     """Enforce authentication for every request that is not explicitly exempt."""
@@ -135,3 +145,113 @@ class RequireAuthenticationMiddleware:
         response = HttpResponse(body, status=403)
         response["WWW-Authenticate"] = "Session"
         return response
+
+
+class RequestProfilingMiddleware:
+    """Run selected requests under cProfile and store the result.
+
+    A request is profiled when a staff user sends the ``X-Profile`` header or
+    the ``_profile`` query flag, or when it falls on the 1-in-N sample set by
+    ``REQUEST_PROFILING_SAMPLE_RATE``. Every other request only pays for a
+    couple of dictionary lookups.
+    """
+
+    HEADER = "HTTP_X_PROFILE"
+    QUERY_FLAG = "_profile"
+    SUMMARY_LINES = 40
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = int(getattr(settings, "REQUEST_PROFILING_SAMPLE_RATE", 0) or 0)
+        self.max_stored = int(getattr(settings, "REQUEST_PROFILING_MAX_STORED", 500) or 0)
+        self._counter = itertools.count(1)
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        return self._profile(request, trigger)
+
+    # ------------------------------------------------------------------
+    # Helper methods
+
+    def _trigger(self, request):
+        meta = request.META
+        # The substring test only spares parsing query strings that cannot
+        # carry the flag; "?not_profile=1" must not match.
+        flagged = self.QUERY_FLAG in meta.get("QUERY_STRING", "") and self.QUERY_FLAG in request.GET
+        if meta.get(self.HEADER) or flagged:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_staff:
+                return "flag"
+        if self.sample_rate and next(self._counter) % self.sample_rate == 0:
+            return "sample"
+        return None
+
+    def _profile(self, request, trigger):
+        query_count = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal query_count
+            query_count += 1
+            return execute(sql, params, many, context)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            profile_id = self._store(request, response, trigger, profiler, duration_ms, query_count)
+        except Exception:  # never fail the request because profiling broke
+            logger.exception("Could not store request profile for %s", request.path)
+        else:
+            response["X-Profile-Id"] = str(profile_id)
+        return response
+
+    def _store(self, request, response, trigger, profiler, duration_ms, query_count):
+        from loans.models import RequestProfile
+
+        profiler.create_stats()
+        stats_data = marshal.dumps(profiler.stats)  # pstats.Stats() empties profiler.stats
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(self.SUMMARY_LINES)
+
+        user = getattr(request, "user", None)
+        profile = RequestProfile.objects.create(
+            method=request.method,
+            path=request.path[:500],
+            query_string=request.META.get("QUERY_STRING", ""),
+            username=user.get_username() if user is not None and user.is_authenticated else "",
+            status_code=getattr(response, "status_code", None),
+            duration_ms=round(duration_ms, 2),
+            query_count=query_count,
+            trigger=trigger,
+            summary=summary.getvalue(),
+            stats_data=stats_data,
+        )
+
+        if self.max_stored:
+            stale_ids = RequestProfile.objects.values_list("id", flat=True)[self.max_stored:]
+            RequestProfile.objects.filter(id__in=list(stale_ids)).delete()
+        return profile.id
+
+
+class TracingMiddleware:
+    """Open a root span per request so view and template spans nest under it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from loans.tracing import span
+
+        with span("http.request", method=request.method, path=request.path) as request_span:
+            response = self.get_response(request)
+            request_span.set_attribute("status_code", response.status_code)
+        return response
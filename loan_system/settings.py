@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.humanize',
     'rest_framework',
+    'rest_framework.authtoken',
     'corsheaders',
     'loans',
 ]
@@ -54,13 +55,16 @@ MIDDLEWARE = [
     'loan_system.middleware.RequireAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'loan_system.middleware.RequestProfilingMiddleware',
+    'loan_system.middleware.TracingMiddleware',
 ]
 
 ROOT_URLCONF = 'loan_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'loans.tracing.TracedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -178,4 +182,61 @@ LOGIN_EXEMPT_URLS = [
 LOGIN_EXEMPT_PATH_PREFIXES = [
     '/static/',
     '/media/',
+    # DRF authenticates these itself (token or session) and returns 401/403.
+    '/api/v2/',
 ]
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Request profiling: staff can profile a request with the X-Profile header or
+# ?_profile=1. A sample rate of N also profiles every Nth request (0 = off).
+REQUEST_PROFILING_SAMPLE_RATE = config('REQUEST_PROFILING_SAMPLE_RATE', default=0, cast=int)
+REQUEST_PROFILING_MAX_STORED = config('REQUEST_PROFILING_MAX_STORED', default=500, cast=int)
+
+# Background jobs (manage.py run_workers): a job's worker holds it for
+# JOB_LEASE_SECONDS, renewed while it runs, before another worker may reclaim
+# it (a job out of attempts is failed instead); failed attempts are
+# retried after JOB_RETRY_BASE_SECONDS * 2^(attempt - 1), capped at the max.
+JOB_LEASE_SECONDS = config('JOB_LEASE_SECONDS', default=900, cast=int)
+JOB_RETRY_BASE_SECONDS = config('JOB_RETRY_BASE_SECONDS', default=10, cast=int)
+JOB_RETRY_MAX_SECONDS = config('JOB_RETRY_MAX_SECONDS', default=3600, cast=int)
+# Periodic tasks (manage.py run_scheduler) with catch_up='skip' still fire an
+# occurrence that is at most this late.
+SCHEDULER_MISFIRE_GRACE_SECONDS = config('SCHEDULER_MISFIRE_GRACE_SECONDS', default=300, cast=int)
+
+# Accounting invoice sync (manage.py dispatch_outbox). Failed sends are retried
+# after ACCOUNTING_SYNC_RETRY_BASE_SECONDS * 2^(attempt - 1), at most
+# ACCOUNTING_SYNC_MAX_ATTEMPTS times.
+ACCOUNTING_SYNC_URL = config('ACCOUNTING_SYNC_URL', default='')
+ACCOUNTING_SYNC_TOKEN = config('ACCOUNTING_SYNC_TOKEN', default='')
+ACCOUNTING_SYNC_TIMEOUT = config('ACCOUNTING_SYNC_TIMEOUT', default=10, cast=int)
+ACCOUNTING_SYNC_BATCH_SIZE = config('ACCOUNTING_SYNC_BATCH_SIZE', default=50, cast=int)
+ACCOUNTING_SYNC_MAX_ATTEMPTS = config('ACCOUNTING_SYNC_MAX_ATTEMPTS', default=8, cast=int)
+ACCOUNTING_SYNC_RETRY_BASE_SECONDS = config('ACCOUNTING_SYNC_RETRY_BASE_SECONDS', default=30, cast=int)
+
+# Cached reports are keyed on the change log, so any logged write to a loan or
+# its rows invalidates them; this bounds their lifetime regardless.
+REPORT_CACHE_SECONDS = config('REPORT_CACHE_SECONDS', default=3600, cast=int)
+
+# API JSON encoder: 'auto' uses orjson when installed, else the stdlib encoder.
+JSON_BACKEND = config('JSON_BACKEND', default='auto')
+
+# Tracing spans: '' disables export, 'jsonl' appends to TRACING_JSONL_PATH,
+# 'otlp' posts to a local OTLP/HTTP collector.
+TRACING_EXPORTER = config('TRACING_EXPORTER', default='')
+TRACING_JSONL_PATH = config('TRACING_JSONL_PATH', default=str(BASE_DIR / 'traces.jsonl'))
+TRACING_OTLP_ENDPOINT = config('TRACING_OTLP_ENDPOINT', default='http://127.0.0.1:4318/v1/traces')
+TRACING_BATCH_SIZE = config('TRACING_BATCH_SIZE', default=256, cast=int)
+TRACING_FLUSH_INTERVAL = config('TRACING_FLUSH_INTERVAL', default=2.0, cast=float)
@@ -23,6 +23,7 @@ from django.shortcuts import redirect
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/v2/', include('loans.api_urls')),
     path('api/', include('loans.urls')),
     path('', lambda request: redirect('/api/loans/'), name='home'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
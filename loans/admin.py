@@ -1,5 +1,13 @@
-from django.contrib import admin
-from django.utils.html import format_html
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.template.response import TemplateResponse
+from django.db.models import Count, F, OuterRef, Subquery
+from django.forms.models import BaseInlineFormSet
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
 from decimal import Decimal
 from .models import (
     Borrower,
@@ -10,8 +18,24 @@ from .models import (
     InterestSchedule,
     PrepaidInterest,
     LoanStatus,
+    BackgroundJob,
+    BackgroundJobRun,
+    PeriodicTask,
+    OutboxMessage,
+    LoanEvent,
 )
 from .prepaid import ensure_prepaid_interest_for_loan
+from .bulk import mark_schedules_posted, set_loan_status
+from .jobs import enqueue
+
+
+class MarkPostedForm(forms.Form):
+    received_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    invoice_prefix = forms.CharField(
+        max_length=50,
+        required=False,
+        help_text='Rows without an invoice number get this prefix followed by the row id.',
+    )
 
 
 class SettlementChargeInline(admin.TabularInline):
@@ -31,9 +55,48 @@ class DrawInline(admin.TabularInline):
     fields = ['draw_number', 'draw_date', 'amount', 'interest_rate', 'invoice_number']
 
 
-class InterestScheduleInline(admin.TabularInline):
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset that only loads one page of related rows."""
+    per_page = 24
+    page_number = 1
+    page_param = 'page'
+    page_obj = None
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            queryset = super().get_queryset()
+            paginator = Paginator(queryset.values_list('pk', flat=True), self.per_page)
+            self.page_obj = paginator.get_page(self.page_number)
+            self._queryset = queryset.filter(pk__in=list(self.page_obj.object_list))
+            # Rows render str(obj), which usually reaches back to the parent.
+            for obj in self._queryset:
+                setattr(obj, self.fk.name, self.instance)
+        return self._queryset
+
+
+class PaginatedTabularInline(admin.TabularInline):
+    """Tabular inline rendering ``per_page`` rows with page links below.
+
+    The page is taken from ``?<page_param>=N`` on the change form URL; the
+    form posts back to the same URL, so saving keeps the same page.
+    """
+    formset = PaginatedInlineFormSet
+    template = 'admin/edit_inline/paginated_tabular.html'
+    per_page = 24
+    page_param = 'page'
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_param = self.page_param
+        formset.page_number = request.GET.get(self.page_param, 1)
+        return formset
+
+
+class InterestScheduleInline(PaginatedTabularInline):
     model = InterestSchedule
     extra = 0
+    page_param = 'schedule_page'
     fields = [
         'period_number',
         'period_type',
@@ -54,10 +117,14 @@ class BorrowerAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'phone', 'loan_count', 'created_at']
     search_fields = ['name', 'email', 'phone']
     list_filter = ['created_at']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(loan_count=Count('loan_cards'))
     
     def loan_count(self, obj):
-        return obj.loan_cards.count()
+        return obj.loan_count
     loan_count.short_description = 'Active Loans'
+    loan_count.admin_order_field = 'loan_count'
 
 
 @admin.register(SettlementChargeType)
@@ -78,6 +145,73 @@ class LoanCardAdmin(admin.ModelAdmin):
                       'monthly_interest_display', 'created_at', 'updated_at']
     
     inlines = [SettlementChargeInline, DrawInline, InterestScheduleInline]
+    actions = ['recompute_settlement_totals', 'recompute_prepaid_balances']
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly = super().get_readonly_fields(request, obj)
+        if obj is None:
+            return readonly
+        # Changed through loan events (status action, loan pages, extensions)
+        # so the history and schedules stay in step.
+        return [*readonly, 'dynamic_status', 'initial_interest_rate', 'maturity_date']
+
+    def get_queryset(self, request):
+        # Also used by autocomplete widgets, which render LoanCard.__str__.
+        return super().get_queryset(request).select_related('borrower', 'dynamic_status')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if not self.has_change_permission(request):
+            return actions
+        # One "set status" action per active status, built per request so
+        # newly configured statuses show up without a deploy.
+        for status in LoanStatus.objects.filter(is_active=True).order_by('order', 'name'):
+            name = f'set_status_{status.code}'
+            actions[name] = (
+                self._make_set_status_action(status),
+                name,
+                f'Set status to {status.name}',
+            )
+        return actions
+
+    @staticmethod
+    def _make_set_status_action(status):
+        def set_status(modeladmin, request, queryset):
+            with transaction.atomic():
+                events = set_loan_status(queryset, status, created_by=request.user.username)
+                if events:
+                    # One background job recomputes the moved loans' schedules.
+                    job = enqueue(
+                        'refresh_schedules',
+                        {
+                            'loan_ids': [event.loan_card_id for event in events],
+                            'from_date': min(event.effective_date for event in events).isoformat(),
+                        },
+                        created_by=request.user.username,
+                    )
+            message = f'Status set to {status.name} on {len(events)} loan(s).'
+            if events:
+                message += f' Queued job #{job.pk} to refresh their schedules.'
+            modeladmin.message_user(request, message, messages.SUCCESS)
+        return set_status
+
+    def _queue_recompute(self, request, queryset, task_name, label):
+        loan_ids = list(queryset.values_list('pk', flat=True))
+        job = enqueue(task_name, {'loan_ids': loan_ids}, created_by=request.user.username)
+        self.message_user(
+            request,
+            f'Queued job #{job.pk} to recompute {label} for {len(loan_ids)} loan(s); '
+            'the job list shows the rows updated once it finishes.',
+            messages.SUCCESS,
+        )
+
+    def recompute_settlement_totals(self, request, queryset):
+        self._queue_recompute(request, queryset, 'recompute_settlement_totals', 'settlement totals')
+    recompute_settlement_totals.short_description = 'Recompute settlement charge totals'
+
+    def recompute_prepaid_balances(self, request, queryset):
+        self._queue_recompute(request, queryset, 'recompute_prepaid_balances', 'prepaid balances')
+    recompute_prepaid_balances.short_description = 'Recompute prepaid interest balances'
     
     fieldsets = (
         ('Basic Information', {
@@ -152,6 +286,8 @@ class DrawAdmin(admin.ModelAdmin):
     list_display = ['loan_card', 'draw_number', 'draw_date', 'amount', 
                     'interest_rate', 'monthly_interest']
     list_filter = ['draw_date']
+    list_select_related = ['loan_card__borrower']
+    autocomplete_fields = ['loan_card']
     search_fields = ['loan_card__card_number', 'invoice_number']
 
 
@@ -167,14 +303,50 @@ class InterestScheduleAdmin(admin.ModelAdmin):
         'payment_source',
     ]
     list_filter = ['is_posted', 'period_type', 'charge_date']
+    list_select_related = ['loan_card__borrower']
+    autocomplete_fields = ['loan_card']
     search_fields = ['loan_card__card_number', 'invoice_number']
     readonly_fields = ['posted_at', 'posted_by']
+    actions = ['mark_posted']
+
+    def mark_posted(self, request, queryset):
+        form = MarkPostedForm(request.POST if 'apply' in request.POST else None)
+        if form.is_bound and form.is_valid():
+            with transaction.atomic():
+                updated = mark_schedules_posted(
+                    queryset,
+                    received_date=form.cleaned_data['received_date'],
+                    invoice_prefix=form.cleaned_data['invoice_prefix'],
+                    posted_by=request.user.get_username(),
+                )
+            skipped = queryset.count() - updated
+            self.message_user(
+                request,
+                f'Posted {updated} schedule row(s); {skipped} already posted.',
+                messages.SUCCESS,
+            )
+            return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Mark selected schedule rows as posted',
+            'opts': self.model._meta,
+            'form': form,
+            'queryset': queryset,
+            'unposted_count': queryset.filter(is_posted=False).count(),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'action_name': 'mark_posted',
+        }
+        return TemplateResponse(request, 'admin/loans/interestschedule/mark_posted.html', context)
+    mark_posted.short_description = 'Mark selected as posted (bank payment)'
 
 
 @admin.register(PrepaidInterest)
 class PrepaidInterestAdmin(admin.ModelAdmin):
     list_display = ['loan_card', 'initial_amount', 'remaining_balance', 'months_remaining']
     readonly_fields = ['initial_amount', 'settlement_charge', 'monthly_amount']
+    list_select_related = ['loan_card__borrower']
+    autocomplete_fields = ['loan_card']
     search_fields = ['loan_card__card_number']
 
     def months_remaining(self, obj):
@@ -187,3 +359,145 @@ class LoanStatusAdmin(admin.ModelAdmin):
     list_display = ['name', 'code', 'color', 'is_active', 'order']
     list_editable = ['color', 'is_active', 'order']
     readonly_fields = ['created_at', 'updated_at']
+
+
+class BackgroundJobRunInline(admin.TabularInline):
+    model = BackgroundJobRun
+    extra = 0
+    can_delete = False
+    fields = ['attempt', 'worker', 'succeeded', 'started_at', 'wait_ms', 'duration_ms', 'query_count']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'id', 'task', 'card_number', 'status', 'attempts', 'result_summary', 'created_by', 'created_at', 'finished_at',
+    ]
+    list_filter = ['status', 'task', 'periodic_task']
+    search_fields = ['card_number', 'task']
+    readonly_fields = [
+        'task', 'params', 'card_number', 'status', 'attempts', 'max_attempts', 'run_after',
+        'locked_until', 'worker', 'result', 'error', 'created_by', 'periodic_task', 'scheduled_for',
+        'created_at', 'started_at', 'finished_at',
+    ]
+    inlines = [BackgroundJobRunInline]
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    def result_summary(self, obj):
+        # Tasks return counts, e.g. {'updated': 12} from the recompute actions.
+        if not isinstance(obj.result, dict):
+            return '-' if obj.result is None else obj.result
+        return ', '.join(f'{key}: {value}' for key, value in obj.result.items()) or '-'
+    result_summary.short_description = 'Result'
+
+    def retry_jobs(self, request, queryset):
+        with transaction.atomic():
+            updated = queryset.filter(status='failed').update(
+                status='queued', max_attempts=F('attempts') + 1, run_after=timezone.now(), finished_at=None,
+            )
+        self.message_user(request, f'Re-queued {updated} failed job(s).', messages.SUCCESS)
+    retry_jobs.short_description = 'Retry failed jobs'
+
+
+@admin.register(PeriodicTask)
+class PeriodicTaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'task', 'cron', 'enabled', 'catch_up', 'next_run_at', 'last_scheduled_for', 'last_run']
+    list_editable = ['enabled']
+    readonly_fields = ['last_scheduled_for', 'next_run_at', 'run_history', 'created_at', 'updated_at']
+
+    def save_model(self, request, obj, form, change):
+        if 'cron' in form.changed_data or 'enabled' in form.changed_data:
+            # The scheduler recomputes it from the current time.
+            obj.next_run_at = None
+        super().save_model(request, obj, form, change)
+
+    def _recent_runs(self, obj, limit):
+        return (
+            BackgroundJobRun.objects.filter(job__periodic_task=obj)
+            .select_related('job')
+            .order_by('-started_at')[:limit]
+        )
+
+    def get_queryset(self, request):
+        latest_run = (
+            BackgroundJobRun.objects.filter(job__periodic_task=OuterRef('pk'))
+            .order_by('-started_at')
+        )
+        return super().get_queryset(request).annotate(
+            last_run_succeeded=Subquery(latest_run.values('succeeded')[:1]),
+            last_run_duration_ms=Subquery(latest_run.values('duration_ms')[:1]),
+        )
+
+    def last_run(self, obj):
+        if obj.last_run_succeeded is None:
+            return '-'
+        outcome = 'ok' if obj.last_run_succeeded else 'failed'
+        return f'{outcome}, {obj.last_run_duration_ms:.2f} ms'
+    last_run.short_description = 'Last run'
+
+    def run_history(self, obj):
+        runs = self._recent_runs(obj, 20) if obj.pk else []
+        if not runs:
+            return 'No runs yet'
+        rows = format_html_join(
+            '',
+            '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{} ms</td></tr>',
+            (
+                (run.job.scheduled_for, run.started_at, run.attempt,
+                 'ok' if run.succeeded else 'failed', run.duration_ms)
+                for run in runs
+            ),
+        )
+        return format_html(
+            '<table><tr><th>Scheduled for</th><th>Started</th><th>Attempt</th><th>Outcome</th>'
+            '<th>Duration</th></tr>{}</table>',
+            rows,
+        )
+    run_history.short_description = 'Recent runs'
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'card_number', 'object_id', 'status', 'attempts', 'invoice_number', 'created_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['card_number', 'idempotency_key', 'invoice_number']
+    readonly_fields = [
+        'kind', 'object_id', 'card_number', 'idempotency_key', 'payload', 'status', 'attempts',
+        'next_attempt_at', 'locked_until', 'last_error', 'invoice_number', 'created_at', 'sent_at',
+    ]
+    actions = ['retry_messages']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_messages(self, request, queryset):
+        updated = queryset.filter(status='failed').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), last_error='',
+        )
+        self.message_user(request, f'Re-queued {updated} failed message(s).', messages.SUCCESS)
+    retry_messages.short_description = 'Retry failed messages'
+
+
+@admin.register(LoanEvent)
+class LoanEventAdmin(admin.ModelAdmin):
+    """Read-only: events are appended through loans.events.record_event."""
+    list_display = ['loan_card', 'kind', 'effective_date', 'status', 'rate', 'maturity_date', 'principal', 'created_by', 'created_at']
+    list_filter = ['kind']
+    search_fields = ['loan_card__card_number']
+    list_select_related = ['loan_card__borrower', 'status']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,72 @@
+"""
+Version 2 REST API (Django REST Framework).
+
+Read-only viewsets with querysets tuned per request: loan lists join the
+borrower and status in the main query and prefetch only the collections
+named in ``?include=``. Lists use cursor pagination, so deep pages cost the
+same as the first. Machine clients authenticate with
+``Authorization: Token <key>``; browser sessions work as well.
+"""
+from django.db.models import Count, Prefetch
+from rest_framework import viewsets
+from rest_framework.pagination import CursorPagination
+
+from .models import Borrower, Draw, InterestSchedule, LoanCard, LoanExtension, SettlementCharge
+from .serializers import (
+    BorrowerSerializer,
+    LoanCardSerializer,
+    requested_includes,
+)
+
+
+class IdCursorPagination(CursorPagination):
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+INCLUDE_PREFETCHES = {
+    'charges': Prefetch(
+        'settlement_charges',
+        queryset=SettlementCharge.objects.select_related('charge_type').order_by('pk'),
+    ),
+    'draws': Prefetch('additional_draws', queryset=Draw.objects.order_by('draw_number')),
+    'extensions': Prefetch('extensions', queryset=LoanExtension.objects.order_by('created_date', 'pk')),
+    'schedules': Prefetch(
+        'interest_schedules',
+        queryset=InterestSchedule.objects.order_by('period_type', 'period_number'),
+    ),
+}
+
+
+class LoanCardViewSet(viewsets.ReadOnlyModelViewSet):
+    """Loans by card number. Filters: ``status``, ``borrower`` (id)."""
+
+    serializer_class = LoanCardSerializer
+    pagination_class = IdCursorPagination
+    lookup_field = 'card_number'
+    lookup_value_regex = '[^/]+'
+
+    def get_queryset(self):
+        queryset = LoanCard.objects.select_related('borrower', 'dynamic_status')
+        includes = requested_includes(self.request)
+        if 'prepaid' in includes:
+            queryset = queryset.select_related('prepaid_interest')
+        prefetches = [INCLUDE_PREFETCHES[name] for name in includes if name in INCLUDE_PREFETCHES]
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+
+        status = self.request.query_params.get('status')
+        if status:
+            queryset = queryset.filter(dynamic_status__code__iexact=status)
+        borrower = self.request.query_params.get('borrower')
+        if borrower and borrower.isdigit():
+            queryset = queryset.filter(borrower_id=borrower)
+        return queryset
+
+
+class BorrowerViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = BorrowerSerializer
+    pagination_class = IdCursorPagination
+    queryset = Borrower.objects.annotate(loan_count=Count('loan_cards'))
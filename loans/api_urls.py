@@ -0,0 +1,9 @@
+from rest_framework.routers import DefaultRouter
+
+from . import api
+
+router = DefaultRouter()
+router.register('loans', api.LoanCardViewSet, basename='v2-loan')
+router.register('borrowers', api.BorrowerViewSet, basename='v2-borrower')
+
+urlpatterns = router.urls
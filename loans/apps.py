@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class LoansConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'loans'
+
+    def ready(self):
+        from . import changes, outbox, schedule
+
+        changes.connect_signals()
+        outbox.connect_signals()
+        schedule.connect_signals()
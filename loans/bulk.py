@@ -0,0 +1,240 @@
+"""
+Set-based bulk operations.
+
+Each helper issues a single UPDATE over the given queryset (no per-object
+``save()``), so model save side effects are intentionally bypassed; the
+denormalised values they would maintain are recomputed in SQL instead, and
+the affected rows are written to the change log explicitly. Callers are
+expected to wrap them in ``transaction.atomic()``.
+"""
+from decimal import Decimal
+
+from django.db.models import (
+    Case,
+    CharField,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, Floor, Greatest, NullIf, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .changes import logged_update, record_changes
+from .events import record_bulk_events
+from .models import InterestSchedule, LoanCard, PrepaidInterest, SettlementCharge
+from .outbox import record_messages
+from .prepaid import PREPAID_CHARGE_NAME
+
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+
+
+def effective_amount_expression(prefix=''):
+    """SQL counterpart of ``InterestSchedule.effective_amount``."""
+    return Coalesce(f'{prefix}adjusted_amount', f'{prefix}calculated_amount', output_field=MONEY)
+
+
+def set_loan_status(loans, status, created_by=''):
+    """Move every loan in ``loans`` to ``status`` from today through
+    :func:`~loans.events.record_bulk_events`; returns the events recorded.
+    Their schedules are not recomputed here (see the ``refresh_schedules``
+    job)."""
+    changed = list(loans.exclude(dynamic_status=status))
+    return record_bulk_events('status', {loan: status for loan in changed}, created_by=created_by)
+
+
+def _settlement_total():
+    charge_totals = (
+        SettlementCharge.objects.filter(loan_card=OuterRef('pk'))
+        .order_by()
+        .values('loan_card')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return Coalesce(Subquery(charge_totals, output_field=MONEY), ZERO)
+
+
+def recompute_settlement_totals(loans):
+    """Recompute ``total_settlement_charges`` (J22) from the charge rows."""
+    return logged_update(loans, total_settlement_charges=_settlement_total())
+
+
+def reconcile_settlement_totals(loans):
+    """Like :func:`recompute_settlement_totals`, but only writes (and logs)
+    the loans whose stored total has drifted from their charges."""
+    drifted = (
+        loans.annotate(expected_total=_settlement_total())
+        .exclude(total_settlement_charges=F('expected_total'))
+        .values_list('pk', flat=True)
+    )
+    return recompute_settlement_totals(LoanCard.objects.filter(pk__in=list(drifted)))
+
+
+def _prepaid_values():
+    """Recomputed ``PrepaidInterest`` columns as expressions over its row."""
+    latest_charge = (
+        SettlementCharge.objects.filter(
+            loan_card=OuterRef('loan_card'),
+            charge_type__name=PREPAID_CHARGE_NAME,
+        )
+        .order_by('-created_at')
+    )
+    prepaid_used = (
+        InterestSchedule.objects.filter(
+            loan_card=OuterRef('loan_card'),
+            is_posted=True,
+            payment_source='prepaid',
+        )
+        .order_by()
+        .values('loan_card')
+        .annotate(total=Sum(effective_amount_expression()))
+        .values('total')
+    )
+    # update() cannot reference joined columns, so the loan terms come in
+    # through a correlated subquery as well.
+    loan_monthly = (
+        LoanCard.objects.filter(pk=OuterRef('loan_card'))
+        .annotate(monthly=ExpressionWrapper(
+            F('first_wired_amount') * F('initial_interest_rate') / Value(12),
+            output_field=MONEY,
+        ))
+        .values('monthly')
+    )
+
+    initial = Coalesce(
+        Subquery(latest_charge.values('amount')[:1], output_field=MONEY),
+        F('initial_amount'),
+    )
+    monthly = Subquery(loan_monthly, output_field=MONEY)
+
+    return {
+        'settlement_charge': Coalesce(
+            Subquery(latest_charge.values('pk')[:1]),
+            F('settlement_charge'),
+        ),
+        'initial_amount': initial,
+        'monthly_amount': monthly,
+        'months_covered': Case(
+            When(GreaterThan(monthly, ZERO), then=Cast(Floor(initial / monthly), IntegerField())),
+            default=Value(0),
+        ),
+        'remaining_balance': Greatest(
+            initial - Coalesce(Subquery(prepaid_used, output_field=MONEY), ZERO),
+            ZERO,
+        ),
+    }
+
+
+def recompute_prepaid_balances(loans):
+    """Rebuild prepaid balances for ``loans`` from their charges and postings.
+
+    ``initial_amount`` follows the latest prepaid interest charge,
+    ``monthly_amount``/``months_covered`` follow the loan's current initial
+    interest, and ``remaining_balance`` is the initial amount less every
+    schedule row posted from the prepaid balance. Only existing
+    ``PrepaidInterest`` rows are updated.
+    """
+    return logged_update(
+        PrepaidInterest.objects.filter(loan_card__in=loans),
+        **_prepaid_values(),
+        updated_at=timezone.now(),
+    )
+
+
+def reconcile_prepaid_balances(loans):
+    """Like :func:`recompute_prepaid_balances`, but only for the loans whose
+    stored prepaid figures differ from the recomputed ones."""
+    values = _prepaid_values()
+    # The stored monthly amount is rounded to cents; compare it that way.
+    values['monthly_amount'] = Round(values['monthly_amount'], 2, output_field=MONEY)
+    drifted = Q()
+    for name in ('initial_amount', 'monthly_amount', 'months_covered', 'remaining_balance'):
+        drifted |= ~Q(**{name: F(f'expected_{name}')})
+    loan_ids = (
+        PrepaidInterest.objects.filter(loan_card__in=loans)
+        .annotate(**{f'expected_{name}': value for name, value in values.items()})
+        .filter(drifted)
+        .values_list('loan_card', flat=True)
+    )
+    return recompute_prepaid_balances(LoanCard.objects.filter(pk__in=list(loan_ids)))
+
+
+def create_missing_prepaid_records(loans):
+    """Insert a placeholder ``PrepaidInterest`` for every loan in ``loans``
+    that has a prepaid interest charge but no record yet.
+
+    Amounts are left at zero; follow with :func:`recompute_prepaid_balances`
+    to fill them in. Returns the number of records created.
+    """
+    latest_charge = (
+        SettlementCharge.objects.filter(
+            loan_card=OuterRef('pk'),
+            charge_type__name=PREPAID_CHARGE_NAME,
+        )
+        .order_by('-created_at')
+        .values('pk')[:1]
+    )
+    missing = list(
+        loans.filter(
+            prepaid_interest__isnull=True,
+            settlement_charges__charge_type__name=PREPAID_CHARGE_NAME,
+        )
+        .annotate(charge_id=Subquery(latest_charge))
+        .values_list('pk', 'card_number', 'charge_id')
+        .distinct()
+    )
+    zero = Decimal('0.00')
+    created = PrepaidInterest.objects.bulk_create([
+        PrepaidInterest(
+            loan_card_id=loan_id,
+            settlement_charge_id=charge_id,
+            initial_amount=zero,
+            remaining_balance=zero,
+            months_covered=0,
+            monthly_amount=zero,
+        )
+        for loan_id, _, charge_id in missing
+    ])
+    card_numbers = {loan_id: card_number for loan_id, card_number, _ in missing}
+    record_changes(
+        PrepaidInterest,
+        [(record.pk, card_numbers[record.loan_card_id]) for record in created],
+        'create',
+    )
+    return len(created)
+
+
+def mark_schedules_posted(schedules, received_date, invoice_prefix='', posted_by=''):
+    """Post every unposted row in ``schedules`` as a bank payment.
+
+    Rows that have no invoice number get ``<invoice_prefix><id>``. The
+    posted rows are queued for accounting sync.
+    """
+    now = timezone.now()
+    generated_invoice = Concat(
+        Value(invoice_prefix),
+        Cast('id', CharField()),
+        output_field=CharField(),
+    )
+    unposted = schedules.filter(is_posted=False)
+    posted_ids = list(unposted.values_list('pk', flat=True))
+    updated = logged_update(
+        InterestSchedule.objects.filter(pk__in=posted_ids, is_posted=False),
+        is_posted=True,
+        received_date=received_date,
+        invoice_number=Coalesce(NullIf('invoice_number', Value('')), generated_invoice),
+        posted_at=now,
+        posted_by=posted_by,
+        payment_source='bank',
+    )
+    record_messages('schedule_posted', list(InterestSchedule.objects.filter(pk__in=posted_ids)))
+    return updated
@@ -0,0 +1,266 @@
+"""
+Append-only change log feeding ``/api/changes/``.
+
+Single-object writes to the tracked models are recorded by ``post_save`` /
+``post_delete`` receivers (connected in ``LoansConfig.ready``). Set-based
+writes bypass those signals, so the helpers here are called explicitly by
+the bulk code paths: :func:`record_changes` after ``bulk_create`` /
+``bulk_update``, and :func:`logged_update` in place of
+``QuerySet.update()``. Entries are written in the same transaction as the
+change they describe.
+
+Entries are compact (model, id, card number, action, changed fields when
+known); clients re-read whatever they need. Ids are assigned at insert
+time, so a slower transaction can commit a lower id after a poller has
+moved past it. On PostgreSQL each entry therefore also stores its writing
+transaction id: the feed is ordered by (transaction, id) and only serves
+entries older than every transaction still in flight
+(``pg_snapshot_xmin``), so anything committed later sorts after the
+cursor. SQLite runs one write transaction at a time, so ids already follow
+commit order there. :func:`compact_changes` keeps
+only the newest entry per object once entries are older than the
+retention window, so a client resuming from an old cursor still sees every
+object that changed, just not every intermediate write.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import (
+    ChangeLogEntry,
+    Draw,
+    InterestSchedule,
+    LoanCard,
+    LoanEvent,
+    LoanExtension,
+    PrepaidInterest,
+    SettlementCharge,
+)
+
+
+TRACKED_MODELS = [LoanCard, SettlementCharge, Draw, LoanExtension, InterestSchedule, PrepaidInterest, LoanEvent]
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+
+def model_key(model):
+    return model._meta.model_name
+
+
+def _card_path(model):
+    return 'card_number' if model is LoanCard else 'loan_card__card_number'
+
+
+def _card_number(instance):
+    if isinstance(instance, LoanCard):
+        return instance.card_number
+    if instance._meta.get_field('loan_card').is_cached(instance):
+        return instance.loan_card.card_number
+    return (
+        LoanCard.objects.filter(pk=instance.loan_card_id)
+        .values_list('card_number', flat=True)
+        .first()
+    ) or ''
+
+
+def record_changes(model, rows, action, fields=()):
+    """Log ``action`` for ``rows``: (object_id, card_number) pairs."""
+    entries = [
+        ChangeLogEntry(
+            model=model_key(model),
+            object_id=object_id,
+            card_number=card_number or '',
+            action=action,
+            fields=','.join(fields),
+        )
+        for object_id, card_number in rows
+    ]
+    ChangeLogEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
+
+
+def record_objects(objs, action, fields=()):
+    """Log ``action`` for saved model instances (e.g. from ``bulk_create``)."""
+    if not objs:
+        return 0
+    return record_changes(
+        type(objs[0]),
+        [(obj.pk, _card_number(obj)) for obj in objs],
+        action,
+        fields,
+    )
+
+
+def logged_update(queryset, **values):
+    """``queryset.update(**values)`` that also logs every affected row."""
+    rows = list(queryset.values_list('pk', _card_path(queryset.model)))
+    updated = queryset.update(**values)
+    if rows:
+        record_changes(queryset.model, rows, 'update', sorted(values))
+    return updated
+
+
+# ----------------------------------------------------------------------
+# Signal receivers
+
+def _changed_fields(instance, update_fields):
+    if update_fields:
+        return sorted(update_fields)
+    # InterestSchedule keeps a snapshot of the loaded row (see from_db);
+    # post_save runs before save() refreshes it.
+    loaded = getattr(instance, '_loaded_values', None)
+    if not loaded:
+        return []
+    return sorted(
+        field.name
+        for field in instance._meta.concrete_fields
+        if field.attname in loaded and loaded[field.attname] != getattr(instance, field.attname)
+    )
+
+
+def _on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    fields = () if created else _changed_fields(instance, update_fields)
+    record_changes(sender, [(instance.pk, _card_number(instance))], 'create' if created else 'update', fields)
+
+
+def _on_delete(sender, instance, **kwargs):
+    record_changes(sender, [(instance.pk, _card_number(instance))], 'delete')
+
+
+def connect_signals():
+    for model in TRACKED_MODELS:
+        uid = f'changelog.{model_key(model)}'
+        post_save.connect(_on_save, sender=model, dispatch_uid=f'{uid}.save')
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f'{uid}.delete')
+
+
+# ----------------------------------------------------------------------
+# Reading and compaction
+
+def parse_cursor(value):
+    """``'<txid>:<id>'`` (a plain id on SQLite, or from before transaction
+    ids were recorded) as a ``(txid, id)`` pair; raises ValueError."""
+    txid, _, entry_id = str(value or '0').rpartition(':')
+    return int(txid or 0), int(entry_id)
+
+
+def format_cursor(txid, entry_id):
+    return f'{txid}:{entry_id}' if txid else str(entry_id)
+
+
+def _feed(since=(0, 0), until=None):
+    """Entries after the ``since`` cursor (up to ``until``, inclusive) that
+    the feed can serve now, in feed order."""
+    since_txid, since_id = since
+    if connection.vendor == 'postgresql':
+        oldest_in_flight = RawSQL('pg_snapshot_xmin(pg_current_snapshot())::text::bigint', [])
+        queryset = (
+            ChangeLogEntry.objects.filter(txid__gte=since_txid, txid__lt=oldest_in_flight)
+            .exclude(txid=since_txid, id__lte=since_id)
+            .order_by('txid', 'id')
+        )
+        if until is not None:
+            queryset = queryset.filter(txid__lte=until[0]).exclude(txid=until[0], id__gt=until[1])
+        return queryset
+    queryset = ChangeLogEntry.objects.filter(id__gt=since_id).order_by('id')
+    if until is not None:
+        queryset = queryset.filter(id__lte=until[1])
+    return queryset
+
+
+def feed_head():
+    """``(txid, id)`` cursor of the newest entry the feed can serve now."""
+    entry = _feed().reverse().only('id', 'txid').first()
+    return (entry.txid or 0, entry.id) if entry else (0, 0)
+
+
+def changed_object_ids(model, since, until):
+    """Ids of ``model`` objects with entries after ``since`` up to
+    ``until``, as a subquery; deleted objects are left out."""
+    return (
+        _feed(since, until)
+        .filter(model=model_key(model))
+        .exclude(action='delete')
+        .order_by()
+        .values('object_id')
+    )
+
+
+def change_page(since=(0, 0), limit=DEFAULT_PAGE_SIZE, models=None, card_number=None):
+    """Return (entries, next_cursor, has_more) for entries after the
+    ``since`` cursor (see :func:`parse_cursor`)."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    since_txid, since_id = since
+    queryset = _feed(since)
+    if models:
+        queryset = queryset.filter(model__in=models)
+    if card_number:
+        queryset = queryset.filter(card_number=card_number)
+    entries = list(queryset[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_cursor = entry_cursor(entries[-1]) if entries else format_cursor(since_txid, since_id)
+    return entries, next_cursor, has_more
+
+
+def entry_cursor(entry):
+    return format_cursor(entry.txid, entry.id)
+
+
+def entry_record(entry):
+    record = {
+        'cursor': entry_cursor(entry),
+        'model': entry.model,
+        'id': entry.object_id,
+        'card_number': entry.card_number,
+        'action': entry.action,
+        'at': entry.changed_at,
+    }
+    if entry.fields:
+        record['fields'] = entry.fields.split(',')
+    return record
+
+
+def latest_change_id():
+    """Id of the newest entry; it grows with every logged write."""
+    return ChangeLogEntry.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def cached_until_change(key, compute):
+    """``compute()`` cached under ``key`` until the next logged write.
+
+    Ids are assigned at insert time, so a write committed with a lower id
+    than one already seen is missed; ``REPORT_CACHE_SECONDS`` bounds how
+    long such a result can be served.
+    """
+    versioned_key = f'{key}:{latest_change_id()}'
+    result = cache.get(versioned_key)
+    if result is None:
+        result = compute()
+        cache.set(versioned_key, result, getattr(settings, 'REPORT_CACHE_SECONDS', 3600))
+    return result
+
+
+def compact_changes(older_than_days=30):
+    """Delete superseded entries older than the cutoff; returns rows deleted."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    latest_ids = (
+        ChangeLogEntry.objects.order_by()
+        .values('model', 'object_id')
+        .annotate(latest=Max('id'))
+        .values('latest')
+    )
+    deleted, _ = (
+        ChangeLogEntry.objects.filter(changed_at__lt=cutoff)
+        .exclude(id__in=latest_ids)
+        .delete()
+    )
+    return deleted
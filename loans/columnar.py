@@ -0,0 +1,260 @@
+"""
+Incremental columnar export of interest schedules and draws for analytics.
+
+Files are written under ``<directory>/<table>/month=YYYY-MM/part-NNNNN.<ext>``
+(Hive-style partitions on the row's charge/draw month) as Parquet or Arrow
+IPC. ``manifest.json`` in the export directory records, per table, the
+high-water mark reached and, per run, the files written with their row
+counts and id ranges.
+
+The high-water mark is a change feed cursor (see :mod:`loans.changes`):
+an incremental run exports the rows with change log entries (created,
+posted or otherwise updated) after the previous cursor, up to the newest
+entry the feed can serve when the run starts. The feed only serves entries
+older than every transaction still in flight, so rows committed during or
+after a run are picked up by the next one instead of being skipped. A row
+can therefore appear in more than one part file, and readers should keep
+the copy with the highest ``export_run``. A full rebuild deletes the
+table's files and exports everything again; a table whose manifest entry
+has no cursor yet is exported in full once, alongside its existing files.
+"""
+import json
+import os
+import shutil
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .changes import changed_object_ids, feed_head, format_cursor, parse_cursor
+from .models import Draw, InterestSchedule
+from .tracing import span
+
+
+DEFAULT_CHUNK_SIZE = 5000
+MANIFEST_NAME = 'manifest.json'
+FORMAT_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+def _schemas():
+    import pyarrow as pa
+
+    money = pa.decimal128(12, 2)
+    return {
+        'interest_schedules': pa.schema([
+            ('id', pa.int64()),
+            ('card_number', pa.string()),
+            ('period_number', pa.int32()),
+            ('period_type', pa.string()),
+            ('charge_date', pa.date32()),
+            ('calculated_amount', money),
+            ('adjusted_amount', money),
+            ('is_posted', pa.bool_()),
+            ('received_date', pa.date32()),
+            ('invoice_number', pa.string()),
+            ('posted_at', pa.timestamp('us', tz='UTC')),
+            ('payment_source', pa.string()),
+            ('export_run', pa.int32()),
+        ]),
+        'draws': pa.schema([
+            ('id', pa.int64()),
+            ('card_number', pa.string()),
+            ('draw_number', pa.int32()),
+            ('draw_date', pa.date32()),
+            ('amount', money),
+            ('interest_rate', pa.decimal128(5, 4)),
+            ('draw_fee', pa.decimal128(10, 2)),
+            ('inspection_fee', pa.decimal128(10, 2)),
+            ('invoice_number', pa.string()),
+            ('created_at', pa.timestamp('us', tz='UTC')),
+            ('export_run', pa.int32()),
+        ]),
+    }
+
+
+# table -> (model, month column, queried fields in schema order)
+TABLES = {
+    'interest_schedules': (
+        InterestSchedule,
+        'charge_date',
+        [
+            'id', 'loan_card__card_number', 'period_number', 'period_type', 'charge_date',
+            'calculated_amount', 'adjusted_amount', 'is_posted', 'received_date',
+            'invoice_number', 'posted_at', 'payment_source',
+        ],
+    ),
+    'draws': (
+        Draw,
+        'draw_date',
+        [
+            'id', 'loan_card__card_number', 'draw_number', 'draw_date', 'amount',
+            'interest_rate', 'draw_fee', 'inspection_fee', 'invoice_number', 'created_at',
+        ],
+    ),
+}
+
+
+# ----------------------------------------------------------------------
+# Manifest
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'last_run': 0, 'tables': {}, 'runs': []}
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=2)
+    os.replace(temp_path, path)
+
+
+# ----------------------------------------------------------------------
+# Writing
+
+class _PartitionWriter:
+    """Buffer rows per month and append them to one file per partition."""
+
+    def __init__(self, directory, table, schema, fmt, run, chunk_size):
+        self.directory = directory
+        self.table = table
+        self.schema = schema
+        self.fmt = fmt
+        self.run = run
+        self.chunk_size = chunk_size
+        self._buffers = defaultdict(list)
+        self._writers = {}
+        self.files = {}
+
+    def add(self, month, row):
+        buffer = self._buffers[month]
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self._flush(month)
+
+    def close(self):
+        for month in list(self._buffers):
+            self._flush(month)
+        for writer in self._writers.values():
+            writer.close()
+        return self.files
+
+    def _flush(self, month):
+        import pyarrow as pa
+
+        rows = self._buffers.pop(month)
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        batch = pa.record_batch(
+            [pa.array(values, type=column.type) for values, column in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        self._writer(month).write_batch(batch)
+        entry = self.files[month]
+        entry['rows'] += len(rows)
+        ids = columns[0]
+        entry['min_id'] = min(entry['min_id'] or min(ids), min(ids))
+        entry['max_id'] = max(entry['max_id'] or 0, max(ids))
+
+    def _writer(self, month):
+        writer = self._writers.get(month)
+        if writer is not None:
+            return writer
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        relative = os.path.join(
+            self.table, f'month={month}', f'part-{self.run:05d}.{FORMAT_EXTENSIONS[self.fmt]}'
+        )
+        path = os.path.join(self.directory, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.fmt == 'parquet':
+            writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        else:
+            writer = pa.ipc.new_file(path, self.schema)
+        self._writers[month] = writer
+        self.files[month] = {'path': relative, 'month': month, 'rows': 0, 'min_id': None, 'max_id': None}
+        return writer
+
+
+def _remove_run_files(directory, table, run):
+    """Drop part files left behind by an earlier failed attempt at ``run``."""
+    table_dir = os.path.join(directory, table)
+    if not os.path.isdir(table_dir):
+        return
+    for partition in os.listdir(table_dir):
+        for extension in FORMAT_EXTENSIONS.values():
+            path = os.path.join(table_dir, partition, f'part-{run:05d}.{extension}')
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def export_tables(directory, tables=None, fmt='parquet', full=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Export ``tables`` into ``directory`` and return the manifest run entry."""
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown format '{fmt}' (use 'parquet' or 'arrow')")
+    tables = list(tables or TABLES)
+    schemas = _schemas()
+    os.makedirs(directory, exist_ok=True)
+
+    manifest = load_manifest(directory)
+    run = manifest['last_run'] + 1
+    started_at = timezone.now()
+    run_entry = {
+        'run': run,
+        'mode': 'full' if full else 'incremental',
+        'format': fmt,
+        'started_at': started_at.isoformat(),
+        'tables': {},
+    }
+
+    for table in tables:
+        model, month_field, fields = TABLES[table]
+        previous = manifest['tables'].get(table, {}) if not full else {}
+        if full:
+            shutil.rmtree(os.path.join(directory, table), ignore_errors=True)
+            manifest['tables'].pop(table, None)
+            manifest['runs'] = [
+                {**entry, 'tables': {name: info for name, info in entry['tables'].items() if name != table}}
+                for entry in manifest['runs']
+            ]
+            # Record the reset now so a failed rebuild restarts from scratch.
+            save_manifest(directory, manifest)
+        else:
+            _remove_run_files(directory, table, run)
+
+        # Fix the cursor before reading: anything logged after it (including
+        # rows committed mid-run) is exported again by the next run.
+        until = feed_head()
+        queryset = model.objects.all()
+        if previous.get('cursor') is not None:
+            since = parse_cursor(previous['cursor'])
+            queryset = queryset.filter(id__in=changed_object_ids(model, since, until))
+        queryset = queryset.order_by(month_field, 'id')
+
+        month_index = fields.index(month_field)
+        writer = _PartitionWriter(directory, table, schemas[table], fmt, run, chunk_size)
+        with span('columnar.export_table', table=table, run=run) as table_span:
+            for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+                writer.add(values[month_index].strftime('%Y-%m'), [*values, run])
+            files = sorted(writer.close().values(), key=lambda entry: entry['month'])
+            table_span.set_attribute('rows', sum(entry['rows'] for entry in files))
+
+        watermark = {'cursor': format_cursor(*until)}
+        manifest['tables'][table] = {**watermark, 'updated_at': timezone.now().isoformat()}
+        run_entry['tables'][table] = {
+            'from': previous or None,
+            'to': watermark,
+            'rows': sum(entry['rows'] for entry in files),
+            'files': files,
+        }
+
+    run_entry['finished_at'] = timezone.now().isoformat()
+    manifest['last_run'] = run
+    manifest['runs'].append(run_entry)
+    save_manifest(directory, manifest)
+    return run_entry
@@ -0,0 +1,209 @@
+"""
+Effective-dated loan history.
+
+Status, rate, maturity and principal changes are appended to
+:class:`~loans.models.LoanEvent` with the date they took effect;
+:func:`record_event` and, for set-based paths (admin actions, imports),
+:func:`record_bulk_events` are the only writers; nothing else updates the
+``LoanCard`` columns below, which keep the value in force today so existing
+readers are unaffected. Principal events
+do not rewrite ``advanced_loan_amount``, the signed amount used by the
+settlement checkpoint; they only change the balance interest accrues on.
+
+:class:`LoanTimeline` answers "what applied on day X" from one query, and
+the schedule generator reads rates, principal and accrual stops from it.
+After an event only the schedule periods from its effective date onward are
+recomputed.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from .changes import logged_update, record_objects
+from .models import LoanCard, LoanEvent
+
+
+# kind -> LoanCard column holding the value in force today
+CURRENT_COLUMNS = {
+    'status': 'dynamic_status',
+    'rate': 'initial_interest_rate',
+    'maturity': 'maturity_date',
+}
+
+
+class LoanTimeline:
+    """A loan's terms over time. Pass ``events`` (ordered by effective date)
+    when they are already loaded."""
+
+    def __init__(self, loan, events=None):
+        if events is None:
+            events = loan.events.select_related('status').order_by('effective_date', 'id')
+        self.loan = loan
+        self._dates = defaultdict(list)
+        self._values = defaultdict(list)
+        for event in events:
+            self._dates[event.kind].append(event.effective_date)
+            self._values[event.kind].append(event.value)
+
+    def _fallback(self, kind):
+        if kind == 'principal':
+            return self.loan.advanced_loan_amount
+        return getattr(self.loan, CURRENT_COLUMNS[kind])
+
+    def value_on(self, kind, day):
+        dates = self._dates.get(kind)
+        if not dates:
+            return self._fallback(kind)
+        index = bisect_right(dates, day)
+        if index == 0:
+            # Before the first event: the baseline (status, rate, maturity)
+            # applies from the start; principal is the advanced amount.
+            return self._fallback(kind) if kind == 'principal' else self._values[kind][0]
+        return self._values[kind][index - 1]
+
+    def rate_on(self, day):
+        return self.value_on('rate', day)
+
+    def principal_on(self, day):
+        return self.value_on('principal', day)
+
+    def status_on(self, day):
+        return self.value_on('status', day)
+
+    def accrues_on(self, day):
+        status = self.status_on(day)
+        return not (status and status.stops_interest_accrual)
+
+    def change_dates(self):
+        """Every date on which some term takes a new value."""
+        return sorted({day for dates in self._dates.values() for day in dates})
+
+    def stop_intervals(self):
+        """``(start, end)`` ranges in which interest does not accrue; ``end``
+        is exclusive, ``None`` for still open."""
+        dates = self._dates.get('status')
+        if not dates:
+            status = self._fallback('status')
+            stopped = status and status.stops_interest_accrual
+            return [(self.loan.first_loan_date, None)] if stopped else []
+        intervals = []
+        start = None
+        for day, status in zip(dates, self._values['status']):
+            stopped = bool(status and status.stops_interest_accrual)
+            if stopped and start is None:
+                start = day
+            elif not stopped and start is not None:
+                intervals.append((start, day))
+                start = None
+        if start is not None:
+            intervals.append((start, None))
+        return intervals
+
+
+def record_event(loan, kind, value, effective_date=None, created_by='', note=''):
+    """Append a ``kind`` change to ``value`` effective ``effective_date``
+    (default today), update the loan's current column and recompute its
+    unposted schedule from that date. Returns the event.
+
+    The first change of a kind also records the loan's value before it,
+    effective from the first loan date, so earlier periods keep it.
+    """
+    # Imported here: the schedule generator reads LoanTimeline from this module.
+    from .schedule import refresh_schedule, schedule_end_date
+
+    today = timezone.localdate()
+    effective_date = effective_date or today
+    if effective_date > today:
+        raise ValueError('Effective date cannot be in the future.')
+    if effective_date < loan.first_loan_date:
+        raise ValueError('Effective date cannot be before the first loan date.')
+
+    with transaction.atomic():
+        # A maturity change may shorten the term; the schedule trims from the old end.
+        previous_end_date = schedule_end_date(loan) if kind == 'maturity' else None
+        if kind in CURRENT_COLUMNS and not loan.events.filter(kind=kind).exists():
+            LoanEvent.objects.create(
+                loan_card=loan,
+                kind=kind,
+                effective_date=loan.first_loan_date,
+                note='Value before the first recorded change',
+                created_by=created_by,
+                **{LoanEvent.VALUE_FIELDS[kind]: getattr(loan, CURRENT_COLUMNS[kind])},
+            )
+        event = LoanEvent.objects.create(
+            loan_card=loan,
+            kind=kind,
+            effective_date=effective_date,
+            note=note,
+            created_by=created_by,
+            **{LoanEvent.VALUE_FIELDS[kind]: value},
+        )
+
+        timeline = LoanTimeline(loan)
+        column = CURRENT_COLUMNS.get(kind)
+        if column and getattr(loan, column) != timeline.value_on(kind, today):
+            setattr(loan, column, timeline.value_on(kind, today))
+            loan.save(update_fields=[column, 'updated_at'])
+
+        refresh_schedule(loan, from_date=effective_date, timeline=timeline, previous_end_date=previous_end_date)
+    return event
+
+
+def record_bulk_events(kind, values, created_by='', note=''):
+    """:func:`record_event` for many loans in a few queries: ``values`` maps
+    each loan to its new ``kind`` value, effective today (from the first
+    loan date for loans that have not started). Updates the loans' current
+    column, in memory too; schedules are left to the caller. Returns the
+    events created."""
+    if not values:
+        return []
+    today = timezone.localdate()
+    column = CURRENT_COLUMNS[kind]
+    value_attname = LoanEvent._meta.get_field(LoanEvent.VALUE_FIELDS[kind]).attname
+    column_field = LoanCard._meta.get_field(column)
+    with_history = set(
+        LoanEvent.objects.filter(loan_card__in=[loan.pk for loan in values], kind=kind)
+        .values_list('loan_card_id', flat=True)
+    )
+
+    baselines = []
+    events = []
+    for loan, value in values.items():
+        if loan.pk not in with_history:
+            baselines.append(LoanEvent(
+                loan_card=loan,
+                kind=kind,
+                effective_date=loan.first_loan_date,
+                note='Value before the first recorded change',
+                created_by=created_by,
+                **{value_attname: getattr(loan, column_field.attname)},
+            ))
+        events.append(LoanEvent(
+            loan_card=loan,
+            kind=kind,
+            effective_date=max(today, loan.first_loan_date),
+            note=note,
+            created_by=created_by,
+            **{LoanEvent.VALUE_FIELDS[kind]: value},
+        ))
+
+    with transaction.atomic():
+        # Baselines first: same-day events apply in id order.
+        record_objects(LoanEvent.objects.bulk_create(baselines), 'create')
+        events = LoanEvent.objects.bulk_create(events)
+        record_objects(events, 'create')
+        column_values = {loan.pk: getattr(event, value_attname) for loan, event in zip(values, events)}
+        logged_update(
+            LoanCard.objects.filter(pk__in=column_values),
+            **{column: Case(
+                *[When(pk=pk, then=Value(value)) for pk, value in column_values.items()],
+                output_field=column_field.target_field if column_field.is_relation else column_field,
+            )},
+            updated_at=timezone.now(),
+        )
+    for loan, value in values.items():
+        setattr(loan, column, value)
+    return events
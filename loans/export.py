@@ -0,0 +1,195 @@
+"""
+Streaming portfolio export.
+
+Loans are read with ``QuerySet.iterator(chunk_size=...)`` (a server-side
+cursor on PostgreSQL) and their related rows are prefetched one chunk at a
+time, so memory stays bounded by the chunk size whatever the size of the
+book. Output is produced incrementally for ``StreamingHttpResponse``.
+
+* NDJSON: one line per loan with nested charges, draws, extensions and
+  interest schedules.
+* CSV: one flat sheet per table (``loans``, ``charges``, ``draws``,
+  ``extensions``, ``schedules``), each row keyed by ``card_number``.
+"""
+import csv
+import io
+
+from django.db.models import Prefetch
+
+from .models import Draw, InterestSchedule, LoanCard, LoanExtension, SettlementCharge
+from .responses import dumps
+
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _money(value):
+    return str(value) if value is not None else None
+
+
+def _day(value):
+    return value.isoformat() if value else None
+
+
+def _status_fields(loan):
+    status_obj = loan.dynamic_status
+    status_code_raw = ''
+    status_display = 'UNKNOWN'
+    if status_obj:
+        status_code_raw = (status_obj.code or '').strip()
+        status_display = (status_obj.name or '').strip() or (status_code_raw or 'UNKNOWN')
+    return {
+        'dynamic_status': status_code_raw or None,
+        'dynamic_status_display': status_display,
+    }
+
+
+def loan_row(loan):
+    return {
+        'card_number': loan.card_number,
+        'borrower': loan.borrower.name,
+        'property_address': loan.property_address,
+        'advanced_loan_amount': _money(loan.advanced_loan_amount),
+        'advanced_loan_invoice': loan.advanced_loan_invoice,
+        'first_wired_amount': _money(loan.first_wired_amount),
+        'total_settlement_charges': _money(loan.total_settlement_charges),
+        'checkpoint': _money(loan.calculate_checkpoint()),
+        'first_loan_date': _day(loan.first_loan_date),
+        'maturity_date': _day(loan.maturity_date),
+        'initial_interest_rate': _money(loan.initial_interest_rate),
+        **_status_fields(loan),
+        'created_at': loan.created_at.isoformat(),
+        'updated_at': loan.updated_at.isoformat(),
+    }
+
+
+def charge_row(charge):
+    return {
+        'charge_type': charge.charge_type.name,
+        'amount': _money(charge.amount),
+        'invoice_number': charge.invoice_number,
+        'notes': charge.notes or '',
+    }
+
+
+def draw_row(draw):
+    return {
+        'draw_number': draw.draw_number,
+        'draw_date': _day(draw.draw_date),
+        'amount': _money(draw.amount),
+        'interest_rate': _money(draw.interest_rate),
+        'draw_fee': _money(draw.draw_fee),
+        'inspection_fee': _money(draw.inspection_fee),
+        'invoice_number': draw.invoice_number,
+    }
+
+
+def extension_row(extension):
+    return {
+        'extension_months': extension.extension_months,
+        'extension_fee': _money(extension.extension_fee),
+        'reason': extension.reason,
+        'created_date': extension.created_date.isoformat(),
+    }
+
+
+def schedule_row(schedule):
+    return {
+        'period_number': schedule.period_number,
+        'period_type': schedule.period_type,
+        'charge_date': _day(schedule.charge_date),
+        'calculated_amount': _money(schedule.calculated_amount),
+        'adjusted_amount': _money(schedule.adjusted_amount),
+        'effective_amount': _money(schedule.effective_amount),
+        'is_posted': schedule.is_posted,
+        'received_date': _day(schedule.received_date),
+        'invoice_number': schedule.invoice_number,
+        'payment_source': schedule.payment_source,
+    }
+
+
+def portfolio_queryset():
+    return (
+        LoanCard.objects.select_related('borrower', 'dynamic_status')
+        .prefetch_related(
+            Prefetch(
+                'settlement_charges',
+                queryset=SettlementCharge.objects.select_related('charge_type').order_by('pk'),
+            ),
+            Prefetch('additional_draws', queryset=Draw.objects.order_by('draw_number')),
+            Prefetch('extensions', queryset=LoanExtension.objects.order_by('created_date', 'pk')),
+            Prefetch(
+                'interest_schedules',
+                queryset=InterestSchedule.objects.order_by('period_type', 'period_number'),
+            ),
+        )
+        .order_by('pk')
+    )
+
+
+def iter_ndjson(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield NDJSON bytes, one chunk of loans per item."""
+    lines = []
+    for loan in portfolio_queryset().iterator(chunk_size=chunk_size):
+        record = loan_row(loan)
+        record['settlement_charges'] = [charge_row(charge) for charge in loan.settlement_charges.all()]
+        record['draws'] = [draw_row(draw) for draw in loan.additional_draws.all()]
+        record['extensions'] = [extension_row(extension) for extension in loan.extensions.all()]
+        record['interest_schedules'] = [schedule_row(schedule) for schedule in loan.interest_schedules.all()]
+        lines.append(dumps(record))
+        if len(lines) >= chunk_size:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+# CSV sheet name -> (queryset, row builder). Child sheets read their own table
+# directly and only join the loan for its card number.
+CSV_TABLES = {
+    'loans': (
+        lambda: LoanCard.objects.select_related('borrower', 'dynamic_status').order_by('pk'),
+        loan_row,
+    ),
+    'charges': (
+        lambda: SettlementCharge.objects.select_related('loan_card', 'charge_type').order_by('loan_card_id', 'pk'),
+        charge_row,
+    ),
+    'draws': (
+        lambda: Draw.objects.select_related('loan_card').order_by('loan_card_id', 'draw_number'),
+        draw_row,
+    ),
+    'extensions': (
+        lambda: LoanExtension.objects.select_related('loan_card').order_by('loan_card_id', 'created_date', 'pk'),
+        extension_row,
+    ),
+    'schedules': (
+        lambda: InterestSchedule.objects.select_related('loan_card').order_by(
+            'loan_card_id', 'period_type', 'period_number'
+        ),
+        schedule_row,
+    ),
+}
+
+
+def iter_csv(table='loans', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield CSV text for one sheet, one chunk of rows per item."""
+    queryset_factory, build_row = CSV_TABLES[table]
+    buffer = io.StringIO()
+    writer = None
+    rows = 0
+    for obj in queryset_factory().iterator(chunk_size=chunk_size):
+        row = build_row(obj)
+        if table != 'loans':
+            row = {'card_number': obj.loan_card.card_number, **row}
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        rows += 1
+        if rows % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
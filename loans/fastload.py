@@ -0,0 +1,275 @@
+"""
+Fast fixture loading.
+
+``loaddata`` saves one object at a time through ``Model.save()``, so every
+settlement charge re-aggregates its loan's totals and every schedule row is
+re-read before writing. This loader streams a fixture (JSON array, JSONL,
+optionally gzipped), buffers deserialized objects per model and writes them
+with multi-row ``INSERT ... ON CONFLICT (pk) DO UPDATE`` statements in
+foreign-key dependency order. Like ``loaddata`` it inserts raw values
+(``auto_now`` timestamps are kept from the fixture), overwrites rows with
+the same primary key, and resets sequences and refreshes planner
+statistics afterwards.
+
+Denormalised values are then rebuilt set-based for every loan the fixture
+touched: ``LoanCard.total_settlement_charges`` and ``PrepaidInterest``.
+"""
+import gzip
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.core.management.color import no_style
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.python import Deserializer as PythonDeserializer
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+
+from .bulk import create_missing_prepaid_records, recompute_prepaid_balances, recompute_settlement_totals
+from .models import LoanCard
+from .tracing import span
+
+
+DEFAULT_CHUNK_SIZE = 2000
+READ_SIZE = 64 * 1024
+
+
+class FixtureFormatError(Exception):
+    """The fixture file is not a JSON array or JSONL stream of objects."""
+
+
+@dataclass
+class LoadReport:
+    counts: dict = field(default_factory=lambda: defaultdict(int))
+    loans_recomputed: int = 0
+    prepaid_created: int = 0
+    seconds: float = 0.0
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+# ----------------------------------------------------------------------
+# Reading
+
+def open_fixture(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def iter_fixture_objects(stream, fmt='json', read_size=READ_SIZE):
+    """Yield the top-level objects of a fixture without loading the whole file."""
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as exc:
+                    raise FixtureFormatError(f'Line {line_number}: {exc}') from exc
+        return
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        data = stream.read(read_size)
+        if not data:
+            eof = True
+        buffer = buffer[position:] + data
+        position = 0
+
+    def next_char():
+        # Skip whitespace, reading more input as needed; '' at end of file.
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if eof:
+                return ''
+            fill()
+
+    if next_char() != '[':
+        raise FixtureFormatError('Fixture must be a JSON array of objects')
+    position += 1
+    expect_item = True
+    empty = True
+    while True:
+        char = next_char()
+        if char == ']' and (empty or not expect_item):
+            return
+        if char == ',' and not expect_item:
+            position += 1
+            expect_item = True
+            continue
+        if char == '' or not expect_item:
+            raise FixtureFormatError('Unterminated or malformed JSON array')
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError as exc:
+                if eof:
+                    raise FixtureFormatError(str(exc)) from exc
+                fill()
+                continue
+            if end == len(buffer) and not eof:
+                # A number or literal may continue past the buffer.
+                fill()
+                continue
+            break
+        position = end
+        expect_item = False
+        empty = False
+        yield item
+
+
+# ----------------------------------------------------------------------
+# Writing
+
+def dependency_order(models):
+    """Order ``models`` so that foreign-key targets come before referrers."""
+    models = list(models)
+    pending = set(models)
+    ordered = []
+
+    def visit(model, trail):
+        if model not in pending or model in trail:
+            return
+        trail.add(model)
+        for model_field in model._meta.concrete_fields:
+            related = model_field.related_model
+            if model_field.is_relation and related is not model:
+                visit(related, trail)
+        pending.discard(model)
+        ordered.append(model)
+
+    for model in models:
+        visit(model, set())
+    return ordered
+
+
+class FixtureLoader:
+    """Stream fixture objects into the database with bulk inserts."""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, recompute=True):
+        self.chunk_size = chunk_size
+        self.recompute = recompute
+        self.report = LoadReport()
+        self._buffers = defaultdict(list)
+        self._buffered = 0
+        self._m2m = []
+        self._loan_ids = set()
+
+    def load(self, paths):
+        started = time.perf_counter()
+        with span('fastload.load', files=len(paths)), transaction.atomic():
+            with connection.constraint_checks_disabled():
+                for path in paths:
+                    fmt = 'jsonl' if path.removesuffix('.gz').endswith('.jsonl') else 'json'
+                    with open_fixture(path) as stream:
+                        self._load_stream(stream, fmt)
+                self._flush()
+                self._apply_m2m()
+            tables = [model._meta.db_table for model in self._loaded_models()]
+            connection.check_constraints(table_names=tables)
+            self._reset_sequences()
+            self._analyze()
+            if self.recompute:
+                self._recompute_loans()
+        self.report.seconds = time.perf_counter() - started
+        return self.report
+
+    def _loaded_models(self):
+        return list(self.report.counts)
+
+    def _load_stream(self, stream, fmt):
+        objects = PythonDeserializer(
+            iter_fixture_objects(stream, fmt),
+            ignorenonexistent=True,
+        )
+        try:
+            for deserialized in objects:
+                self._add(deserialized)
+        except DeserializationError as exc:
+            raise FixtureFormatError(str(exc)) from exc
+
+    def _add(self, deserialized):
+        obj = deserialized.object
+        model = type(obj)
+        self._buffers[model].append(obj)
+        if deserialized.m2m_data:
+            self._m2m.append((obj, deserialized.m2m_data))
+        if model is LoanCard:
+            self._loan_ids.add(obj.pk)
+        elif getattr(obj, 'loan_card_id', None) is not None:
+            self._loan_ids.add(obj.loan_card_id)
+        self._buffered += 1
+        if self._buffered >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        for model in dependency_order(self._buffers):
+            objs = self._buffers.pop(model)
+            with span('fastload.insert', model=model._meta.label, rows=len(objs)):
+                self._insert(model, objs)
+            self.report.counts[model] += len(objs)
+        self._buffered = 0
+
+    def _insert(self, model, objs):
+        opts = model._meta
+        fields = opts.local_concrete_fields
+        update_fields = [model_field for model_field in fields if not model_field.primary_key]
+        batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+        for start in range(0, len(objs), batch_size):
+            # The private _insert is what bulk_create() uses; it is called
+            # directly for raw=True so auto_now fields keep fixture values.
+            model._base_manager._insert(
+                objs[start:start + batch_size],
+                fields=fields,
+                raw=True,
+                on_conflict=OnConflict.UPDATE if update_fields else OnConflict.IGNORE,
+                update_fields=update_fields or None,
+                unique_fields=[opts.pk] if update_fields else None,
+            )
+
+    def _apply_m2m(self):
+        for obj, m2m_data in self._m2m:
+            for name, values in m2m_data.items():
+                getattr(obj, name).set(values)
+        self._m2m = []
+
+    def _reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(no_style(), self._loaded_models())
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def _analyze(self):
+        # Freshly loaded tables have no planner statistics yet; without them
+        # the correlated subqueries of the recompute pass pick poor indexes.
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            return
+        with connection.cursor() as cursor:
+            for model in self._loaded_models():
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+    def _recompute_loans(self):
+        loan_ids = sorted(self._loan_ids)
+        with span('fastload.recompute', loans=len(loan_ids)):
+            for start in range(0, len(loan_ids), self.chunk_size):
+                loans = LoanCard.objects.filter(
+                    pk__in=loan_ids[start:start + self.chunk_size]
+                )
+                recompute_settlement_totals(loans)
+                self.report.prepaid_created += create_missing_prepaid_records(loans)
+                recompute_prepaid_balances(loans)
+        self.report.loans_recomputed = len(loan_ids)
@@ -0,0 +1,167 @@
+"""
+Projected interest income.
+
+:func:`interest_forecast` returns expected interest income per month and
+loan status for the next ``months`` months (from the current month):
+
+* months a loan's schedule covers use its ``InterestSchedule`` rows (the
+  adjusted amount when set), split into posted and unposted;
+* months past the end of a loan's schedule, up to its maturity date plus
+  extension months, are projected at today's terms: current principal times
+  rate plus every draw times its rate, over 12. Loans whose status stops
+  accrual project nothing.
+
+Schedule rows are summed by month, status and posting in one grouped query
+and the projection reads every loan with its term and draw interest in a
+second, so the whole portfolio is priced in one pass. The result is cached
+until the next logged write to a loan, draw, extension, schedule row or
+event (see :func:`~loans.changes.cached_until_change`).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .bulk import MONEY, ZERO, effective_amount_expression
+from .changes import cached_until_change
+from .models import Draw, InterestSchedule, LoanCard, LoanEvent, LoanExtension
+from .schedule import add_months, schedule_end_date
+from .tracing import span
+
+
+CENT = Decimal('0.01')
+ZERO_AMOUNT = Decimal('0.00')
+FORECAST_MONTHS = 24
+MAX_FORECAST_MONTHS = 120
+RATE_AMOUNT = DecimalField(max_digits=20, decimal_places=6)
+COLUMNS = ['posted', 'unposted', 'projected']
+
+
+def _scheduled(start, end):
+    """``(month, status, is_posted, amount)`` rows charged in ``[start, end)``."""
+    return (
+        InterestSchedule.objects.filter(charge_date__gte=start, charge_date__lt=end)
+        .order_by()
+        .annotate(
+            month=TruncMonth('charge_date'),
+            status_code=Coalesce(F('loan_card__dynamic_status__code'), F('loan_card__status')),
+        )
+        .values_list('month', 'status_code', 'is_posted')
+        .annotate(amount=Sum(effective_amount_expression()))
+    )
+
+
+def _projection_loans():
+    """Loans with the values needed to project past their schedule."""
+    last_period = (
+        InterestSchedule.objects.filter(loan_card=OuterRef('pk'), period_type='monthly')
+        .order_by('-charge_date')
+        .values('charge_date')[:1]
+    )
+    extension_months = (
+        LoanExtension.objects.filter(loan_card=OuterRef('pk'))
+        .order_by()
+        .values('loan_card')
+        .annotate(total=Sum('extension_months'))
+        .values('total')
+    )
+    draw_interest = (
+        Draw.objects.filter(loan_card=OuterRef('pk'))
+        .order_by()
+        .values('loan_card')
+        .annotate(total=Sum(ExpressionWrapper(F('amount') * F('interest_rate'), output_field=RATE_AMOUNT)))
+        .values('total')
+    )
+    principal = (
+        LoanEvent.objects.filter(loan_card=OuterRef('pk'), kind='principal')
+        .order_by('-effective_date', '-id')
+        .values('principal')[:1]
+    )
+    return (
+        LoanCard.objects.select_related('dynamic_status')
+        .only(
+            'first_loan_date', 'maturity_date', 'initial_interest_rate', 'advanced_loan_amount', 'status',
+            'dynamic_status__code', 'dynamic_status__stops_interest_accrual',
+        )
+        .annotate(
+            last_period=Subquery(last_period),
+            extension_months=Coalesce(Subquery(extension_months), 0),
+            draw_interest=Coalesce(Subquery(draw_interest, output_field=RATE_AMOUNT), ZERO, output_field=RATE_AMOUNT),
+            principal_now=Coalesce(Subquery(principal, output_field=MONEY), F('advanced_loan_amount')),
+        )
+        .order_by('pk')
+    )
+
+
+def compute_forecast(start, months):
+    """Uncached :func:`interest_forecast`."""
+    month_starts = [add_months(start, index) for index in range(months)]
+    last_month = month_starts[-1]
+    cells = defaultdict(lambda: {column: Decimal('0.00') for column in COLUMNS})
+
+    with span('forecast.compute', start=start.isoformat(), months=months) as forecast_span:
+        for month, status_code, is_posted, amount in _scheduled(start, add_months(start, months)):
+            # TruncMonth returns a datetime on some backends.
+            month = month.date() if hasattr(month, 'date') else month
+            cells[(month, status_code or '')]['posted' if is_posted else 'unposted'] += (amount or ZERO_AMOUNT).quantize(CENT)
+
+        projected_loans = 0
+        for loan in _projection_loans().iterator(chunk_size=2000):
+            status = loan.dynamic_status
+            if status and status.stops_interest_accrual:
+                continue
+            first_period = loan.first_loan_date.replace(day=1)
+            last_due = schedule_end_date(loan, loan.extension_months).replace(day=1)
+            current = max(start, add_months(loan.last_period.replace(day=1), 1) if loan.last_period else first_period)
+            if current > min(last_due, last_month):
+                continue
+            monthly = ((loan.principal_now * loan.initial_interest_rate + loan.draw_interest) / 12).quantize(CENT)
+            status_code = (status.code if status else loan.status) or ''
+            while current <= last_due and current <= last_month:
+                cells[(current, status_code)]['projected'] += monthly
+                current = add_months(current, 1)
+            projected_loans += 1
+        forecast_span.set_attributes(cells=len(cells), projected_loans=projected_loans)
+
+    statuses = sorted({status_code for _, status_code in cells})
+    rows = []
+    for month in month_starts:
+        by_status = {}
+        for status_code in statuses:
+            cell = cells.get((month, status_code))
+            if cell:
+                by_status[status_code] = {**cell, 'total': sum(cell.values())}
+        row = {'month': month, 'by_status': by_status}
+        for column in COLUMNS:
+            row[column] = sum((cell[column] for cell in by_status.values()), ZERO_AMOUNT)
+        row['total'] = sum((row[column] for column in COLUMNS), ZERO_AMOUNT)
+        rows.append(row)
+
+    status_totals = defaultdict(lambda: ZERO_AMOUNT)
+    for row in rows:
+        for status_code, cell in row['by_status'].items():
+            status_totals[status_code] += cell['total']
+    return {
+        'start': start,
+        'months': months,
+        'statuses': statuses,
+        'rows': rows,
+        'totals': {
+            **{column: sum((row[column] for row in rows), ZERO_AMOUNT) for column in COLUMNS},
+            'by_status': dict(status_totals),
+            'total': sum((row['total'] for row in rows), ZERO_AMOUNT),
+        },
+        'computed_at': timezone.now(),
+    }
+
+
+def interest_forecast(start=None, months=FORECAST_MONTHS):
+    """Month x status matrix of expected interest income for ``months``
+    months from ``start``'s month (default this month); cached."""
+    start = (start or timezone.localdate()).replace(day=1)
+    return cached_until_change(
+        f'interest-forecast:{start.isoformat()}:{months}',
+        lambda: compute_forecast(start, months),
+    )
@@ -0,0 +1,348 @@
+"""
+Database-backed background jobs.
+
+Heavy operations are queued as :class:`~loans.models.BackgroundJob` rows
+with :func:`enqueue` and run by ``manage.py run_workers``, so they no longer
+hold a gunicorn worker for the length of the request. No broker is needed:
+workers claim the oldest due job with ``SELECT ... FOR UPDATE SKIP LOCKED``
+(on PostgreSQL; other backends ignore the lock, so run a single worker
+there), mark it running under a lease and commit before doing the work.
+
+A failed attempt is retried after an exponential backoff until
+``max_attempts`` is reached. While a job runs, a heartbeat thread keeps
+extending its lease, so only a job whose worker died lets the lease run
+out; it is then claimed again, or failed if it has no attempts left.
+Every attempt is recorded as a :class:`~loans.models.BackgroundJobRun`
+with its wait and run time.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .bulk import (
+    create_missing_prepaid_records,
+    reconcile_prepaid_balances,
+    reconcile_settlement_totals,
+    recompute_prepaid_balances,
+    recompute_settlement_totals,
+)
+from .models import BackgroundJob, BackgroundJobRun, LoanCard
+from .schedule import extend_schedules, refresh_schedule, regenerate_interest_schedule
+from .snapshots import build_snapshot, previous_month_end
+from .tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+PENDING_STATUSES = ('queued', 'running')
+
+
+def task(name):
+    """Register the decorated function as the job task ``name``."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying after ``attempts`` failed attempts."""
+    base = _setting('JOB_RETRY_BASE_SECONDS', 10)
+    return min(base * 2 ** (attempts - 1), _setting('JOB_RETRY_MAX_SECONDS', 3600))
+
+
+def worker_name(index=0):
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def enqueue(task_name, params=None, card_number='', created_by='', max_attempts=3, run_after=None, **fields):
+    """Queue ``task_name`` to be called with the JSON-serialisable keyword
+    arguments ``params``; ``card_number`` tags the job for status lookups.
+    Other ``BackgroundJob`` fields may be passed as keywords."""
+    if task_name not in TASKS:
+        raise ValueError(f"Unknown task '{task_name}'")
+    return BackgroundJob.objects.create(
+        task=task_name,
+        params=params or {},
+        card_number=card_number,
+        created_by=created_by,
+        max_attempts=max_attempts,
+        run_after=run_after or timezone.now(),
+        **fields,
+    )
+
+
+def pending_job(task_name, card_number):
+    """The queued or running ``task_name`` job for a loan, if any."""
+    return (
+        BackgroundJob.objects.filter(task=task_name, card_number=card_number, status__in=PENDING_STATUSES)
+        .order_by('-id')
+        .first()
+    )
+
+
+def lease_seconds():
+    return _setting('JOB_LEASE_SECONDS', 900)
+
+
+def _fail_expired(job, now):
+    logger.error(
+        "Job %s lease held by %s expired on attempt %s of %s; failing",
+        job.pk, job.worker, job.attempts, job.max_attempts,
+    )
+    job.status = 'failed'
+    job.error = f'Lease held by {job.worker} expired on the last attempt (worker stopped?)'
+    job.locked_until = None
+    job.finished_at = now
+    job.save(update_fields=['status', 'error', 'locked_until', 'finished_at'])
+
+
+def claim_next(worker):
+    """Lease the next due job to ``worker`` and return it, or None."""
+    now = timezone.now()
+    while True:
+        with transaction.atomic():
+            job = (
+                BackgroundJob.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status='queued', run_after__lte=now)
+                    | Q(status='running', locked_until__lt=now)
+                )
+                .order_by('run_after', 'id')
+                .first()
+            )
+            if job is None:
+                return None
+            if job.status == 'running':
+                if job.attempts >= job.max_attempts:
+                    _fail_expired(job, now)
+                    continue
+                logger.warning("Job %s lease held by %s expired; reclaiming", job.pk, job.worker)
+                due_at = job.locked_until
+            else:
+                due_at = job.run_after
+            job.status = 'running'
+            job.attempts += 1
+            job.worker = worker
+            job.locked_until = now + timedelta(seconds=lease_seconds())
+            job.started_at = job.started_at or now
+            job.save(update_fields=['status', 'attempts', 'worker', 'locked_until', 'started_at'])
+        job.claimed_at = now
+        job.wait = now - due_at
+        return job
+
+
+class LeaseHeartbeat:
+    """Extend a running job's lease every third of ``JOB_LEASE_SECONDS``
+    from a background thread (with its own connection) until stopped."""
+
+    def __init__(self, job):
+        self.job = job
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'job-{job.pk}-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        interval = max(lease_seconds() / 3, 1)
+        try:
+            while not self._stop.wait(interval):
+                try:
+                    extended = BackgroundJob.objects.filter(
+                        pk=self.job.pk, attempts=self.job.attempts, worker=self.job.worker, status='running',
+                    ).update(locked_until=timezone.now() + timedelta(seconds=lease_seconds()))
+                except DatabaseError:
+                    logger.exception("Job %s lease heartbeat failed", self.job.pk)
+                    continue
+                if not extended:
+                    logger.warning("Job %s lease was taken over; heartbeat stopping", self.job.pk)
+                    return
+        finally:
+            connection.close()
+
+
+def run_job(job):
+    """Run a claimed job and record the attempt; returns the final status."""
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    error = ''
+    result = None
+    try:
+        func = TASKS[job.task]
+        with span('jobs.run', task=job.task, job=job.pk, attempt=job.attempts):
+            with LeaseHeartbeat(job), connection.execute_wrapper(count_queries):
+                result = func(**job.params)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Job %s (%s) attempt %s failed", job.pk, job.task, job.attempts)
+    duration = Decimal(str(round((time.perf_counter() - started) * 1000, 2)))
+
+    now = timezone.now()
+    if not error:
+        values = {'status': 'succeeded', 'result': result, 'error': '', 'finished_at': now}
+    elif job.attempts < job.max_attempts:
+        values = {'status': 'queued', 'error': error, 'run_after': now + timedelta(seconds=retry_delay(job.attempts))}
+    else:
+        values = {'status': 'failed', 'error': error, 'finished_at': now}
+
+    with transaction.atomic():
+        BackgroundJobRun.objects.create(
+            job=job,
+            attempt=job.attempts,
+            worker=job.worker,
+            succeeded=not error,
+            wait_ms=Decimal(str(round(job.wait.total_seconds() * 1000, 2))),
+            duration_ms=duration,
+            query_count=queries,
+            error=error,
+            started_at=job.claimed_at,
+        )
+        # Only the lease holder may finish the job; if the lease expired and
+        # another worker reclaimed it, attempts has moved on.
+        BackgroundJob.objects.filter(pk=job.pk, attempts=job.attempts, worker=job.worker).update(
+            locked_until=None, **values
+        )
+    return values['status']
+
+
+def work(worker, stop=None, poll_interval=1.0, burst=False):
+    """Claim and run jobs until ``stop`` is set (or the queue is empty in burst mode)."""
+    processed = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        job = claim_next(worker)
+        if job is None:
+            if burst:
+                break
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def job_record(job):
+    runs = list(job.runs.all())
+    return {
+        'id': job.pk,
+        'task': job.task,
+        'card_number': job.card_number,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else None,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'next_attempt_at': job.run_after if job.status == 'queued' and job.attempts else None,
+        'runs': [
+            {
+                'attempt': run.attempt,
+                'succeeded': run.succeeded,
+                'wait_ms': run.wait_ms,
+                'duration_ms': run.duration_ms,
+                'query_count': run.query_count,
+                'started_at': run.started_at,
+            }
+            for run in runs
+        ],
+    }
+
+
+# ----------------------------------------------------------------------
+# Tasks
+
+@task('regenerate_schedule')
+def regenerate_schedule_task(card_number):
+    loan = LoanCard.objects.get(card_number=card_number)
+    return {'created': regenerate_interest_schedule(loan)}
+
+
+@task('refresh_schedules')
+def refresh_schedules_task(loan_ids, from_date=None):
+    """Refresh the schedules of ``loan_ids`` from ``from_date`` (ISO date),
+    one loan per transaction."""
+    start = date.fromisoformat(from_date) if from_date else None
+    loans = (
+        LoanCard.objects.filter(pk__in=loan_ids, interest_schedules__isnull=False)
+        .distinct()
+        .order_by('pk')
+    )
+    refreshed = 0
+    for loan in loans.iterator(chunk_size=500):
+        with transaction.atomic():
+            refresh_schedule(loan, from_date=start)
+        refreshed += 1
+    return {'refreshed': refreshed}
+
+
+@task('recompute_settlement_totals')
+def recompute_settlement_totals_task(loan_ids):
+    with transaction.atomic():
+        updated = recompute_settlement_totals(LoanCard.objects.filter(pk__in=loan_ids))
+    return {'updated': updated}
+
+
+@task('recompute_prepaid_balances')
+def recompute_prepaid_balances_task(loan_ids):
+    with transaction.atomic():
+        updated = recompute_prepaid_balances(LoanCard.objects.filter(pk__in=loan_ids))
+    return {'updated': updated}
+
+
+@task('extend_schedules')
+def extend_schedules_task():
+    return {'extended': extend_schedules()}
+
+
+@task('reconcile_balances')
+def reconcile_balances_task():
+    loans = LoanCard.objects.all()
+    with transaction.atomic():
+        settlement_totals = reconcile_settlement_totals(loans)
+        prepaid_created = create_missing_prepaid_records(loans)
+    with transaction.atomic():
+        prepaid_balances = reconcile_prepaid_balances(loans)
+    return {
+        'settlement_totals': settlement_totals,
+        'prepaid_created': prepaid_created,
+        'prepaid_balances': prepaid_balances,
+    }
+
+
+@task('build_portfolio_snapshot')
+def build_portfolio_snapshot_task(month_end=None):
+    """Snapshot ``month_end`` (ISO date), by default the last completed month."""
+    as_of = date.fromisoformat(month_end) if month_end else previous_month_end()
+    return {'month_end': as_of.isoformat(), 'rows': build_snapshot(as_of)}
@@ -0,0 +1,370 @@
+"""
+Scripted concurrent load test for month-end back-office traffic.
+
+Each virtual user logs in through the admin login form (session cookie +
+CSRF token) and then repeatedly runs weighted scenarios against a running
+server: debounced search typing, loan detail browsing, schedule posting and
+draw entry. Timings are aggregated per endpoint.
+"""
+import http.cookiejar
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+
+TYPING_INTERVAL_SECONDS = 0.12
+SEARCH_DEBOUNCE_SECONDS = 0.3  # matches loan_list.html
+
+
+class LoadTestError(Exception):
+    """Raised when the harness cannot set up a virtual user."""
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as responses so each endpoint is timed on its own."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Session:
+    """One virtual user: cookie jar, CSRF handling and timed requests."""
+
+    def __init__(self, base_url, recorder, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies),
+            _NoRedirect,
+        )
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def has_session(self):
+        return any(cookie.name == 'sessionid' for cookie in self.cookies)
+
+    def request(self, method, path, label=None, form=None, json_body=None, record=True):
+        """Send a request and record its latency; returns (status, body)."""
+        url = self.base_url + path
+        headers = {'Referer': url}
+        data = None
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        if method != 'GET':
+            headers['X-CSRFToken'] = self.csrf_token()
+
+        req = urllib.request.Request(url, data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                status = response.status
+                body = response.read()
+        except urllib.error.HTTPError as exc:
+            status = exc.code
+            body = exc.read()
+        except (urllib.error.URLError, socket.timeout, ConnectionError) as exc:
+            status = None
+            body = str(exc).encode()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if record:
+            ok = status is not None and status < 400
+            self.recorder.record(f"{method} {label or path}", elapsed_ms, ok)
+        return status, body
+
+    def login(self, username, password):
+        login_path = '/admin/login/'
+        self.request('GET', login_path, record=False)
+        status, _ = self.request(
+            'POST',
+            login_path,
+            form={
+                'username': username,
+                'password': password,
+                'csrfmiddlewaretoken': self.csrf_token(),
+                'next': '/api/loans/',
+            },
+            record=False,
+        )
+        if status != 302 or not self.has_session():
+            raise LoadTestError(
+                f"Login failed for '{username}' (HTTP {status}). "
+                "The account must be active and have staff access."
+            )
+
+
+class Recorder:
+    """Thread-safe latency and error accounting per endpoint label."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(list)
+        self._errors = defaultdict(int)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, label, elapsed_ms, ok):
+        with self._lock:
+            self._latencies[label].append(elapsed_ms)
+            if not ok:
+                self._errors[label] += 1
+
+    def mark_error(self, label):
+        """Flag the last request of ``label`` as failed (application-level error)."""
+        with self._lock:
+            self._errors[label] += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        wall_seconds = max((self.finished or time.perf_counter()) - self.started, 1e-9)
+        rows = []
+        with self._lock:
+            for label in sorted(self._latencies):
+                values = sorted(self._latencies[label])
+                count = len(values)
+                errors = self._errors[label]
+                rows.append({
+                    'endpoint': label,
+                    'requests': count,
+                    'errors': errors,
+                    'error_rate': errors / count if count else 0.0,
+                    'throughput_rps': count / wall_seconds,
+                    'p50_ms': percentile(values, 50),
+                    'p95_ms': percentile(values, 95),
+                    'p99_ms': percentile(values, 99),
+                })
+        return rows
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Targets:
+    """Card numbers, search terms and postable schedules shared by all users."""
+
+    def __init__(self, card_numbers, search_terms, schedule_ids):
+        if not card_numbers:
+            raise LoadTestError('No loans found in the database to target.')
+        self.card_numbers = list(card_numbers)
+        self.search_terms = [term for term in search_terms if term and len(term) >= 2]
+        self._schedule_ids = list(schedule_ids)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls, limit=500):
+        from .models import InterestSchedule, LoanCard
+
+        loans = list(
+            LoanCard.objects.select_related('borrower')
+            .order_by('?')
+            .values_list('card_number', 'borrower__name')[:limit]
+        )
+        schedule_ids = list(
+            InterestSchedule.objects.filter(is_posted=False)
+            .order_by('?')
+            .values_list('id', flat=True)[:limit * 4]
+        )
+        terms = [card for card, _ in loans] + [name for _, name in loans]
+        return cls([card for card, _ in loans], terms, schedule_ids)
+
+    def claim_schedule_id(self):
+        """Hand out each unposted schedule once so users do not collide."""
+        with self._lock:
+            return self._schedule_ids.pop() if self._schedule_ids else None
+
+
+# ----------------------------------------------------------------------
+# Scenarios
+
+def search_typing_burst(session, targets, rng):
+    """Type a term character by character; only debounced prefixes hit the server."""
+    term = rng.choice(targets.search_terms or targets.card_numbers)
+    typed = term[:rng.randint(min(3, len(term)), len(term))]
+    for index in range(1, len(typed)):
+        pause = rng.uniform(TYPING_INTERVAL_SECONDS * 0.5, TYPING_INTERVAL_SECONDS * 4)
+        if pause >= SEARCH_DEBOUNCE_SECONDS:
+            # The user hesitated long enough for the debounce timer to fire.
+            time.sleep(SEARCH_DEBOUNCE_SECONDS)
+            _search(session, typed[:index])
+            time.sleep(pause - SEARCH_DEBOUNCE_SECONDS)
+        else:
+            time.sleep(pause)
+    time.sleep(SEARCH_DEBOUNCE_SECONDS)
+    _search(session, typed)
+
+
+def _search(session, query):
+    if len(query) < 2:
+        return
+    session.request(
+        'GET',
+        '/api/loans/search/?' + urllib.parse.urlencode({'q': query}),
+        label='/api/loans/search/',
+    )
+
+
+def browse_loan_detail(session, targets, rng):
+    card = urllib.parse.quote(rng.choice(targets.card_numbers))
+    session.request('GET', f'/api/loans/{card}/', label='/api/loans/<card>/')
+    time.sleep(rng.uniform(0.2, 1.0))
+    session.request('GET', f'/api/loan/{card}/', label='/api/loan/<card>/')
+    if rng.random() < 0.5:
+        session.request(
+            'GET',
+            f'/api/loans/{card}/interest-schedule/',
+            label='/api/loans/<card>/interest-schedule/',
+        )
+
+
+def post_schedule_batch(session, targets, rng, batch_size=5):
+    """Post several schedule rows back to back, as done from the schedule page."""
+    label = '/api/post-interest-schedule/'
+    for _ in range(batch_size):
+        schedule_id = targets.claim_schedule_id()
+        if schedule_id is None:
+            return
+        status, body = session.request(
+            'POST',
+            '/api/post-interest-schedule/',
+            label=label,
+            json_body={
+                'schedule_id': schedule_id,
+                'received_date': date.today().isoformat(),
+                'invoice_number': f'LT-{schedule_id}',
+                'payment_source': 'bank',
+            },
+        )
+        if status == 200 and not _json_success(body):
+            session.recorder.mark_error(f'POST {label}')
+
+
+def enter_draw(session, targets, rng):
+    card = urllib.parse.quote(rng.choice(targets.card_numbers))
+    path = f'/api/loans/{card}/add-draw/'
+    session.request('GET', path, label='/api/loans/<card>/add-draw/')
+    amount = Decimal(rng.randint(1000, 50000)).quantize(Decimal('0.01'))
+    session.request(
+        'POST',
+        path,
+        label='/api/loans/<card>/add-draw/',
+        form={
+            'csrfmiddlewaretoken': session.csrf_token(),
+            'draw_date': date.today().isoformat(),
+            'amount': str(amount),
+            'interest_rate': '0.13',
+            'invoice_number': f'LT-DRAW-{rng.randint(1, 10**9)}',
+            'notes': 'load test',
+        },
+    )
+
+
+def _json_success(body):
+    try:
+        return bool(json.loads(body).get('success'))
+    except (ValueError, AttributeError):
+        return False
+
+
+SCENARIOS = {
+    'search': search_typing_burst,
+    'browse': browse_loan_detail,
+    'post_schedules': post_schedule_batch,
+    'draws': enter_draw,
+}
+
+DEFAULT_WEIGHTS = {
+    'search': 5,
+    'browse': 3,
+    'post_schedules': 1,
+    'draws': 1,
+}
+
+
+def run_load_test(base_url, username, password, targets, weights=None,
+                  concurrency=10, duration=60, think_time=1.0, seed=None):
+    """Run weighted scenarios with ``concurrency`` users for ``duration`` seconds."""
+    weights = weights or DEFAULT_WEIGHTS
+    unknown = set(weights) - set(SCENARIOS)
+    if unknown:
+        raise LoadTestError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    names = [name for name, weight in weights.items() if weight > 0]
+    name_weights = [weights[name] for name in names]
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    failures = []
+
+    def user(index):
+        rng = random.Random(None if seed is None else seed + index)
+        session = Session(base_url, recorder)
+        try:
+            session.login(username, password)
+        except LoadTestError as exc:
+            failures.append(exc)
+            return
+        while time.monotonic() < deadline:
+            scenario = SCENARIOS[rng.choices(names, weights=name_weights)[0]]
+            scenario(session, targets, rng)
+            time.sleep(rng.uniform(0, think_time * 2))
+
+    threads = [
+        threading.Thread(target=user, args=(index,), daemon=True)
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)  # stagger logins
+    for thread in threads:
+        thread.join()
+    recorder.stop()
+
+    if failures and len(failures) == concurrency:
+        raise failures[0]
+    return recorder
+
+
+def start_local_server(port, workers=2):
+    """Start gunicorn the same way as the Procfile and wait until it listens."""
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', 'loan_system.wsgi:application',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+    ])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise LoadTestError(f'gunicorn exited with code {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.25)
+    process.terminate()
+    raise LoadTestError('gunicorn did not start listening within 30 seconds')
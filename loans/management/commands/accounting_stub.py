@@ -0,0 +1,71 @@
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local stand-in for the accounting system's POST /invoices/batch "
+        "endpoint, for trying out dispatch_outbox. Invoice numbers are stable per "
+        "idempotency key; --fail-rate and --busy-rate inject errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Share of invoices answered with a retryable error')
+        parser.add_argument('--busy-rate', type=float, default=0.0, help='Share of batches answered with HTTP 429')
+        parser.add_argument('--retry-after', type=int, default=5, help='Retry-After seconds sent with a 429')
+
+    def handle(self, *args, **options):
+        issued = {}
+        lock = threading.Lock()
+        stdout = self.stdout
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, body, headers=()):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if self.path.rstrip('/') != '/invoices/batch':
+                    return self._reply(404, {'error': 'not found'})
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    invoices = json.loads(self.rfile.read(length))['invoices']
+                except (ValueError, KeyError):
+                    return self._reply(400, {'error': 'expected {"invoices": [...]}'})
+                if random.random() < options['busy_rate']:
+                    return self._reply(429, {'error': 'busy'}, [('Retry-After', str(options['retry_after']))])
+                results = []
+                with lock:
+                    for invoice in invoices:
+                        key = invoice.get('idempotency_key')
+                        if key not in issued and random.random() < options['fail_rate']:
+                            results.append({'idempotency_key': key, 'error': 'temporary failure', 'retryable': True})
+                            continue
+                        if key not in issued:
+                            issued[key] = invoice.get('payload', {}).get('invoice_number') or f'ACC-{len(issued) + 1:06d}'
+                        results.append({'idempotency_key': key, 'invoice_number': issued[key]})
+                stdout.write(f'{len(invoices)} invoice(s), {len(issued)} issued in total')
+                self._reply(200, {'results': results})
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), Handler)
+        self.stdout.write(f"Accounting stub listening on http://127.0.0.1:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,45 @@
+import csv
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from loans.accrual import accrual_summary, accrue_portfolio
+from loans.models import LoanCard
+
+
+class Command(BaseCommand):
+    help = (
+        "Report interest accrued across the portfolio through --as-of (default today). "
+        "--csv writes one row per loan instead of the totals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', dest='as_of', help='Last accrual day (YYYY-MM-DD, default today)')
+        parser.add_argument('--from', dest='start', help='First accrual day (default each first loan date)')
+        parser.add_argument('--csv', action='store_true', help='Write card_number,accrued rows to stdout')
+
+    def handle(self, *args, **options):
+        try:
+            as_of = date.fromisoformat(options['as_of']) if options['as_of'] else timezone.localdate()
+            start = date.fromisoformat(options['start']) if options['start'] else None
+        except ValueError as exc:
+            raise CommandError(f'Bad date: {exc}')
+        if start and start > as_of:
+            raise CommandError('--from must not be after --as-of')
+
+        if options['csv']:
+            accrued = accrue_portfolio(as_of, start)
+            cards = dict(LoanCard.objects.filter(pk__in=accrued).values_list('pk', 'card_number'))
+            writer = csv.writer(self.stdout)
+            writer.writerow(['card_number', 'accrued_interest'])
+            for loan_id, amount in sorted(accrued.items(), key=lambda item: cards[item[0]]):
+                writer.writerow([cards[loan_id], amount])
+            return
+
+        summary = accrual_summary(as_of, start)
+        for status_code, amount in summary['by_status'].items():
+            self.stdout.write(f'{status_code or "(none)"}: {amount}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Accrued through {as_of}: {summary['total']} on {summary['loans']} loan(s)."
+        ))
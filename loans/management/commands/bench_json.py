@@ -0,0 +1,102 @@
+import json
+import statistics
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from loans.responses import BACKENDS
+
+
+def _sample_loans(count):
+    """Loan-detail shaped records holding raw Decimal/date/datetime values."""
+    created = datetime(2024, 1, 15, 9, 30, 12, 123456, tzinfo=timezone.utc)
+    loans = []
+    for index in range(count):
+        start = date(2024, 1, 1) + timedelta(days=index % 365)
+        amount = Decimal('250000.00') + index
+        loans.append({
+            'card_number': f'LC-{index:06d}',
+            'borrower': {'name': f'Borrower {index}', 'email': f'b{index}@example.com', 'phone': '555-0100'},
+            'property_address': f'{index} Main Street',
+            'advanced_loan_amount': amount,
+            'first_wired_amount': amount - Decimal('4321.17'),
+            'total_settlement_charges': Decimal('4321.17'),
+            'first_loan_date': start,
+            'maturity_date': start + timedelta(days=365),
+            'initial_interest_rate': Decimal('0.1150'),
+            'monthly_interest_initial': amount * Decimal('0.1150') / 12,
+            'settlement_charges': [
+                {'charge_type': 'Title Fee', 'amount': Decimal('1250.00'), 'invoice_number': f'INV-{index}-{n}'}
+                for n in range(3)
+            ],
+            'draws': [
+                {'draw_number': n + 1, 'draw_date': start + timedelta(days=30 * (n + 1)),
+                 'amount': Decimal('15000.00'), 'interest_rate': Decimal('0.1200')}
+                for n in range(2)
+            ],
+            'interest_payments': [
+                {'period_number': n + 1, 'charge_date': start + timedelta(days=30 * n),
+                 'amount': Decimal('2395.83'), 'received_date': None, 'is_paid': False}
+                for n in range(12)
+            ],
+            'created_at': created,
+            'updated_at': created,
+        })
+    return loans
+
+
+def _stringify(value):
+    # What the views did before: str() every Decimal, isoformat() every date.
+    if isinstance(value, dict):
+        return {key: _stringify(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_stringify(item) for item in value]
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _legacy(data):
+    return json.dumps(_stringify(data), cls=DjangoJSONEncoder).encode('utf-8')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark JSON response encoding per payload size: the old hand-converted "
+        "stdlib path against each loans.responses backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,100,1000,5000', help='Comma-separated loan counts')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per size (median reported)')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        repeat = max(1, options['repeat'])
+
+        encoders = {'legacy': _legacy, **BACKENDS}
+        self.stdout.write(f"{'loans':>7} {'encoder':>8} {'bytes':>11} {'median ms':>10} {'us/loan':>9} {'speedup':>8}")
+        for size in sizes:
+            payload = {'loans': _sample_loans(size)}
+            baseline = None
+            for name, encode in encoders.items():
+                encoded = encode(payload)
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    encode(payload)
+                    timings.append(time.perf_counter() - started)
+                median = statistics.median(timings)
+                baseline = baseline or median
+                self.stdout.write(
+                    f"{size:>7} {name:>8} {len(encoded):>11,} {median * 1000:>10.2f} "
+                    f"{median * 1e6 / size:>9.1f} {baseline / median:>7.1f}x"
+                )
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.snapshots import build_snapshot, month_ends, previous_month_end
+
+
+class Command(BaseCommand):
+    help = (
+        "Build month-end portfolio snapshots. Without options, snapshots the last "
+        "completed month; --from/--to backfill every month-end in the range."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First month (YYYY-MM-DD, any day of the month)')
+        parser.add_argument('--to', dest='end', help='Last month (default: last completed month)')
+
+    def handle(self, *args, **options):
+        try:
+            end = date.fromisoformat(options['end']) if options['end'] else previous_month_end()
+            start = date.fromisoformat(options['start']) if options['start'] else end
+        except ValueError as exc:
+            raise CommandError(f'Bad date: {exc}')
+        targets = month_ends(start, end)
+        if not targets:
+            raise CommandError('--from must not be after --to')
+
+        for as_of in targets:
+            rows = build_snapshot(as_of)
+            self.stdout.write(f'{as_of}: {rows} loan(s)')
+        self.stdout.write(self.style.SUCCESS(f'Built {len(targets)} snapshot(s).'))
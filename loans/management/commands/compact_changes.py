@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from loans.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact the change log: entries older than --days are dropped when a newer "
+        "entry exists for the same object, so only the latest change per object survives."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep every entry newer than this (default 30)')
+
+    def handle(self, *args, **options):
+        deleted = compact_changes(older_than_days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {deleted} superseded change log entr{"y" if deleted == 1 else "ies"}.'))
@@ -0,0 +1,53 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.outbox import AccountingConnector, Dispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued outbox messages to the accounting system (ACCOUNTING_SYNC_URL) "
+        "and write the returned invoice numbers back. SIGTERM/SIGINT finish the current batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ACCOUNTING_SYNC_BATCH_SIZE, help='Largest batch sent per request')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between polls of an empty outbox')
+        parser.add_argument('--once', action='store_true', help='Send every message that is due now and exit')
+
+    def handle(self, *args, **options):
+        connector = AccountingConnector.from_settings()
+        if not settings.ACCOUNTING_SYNC_URL:
+            raise CommandError('ACCOUNTING_SYNC_URL is not set')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        dispatcher = Dispatcher(
+            connector,
+            batch_size=options['batch_size'],
+            max_attempts=settings.ACCOUNTING_SYNC_MAX_ATTEMPTS,
+        )
+
+        if options['once']:
+            total = 0
+            while True:
+                claimed = dispatcher.dispatch_once()
+                if not claimed:
+                    break
+                total += claimed
+            self.stdout.write(f'Processed {total} message(s).')
+            return
+
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        self.stdout.write(f'Outbox dispatcher started ({connector.url}).')
+        dispatcher.run(stop, poll_interval=options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Outbox dispatcher stopped.'))
@@ -0,0 +1,53 @@
+import csv
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from loans.forecast import COLUMNS, FORECAST_MONTHS, MAX_FORECAST_MONTHS, compute_forecast, interest_forecast
+from loans.schedule import add_months
+
+
+class Command(BaseCommand):
+    help = (
+        "Print expected interest income per month for the next --months months. "
+        "--csv writes one row per month and status."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=FORECAST_MONTHS)
+        parser.add_argument('--start', help='First month (YYYY-MM-DD, any day of the month; default this month)')
+        parser.add_argument('--csv', action='store_true', help='Write month,status,posted,unposted,projected,total rows')
+        parser.add_argument('--fresh', action='store_true', help='Recompute instead of using a cached result')
+
+    def handle(self, *args, **options):
+        months = options['months']
+        if not 1 <= months <= MAX_FORECAST_MONTHS:
+            raise CommandError(f'--months must be between 1 and {MAX_FORECAST_MONTHS}')
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+        except ValueError as exc:
+            raise CommandError(f'Bad date: {exc}')
+
+        if options['fresh']:
+            forecast = compute_forecast((start or timezone.localdate()).replace(day=1), months)
+        else:
+            forecast = interest_forecast(start, months)
+
+        if options['csv']:
+            writer = csv.writer(self.stdout)
+            writer.writerow(['month', 'status', *COLUMNS, 'total'])
+            for row in forecast['rows']:
+                for status_code, cell in row['by_status'].items():
+                    writer.writerow([row['month'], status_code, *[cell[column] for column in COLUMNS], cell['total']])
+            return
+
+        for row in forecast['rows']:
+            self.stdout.write(
+                f"{row['month']:%Y-%m}  posted {row['posted']:>14}  unposted {row['unposted']:>14}  "
+                f"projected {row['projected']:>14}  total {row['total']:>14}"
+            )
+        end = add_months(forecast['start'], months - 1)
+        self.stdout.write(self.style.SUCCESS(
+            f"{forecast['start']:%Y-%m} to {end:%Y-%m}: {forecast['totals']['total']}"
+        ))
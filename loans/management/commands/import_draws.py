@@ -0,0 +1,30 @@
+from loans.imports import DrawImporter
+
+from .import_loans import Command as ImportLoansCommand
+
+
+class Command(ImportLoansCommand):
+    help = (
+        "Stream additional draws for existing loans from a CSV or JSONL file. "
+        "Draw numbers continue after each loan's existing draws; loans that "
+        "already have an interest schedule get it refreshed once at the end."
+    )
+    importer_class = DrawImporter
+    noun = 'draw'
+
+    def add_arguments(self, parser):
+        self.add_file_arguments(parser)
+
+    def get_importer(self, options):
+        return self.importer_class(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+    def describe(self, report, options):
+        if options['dry_run']:
+            return (
+                f"Would create {report.created} {self.noun}(s) from {report.rows_read} row(s); "
+                f"{report.error_count} row(s) rejected."
+            )
+        return (
+            f"Created {report.created} {self.noun}(s) from {report.rows_read} row(s); "
+            f"{report.error_count} row(s) rejected; {report.schedules_refreshed} schedule(s) refreshed."
+        )
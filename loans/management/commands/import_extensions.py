@@ -0,0 +1,13 @@
+from loans.imports import ExtensionImporter
+
+from .import_draws import Command as ImportDrawsCommand
+
+
+class Command(ImportDrawsCommand):
+    help = (
+        "Stream loan extensions from a CSV or JSONL file. Maturity dates move "
+        "out in file order with one update per loan per chunk; loans that "
+        "already have an interest schedule get it refreshed once at the end."
+    )
+    importer_class = ExtensionImporter
+    noun = 'extension'
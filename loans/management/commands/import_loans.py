@@ -0,0 +1,62 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.imports import DEFAULT_CHUNK_SIZE, ImportFormatError, LoanImporter, detect_format
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream loan cards (with settlement charges) from a CSV or JSONL file. "
+        "Rows are validated against the J14 + J22 - J13 = 0 checkpoint and "
+        "written per chunk with bulk inserts; invalid rows are reported, not fatal."
+    )
+
+    def add_arguments(self, parser):
+        self.add_file_arguments(parser)
+        parser.add_argument('--create-borrowers', action='store_true', help='Create borrowers that do not exist yet')
+
+    def add_file_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file ("-" for stdin)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+        parser.add_argument('--errors', metavar='PATH', help='Write the per-row error report as CSV')
+
+    def get_importer(self, options):
+        return LoanImporter(
+            chunk_size=options['chunk_size'],
+            create_borrowers=options['create_borrowers'],
+            dry_run=options['dry_run'],
+        )
+
+    def describe(self, report, options):
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        return f"{verb} {report.created} loan(s) from {report.rows_read} row(s); {report.error_count} row(s) rejected."
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            fmt = options['format'] or detect_format(path)
+        except ImportFormatError as exc:
+            raise CommandError(str(exc))
+
+        importer = self.get_importer(options)
+        try:
+            if path == '-':
+                report = importer.run(sys.stdin, fmt)
+            else:
+                with open(path, encoding='utf-8-sig', newline='') as stream:
+                    report = importer.run(stream, fmt)
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        if options['errors']:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as stream:
+                report.write_errors_csv(stream)
+
+        self.stdout.write(self.style.SUCCESS(self.describe(report, options)))
+        for error in report.sorted_errors()[:20]:
+            self.stdout.write(f"  row {error['row']} {error['key']}: {'; '.join(error['errors'])}")
+        if report.error_count > 20 and not options['errors']:
+            self.stdout.write(f"  ... {report.error_count - 20} more (use --errors to write them all)")
@@ -0,0 +1,116 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from loans.loadtest import (
+    DEFAULT_WEIGHTS,
+    SCENARIOS,
+    LoadTestError,
+    Targets,
+    run_load_test,
+    start_local_server,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay month-end back-office traffic (search typing, detail browsing, "
+        "schedule posting, draw entry) against a running server and report "
+        "throughput, p50/p95/p99 latency and error rate per endpoint. "
+        "Posting and draw scenarios WRITE data - point this at a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--username', default=os.environ.get('LOADTEST_USERNAME'))
+        parser.add_argument('--password', default=os.environ.get('LOADTEST_PASSWORD'))
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of virtual users')
+        parser.add_argument('--duration', type=int, default=60, help='Seconds to run')
+        parser.add_argument('--think-time', type=float, default=1.0, help='Mean pause between scenarios')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            metavar='NAME[=WEIGHT]',
+            help=f"Scenario to run, repeatable. Choices: {', '.join(SCENARIOS)}. "
+                 "Defaults to the month-end mix.",
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--start-server',
+            action='store_true',
+            help='Start gunicorn on --port for the duration of the run',
+        )
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers with --start-server')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if not options['username'] or not options['password']:
+            raise CommandError('Provide --username/--password or LOADTEST_USERNAME/LOADTEST_PASSWORD.')
+
+        weights = self._parse_scenarios(options['scenario'])
+
+        try:
+            targets = Targets.from_database()
+        except LoadTestError as exc:
+            raise CommandError(str(exc))
+
+        base_url = options['base_url']
+        server = None
+        if options['start_server']:
+            base_url = f"http://127.0.0.1:{options['port']}"
+            try:
+                server = start_local_server(options['port'], options['workers'])
+            except LoadTestError as exc:
+                raise CommandError(str(exc))
+
+        try:
+            recorder = run_load_test(
+                base_url,
+                options['username'],
+                options['password'],
+                targets,
+                weights=weights,
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                think_time=options['think_time'],
+                seed=options['seed'],
+            )
+        except LoadTestError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        rows = recorder.summary()
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        self._print_table(rows)
+
+    def _parse_scenarios(self, values):
+        if not values:
+            return dict(DEFAULT_WEIGHTS)
+        weights = {}
+        for value in values:
+            name, _, weight = value.partition('=')
+            if name not in SCENARIOS:
+                raise CommandError(f"Unknown scenario '{name}'. Choices: {', '.join(SCENARIOS)}")
+            try:
+                weights[name] = int(weight) if weight else 1
+            except ValueError:
+                raise CommandError(f"Invalid weight in '{value}'")
+        return weights
+
+    def _print_table(self, rows):
+        header = f"{'Endpoint':<50} {'Reqs':>7} {'Err%':>6} {'RPS':>7} {'p50':>8} {'p95':>8} {'p99':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            self.stdout.write(
+                f"{row['endpoint']:<50} {row['requests']:>7} "
+                f"{row['error_rate'] * 100:>5.1f}% {row['throughput_rps']:>7.2f} "
+                f"{row['p50_ms']:>6.0f}ms {row['p95_ms']:>6.0f}ms {row['p99_ms']:>6.0f}ms"
+            )
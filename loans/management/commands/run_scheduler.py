@@ -0,0 +1,35 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from loans.scheduler import Scheduler, fire_due_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue background jobs for due periodic tasks. Any number of schedulers may "
+        "run; on PostgreSQL only the holder of the leader advisory lock fires."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tick', type=int, default=30, help='Seconds between checks for due tasks')
+        parser.add_argument('--once', action='store_true', help='Fire due tasks once and exit (no leader election)')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            jobs = fire_due_tasks()
+            self.stdout.write(f'Queued {len(jobs)} job(s).')
+            return
+
+        stop = threading.Event()
+
+        def request_stop(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        self.stdout.write(f"Scheduler started (tick {options['tick']}s).")
+        Scheduler(tick=options['tick']).run(stop)
+        self.stdout.write(self.style.SUCCESS('Scheduler stopped.'))
@@ -0,0 +1,72 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from loans.jobs import work, worker_name
+
+
+def _worker_main(index, stop, poll_interval, burst):
+    # The parent coordinates shutdown (process managers signal the whole group).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    work(worker_name(index), stop=stop, poll_interval=poll_interval, burst=burst)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the database queue in a pool of worker processes. "
+        "SIGTERM/SIGINT finish the jobs in progress and exit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls of an empty queue')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes must be at least 1')
+
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        stop_requested = []
+
+        def request_stop(signum, frame):
+            # Only flag it here: Event.set() takes a lock the main loop may hold.
+            stop_requested.append(signum)
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        # Children must not inherit the parent's database connections.
+        connections.close_all()
+
+        def start(index):
+            process = context.Process(
+                target=_worker_main,
+                args=(index, stop, options['poll_interval'], options['burst']),
+                name=f'loans-worker-{index}',
+            )
+            process.start()
+            return process
+
+        pool = {index: start(index) for index in range(processes)}
+        self.stdout.write(f'Started {processes} worker process(es).')
+
+        while pool:
+            if stop_requested and not stop.is_set():
+                self.stdout.write('Stopping after the current jobs...')
+                stop.set()
+            for index, process in list(pool.items()):
+                process.join(timeout=0.5)
+                if process.is_alive():
+                    continue
+                del pool[index]
+                if process.exitcode != 0 and not stop.is_set():
+                    self.stderr.write(f'Worker {index} exited with code {process.exitcode}; restarting.')
+                    pool[index] = start(index)
+
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
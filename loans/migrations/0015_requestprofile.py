@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0014_add_invoice_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('query_string', models.TextField(blank=True)),
+                ('username', models.CharField(blank=True, max_length=150)),
+                ('status_code', models.IntegerField(blank=True, null=True)),
+                ('duration_ms', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('query_count', models.IntegerField(default=0)),
+                ('trigger', models.CharField(choices=[('flag', 'Requested by staff'), ('sample', 'Sampled')], max_length=10)),
+                ('summary', models.TextField(blank=True, help_text='Top functions by cumulative time')),
+                ('stats_data', models.BinaryField(help_text='Marshalled pstats data (.prof)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
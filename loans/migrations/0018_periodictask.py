@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+NIGHTLY_TASKS = [
+    {'name': 'nightly-schedule-extension', 'task': 'extend_schedules', 'cron': '0 2 * * *'},
+    {'name': 'nightly-reconciliation', 'task': 'reconcile_balances', 'cron': '30 2 * * *'},
+]
+
+
+def seed_nightly_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model('loans', 'PeriodicTask')
+    for definition in NIGHTLY_TASKS:
+        PeriodicTask.objects.get_or_create(name=definition['name'], defaults=definition)
+
+
+def remove_nightly_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model('loans', 'PeriodicTask')
+    PeriodicTask.objects.filter(name__in=[definition['name'] for definition in NIGHTLY_TASKS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0017_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodicTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('task', models.CharField(help_text='Registered job task name', max_length=100)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('cron', models.CharField(help_text='minute hour day-of-month month day-of-week, in TIME_ZONE', max_length=100)),
+                ('enabled', models.BooleanField(default=True)),
+                ('catch_up', models.CharField(choices=[('latest', 'Run once for missed occurrences'), ('all', 'Run every missed occurrence'), ('skip', 'Skip missed occurrences')], default='latest', max_length=10)),
+                ('last_scheduled_for', models.DateTimeField(blank=True, null=True)),
+                ('next_run_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='scheduled_for',
+            field=models.DateTimeField(blank=True, help_text='Cron occurrence that queued the job', null=True),
+        ),
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='periodic_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='loans.periodictask'),
+        ),
+        migrations.RunPython(seed_nightly_tasks, remove_nightly_tasks),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+SNAPSHOT_TASK = {
+    'name': 'month-end-portfolio-snapshot',
+    'task': 'build_portfolio_snapshot',
+    'cron': '0 3 1 * *',
+}
+
+
+def seed_snapshot_task(apps, schema_editor):
+    PeriodicTask = apps.get_model('loans', 'PeriodicTask')
+    PeriodicTask.objects.get_or_create(name=SNAPSHOT_TASK['name'], defaults=SNAPSHOT_TASK)
+
+
+def remove_snapshot_task(apps, schema_editor):
+    PeriodicTask = apps.get_model('loans', 'PeriodicTask')
+    PeriodicTask.objects.filter(name=SNAPSHOT_TASK['name']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0019_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month_end', models.DateField()),
+                ('card_number', models.CharField(max_length=50)),
+                ('status_code', models.CharField(blank=True, max_length=20)),
+                ('funded_total', models.DecimalField(decimal_places=2, help_text='Advanced amount plus draws to date', max_digits=14)),
+                ('outstanding_principal', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('prepaid_remaining', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('interest_billed', models.DecimalField(decimal_places=2, help_text='Schedule rows charged to date', max_digits=14)),
+                ('interest_received', models.DecimalField(decimal_places=2, help_text='Of those, posted by the month-end', max_digits=14)),
+                ('unpaid_interest', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['month_end', 'card_number'],
+            },
+        ),
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='loan_card',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='loans.loancard'),
+        ),
+        migrations.AddIndex(
+            model_name='portfoliosnapshot',
+            index=models.Index(fields=['loan_card', 'month_end'], name='idx_snapshot_loan_month'),
+        ),
+        migrations.AddConstraint(
+            model_name='portfoliosnapshot',
+            constraint=models.UniqueConstraint(fields=('month_end', 'loan_card'), name='uniq_snapshot_month_loan'),
+        ),
+        migrations.RunPython(seed_snapshot_task, remove_snapshot_task),
+    ]
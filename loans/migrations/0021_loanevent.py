@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0020_portfoliosnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('status', 'Status'), ('rate', 'Interest rate'), ('maturity', 'Maturity date'), ('principal', 'Principal')], max_length=10)),
+                ('effective_date', models.DateField()),
+                ('rate', models.DecimalField(blank=True, decimal_places=4, max_digits=5, null=True)),
+                ('maturity_date', models.DateField(blank=True, null=True)),
+                ('principal', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('note', models.TextField(blank=True)),
+                ('created_by', models.CharField(blank=True, max_length=150)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['effective_date', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='loanevent',
+            name='loan_card',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='loans.loancard'),
+        ),
+        migrations.AddField(
+            model_name='loanevent',
+            name='status',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='loans.loanstatus'),
+        ),
+        migrations.AddIndex(
+            model_name='loanevent',
+            index=models.Index(fields=['loan_card', 'kind', 'effective_date'], name='idx_loanevent_timeline'),
+        ),
+    ]
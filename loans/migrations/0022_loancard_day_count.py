@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0021_loanevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loancard',
+            name='day_count',
+            field=models.CharField(choices=[('act_360', 'Actual/360'), ('act_365', 'Actual/365'), ('30_360', '30/360')], default='30_360', help_text='Day-count convention for daily interest accrual', max_length=10),
+        ),
+    ]
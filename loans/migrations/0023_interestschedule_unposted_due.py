@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0022_loancard_day_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interestschedule',
+            index=models.Index(condition=models.Q(('is_posted', False)), fields=['charge_date'], name='idx_schedule_unposted_due'),
+        ),
+    ]
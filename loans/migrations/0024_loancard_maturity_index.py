@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0023_interestschedule_unposted_due'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loancard',
+            index=models.Index(fields=['maturity_date', 'dynamic_status'], name='idx_loancard_maturity'),
+        ),
+    ]
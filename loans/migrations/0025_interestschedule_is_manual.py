@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0024_loancard_maturity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interestschedule',
+            name='is_manual',
+            field=models.BooleanField(default=False, help_text='Added by hand; schedule generation leaves it alone'),
+        ),
+    ]
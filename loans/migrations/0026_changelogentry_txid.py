@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:39
+
+import loans.models
+from django.db import migrations, models
+
+
+def mark_existing_entries(apps, schema_editor):
+    # Adding the column gave every existing row this migration's transaction
+    # id; 0 puts them before everything written from now on, in id order.
+    if schema_editor.connection.vendor == 'postgresql':
+        apps.get_model('loans', 'ChangeLogEntry').objects.update(txid=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0025_interestschedule_is_manual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changelogentry',
+            name='txid',
+            field=models.BigIntegerField(blank=True, db_default=loans.models.CurrentTransactionId(), editable=False, help_text='Writing transaction (PostgreSQL); the feed is ordered by it', null=True),
+        ),
+        migrations.RunPython(mark_existing_entries, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['txid', 'id'], name='idx_changelog_feed'),
+        ),
+    ]
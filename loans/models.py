@@ -1,6 +1,8 @@
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
 
 class Borrower(models.Model):
@@ -49,6 +51,11 @@ class LoanCard(models.Model):
         ('defaulted', 'Defaulted'),
         ('pending', 'Pending'),
     ]
+    DAY_COUNT_CHOICES = [
+        ('act_360', 'Actual/360'),
+        ('act_365', 'Actual/365'),
+        ('30_360', '30/360'),
+    ]
     
     card_number = models.CharField(max_length=50, unique=True)
     borrower = models.ForeignKey(Borrower, on_delete=models.PROTECT, related_name='loan_cards')
@@ -91,6 +98,12 @@ class LoanCard(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(1)],
         default=Decimal('0.13')
     )
+    day_count = models.CharField(
+        max_length=10,
+        choices=DAY_COUNT_CHOICES,
+        default='30_360',
+        help_text="Day-count convention for daily interest accrual"
+    )
     
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='active')
     dynamic_status = models.ForeignKey('LoanStatus', null=True, blank=True, on_delete=models.SET_NULL, related_name='loans')
@@ -147,6 +160,9 @@ class LoanCard(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['maturity_date', 'dynamic_status'], name='idx_loancard_maturity'),
+        ]
 
 
 class SettlementCharge(models.Model):
@@ -196,6 +212,20 @@ class Draw(models.Model):
     def monthly_interest(self):
         """Calculate monthly interest"""
         return (self.amount * self.interest_rate) / 12
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stored terms, so a save can tell which schedule periods it affects
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
     
     def __str__(self):
         return f"Draw #{self.draw_number} - ${self.amount}"
@@ -234,6 +264,20 @@ class LoanExtension(models.Model):
     reason = models.TextField(blank=True)
     created_date = models.DateTimeField(auto_now_add=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stored months, so a save can tell whether the term got shorter
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
+
     def __str__(self):
         return f"Extension for {self.loan_card.card_number}"
 
@@ -286,25 +330,53 @@ class InterestSchedule(models.Model):
         default='bank',
         help_text="Where the interest payment came from"
     )
+    is_manual = models.BooleanField(
+        default=False,
+        help_text="Added by hand; schedule generation leaves it alone"
+    )
     
     @property
     def effective_amount(self):
         """Return adjusted amount if set, otherwise calculated amount"""
         return self.adjusted_amount if self.adjusted_amount is not None else self.calculated_amount
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot of the stored row so clean() does not need to re-read it
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _stored_values(self):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is not None and 'is_posted' in loaded:
+            return loaded
+        return (
+            InterestSchedule.objects.filter(pk=self.pk)
+            .values(*[field.attname for field in self._meta.concrete_fields])
+            .first()
+        )
+
     def clean(self):
         """Validate that posted records cannot be modified"""
         if self.pk:  # Only check for existing records
-            try:
-                old_instance = InterestSchedule.objects.get(pk=self.pk)
-                if old_instance.is_posted and old_instance != self:
-                    raise ValidationError("Posted interest schedule records cannot be modified.")
-            except InterestSchedule.DoesNotExist:
-                pass  # New record, no validation needed
+            stored = self._stored_values()
+            if stored is None or not stored['is_posted']:
+                return  # New or unposted record, no validation needed
+            changed = any(
+                getattr(self, attname) != value
+                for attname, value in stored.items()
+            )
+            if changed:
+                raise ValidationError("Posted interest schedule records cannot be modified.")
     
     def save(self, *args, **kwargs):
         self.clean()
         super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
     
     def __str__(self):
         period_display = f"Period {self.period_number}" if self.period_type == 'monthly' else "Daily"
@@ -313,6 +385,10 @@ class InterestSchedule(models.Model):
     class Meta:
         ordering = ['loan_card', 'charge_date', 'period_number']
         unique_together = ['loan_card', 'period_type', 'period_number']
+        indexes = [
+            # Aging report and collections queue: unposted rows by due date.
+            models.Index(fields=['charge_date'], name='idx_schedule_unposted_due', condition=models.Q(is_posted=False)),
+        ]
 
 
 class PrepaidInterest(models.Model):
@@ -365,3 +441,270 @@ class LoanStatus(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class RequestProfile(models.Model):
+    """cProfile capture of a single request, taken on demand or by sampling"""
+    TRIGGER_CHOICES = [
+        ('flag', 'Requested by staff'),
+        ('sample', 'Sampled'),
+    ]
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    query_string = models.TextField(blank=True)
+    username = models.CharField(max_length=150, blank=True)
+    status_code = models.IntegerField(null=True, blank=True)
+    duration_ms = models.DecimalField(max_digits=10, decimal_places=2)
+    query_count = models.IntegerField(default=0)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    summary = models.TextField(blank=True, help_text="Top functions by cumulative time")
+    stats_data = models.BinaryField(help_text="Marshalled pstats data (.prof)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms} ms)"
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class CurrentTransactionId(models.Func):
+    """The writing transaction's id on PostgreSQL, NULL elsewhere"""
+    output_field = models.BigIntegerField()
+    allowed_default = True
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return 'NULL', []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return 'pg_current_xact_id()::text::bigint', []
+
+
+class ChangeLogEntry(models.Model):
+    """Append-only record of a write to a loan or one of its child rows"""
+    ACTION_CHOICES = [
+        ('create', 'Created'),
+        ('update', 'Updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    model = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    card_number = models.CharField(max_length=50, db_index=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    fields = models.TextField(blank=True, help_text="Comma-separated changed fields, when known")
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    txid = models.BigIntegerField(
+        null=True, blank=True, editable=False, db_default=CurrentTransactionId(),
+        help_text="Writing transaction (PostgreSQL); the feed is ordered by it",
+    )
+
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.model} {self.object_id} ({self.card_number})"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='idx_changelog_object'),
+            models.Index(fields=['txid', 'id'], name='idx_changelog_feed'),
+        ]
+
+
+class PeriodicTask(models.Model):
+    """Crontab-style definition of a job queued by ``manage.py run_scheduler``"""
+    CATCH_UP_CHOICES = [
+        ('latest', 'Run once for missed occurrences'),
+        ('all', 'Run every missed occurrence'),
+        ('skip', 'Skip missed occurrences'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True)
+    task = models.CharField(max_length=100, help_text="Registered job task name")
+    params = models.JSONField(default=dict, blank=True)
+    cron = models.CharField(max_length=100, help_text="minute hour day-of-month month day-of-week, in TIME_ZONE")
+    enabled = models.BooleanField(default=True)
+    catch_up = models.CharField(max_length=10, choices=CATCH_UP_CHOICES, default='latest')
+    last_scheduled_for = models.DateTimeField(null=True, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.cron})"
+
+    def clean(self):
+        from .scheduler import CronError, CronSchedule
+        try:
+            # Parsing alone accepts expressions such as '0 0 31 2 *' that never fire.
+            CronSchedule(self.cron).next_after(timezone.now())
+        except CronError as exc:
+            raise ValidationError({'cron': str(exc)})
+
+    class Meta:
+        ordering = ['name']
+
+
+class BackgroundJob(models.Model):
+    """Unit of work run outside the request by ``manage.py run_workers``"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    params = models.JSONField(default=dict, blank=True)
+    card_number = models.CharField(max_length=50, blank=True, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time (retry backoff)")
+    locked_until = models.DateTimeField(null=True, blank=True, help_text="Lease of the worker running the job")
+    worker = models.CharField(max_length=100, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.CharField(max_length=150, blank=True)
+    periodic_task = models.ForeignKey(PeriodicTask, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    scheduled_for = models.DateTimeField(null=True, blank=True, help_text="Cron occurrence that queued the job")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.task} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='idx_job_ready'),
+        ]
+
+
+class BackgroundJobRun(models.Model):
+    """Timing of one attempt at a background job"""
+    job = models.ForeignKey(BackgroundJob, on_delete=models.CASCADE, related_name='runs')
+    attempt = models.IntegerField()
+    worker = models.CharField(max_length=100)
+    succeeded = models.BooleanField(default=False)
+    wait_ms = models.DecimalField(max_digits=12, decimal_places=2, help_text="Time between becoming due and being claimed")
+    duration_ms = models.DecimalField(max_digits=12, decimal_places=2)
+    query_count = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Job #{self.job_id} attempt {self.attempt} ({self.duration_ms} ms)"
+
+    class Meta:
+        ordering = ['job', 'attempt']
+
+
+class OutboxMessage(models.Model):
+    """Accounting sync event, written in the same transaction as the change"""
+    KIND_CHOICES = [
+        ('schedule_posted', 'Interest schedule posted'),
+        ('draw_created', 'Draw created'),
+        ('charge_created', 'Settlement charge created'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    card_number = models.CharField(max_length=50, db_index=True)
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    invoice_number = models.CharField(max_length=100, blank=True, help_text="Returned by the accounting system")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.idempotency_key} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='idx_outbox_ready'),
+        ]
+
+
+class PortfolioSnapshot(models.Model):
+    """Per-loan balances as of a month-end, built by loans.snapshots"""
+    month_end = models.DateField()
+    loan_card = models.ForeignKey(LoanCard, on_delete=models.CASCADE, related_name='snapshots')
+    card_number = models.CharField(max_length=50)
+    status_code = models.CharField(max_length=20, blank=True)
+    funded_total = models.DecimalField(max_digits=14, decimal_places=2, help_text="Advanced amount plus draws to date")
+    outstanding_principal = models.DecimalField(max_digits=14, decimal_places=2)
+    prepaid_remaining = models.DecimalField(max_digits=14, decimal_places=2)
+    interest_billed = models.DecimalField(max_digits=14, decimal_places=2, help_text="Schedule rows charged to date")
+    interest_received = models.DecimalField(max_digits=14, decimal_places=2, help_text="Of those, posted by the month-end")
+    unpaid_interest = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.card_number} @ {self.month_end}"
+
+    class Meta:
+        ordering = ['month_end', 'card_number']
+        constraints = [
+            models.UniqueConstraint(fields=['month_end', 'loan_card'], name='uniq_snapshot_month_loan'),
+        ]
+        indexes = [
+            models.Index(fields=['loan_card', 'month_end'], name='idx_snapshot_loan_month'),
+        ]
+
+
+class LoanEvent(models.Model):
+    """Effective-dated change to a loan's terms; rows are never updated"""
+    KIND_CHOICES = [
+        ('status', 'Status'),
+        ('rate', 'Interest rate'),
+        ('maturity', 'Maturity date'),
+        ('principal', 'Principal'),
+    ]
+
+    loan_card = models.ForeignKey(LoanCard, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    effective_date = models.DateField()
+    status = models.ForeignKey(LoanStatus, null=True, blank=True, on_delete=models.PROTECT, related_name='+')
+    rate = models.DecimalField(max_digits=5, decimal_places=4, null=True, blank=True)
+    maturity_date = models.DateField(null=True, blank=True)
+    principal = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    note = models.TextField(blank=True)
+    created_by = models.CharField(max_length=150, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    VALUE_FIELDS = {'status': 'status', 'rate': 'rate', 'maturity': 'maturity_date', 'principal': 'principal'}
+
+    @property
+    def value(self):
+        return getattr(self, self.VALUE_FIELDS[self.kind])
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError("Loan events are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Loan events are append-only.")
+
+    def __str__(self):
+        return f"{self.loan_card.card_number} {self.kind} = {self.value} from {self.effective_date}"
+
+    class Meta:
+        ordering = ['effective_date', 'id']
+        indexes = [
+            models.Index(fields=['loan_card', 'kind', 'effective_date'], name='idx_loanevent_timeline'),
+        ]
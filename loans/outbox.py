@@ -0,0 +1,360 @@
+"""
+Transactional outbox for syncing invoices to the accounting system.
+
+Posting an interest schedule row, creating a draw and adding a settlement
+charge each insert an :class:`~loans.models.OutboxMessage` in the same
+transaction as the change: single-object saves through the ``post_save``
+receivers connected in ``LoansConfig.ready``, bulk paths by calling
+:func:`record_messages` explicitly. The request never talks to the
+accounting system.
+
+``manage.py dispatch_outbox`` runs the :class:`Dispatcher`: it claims due
+messages in batches (``FOR UPDATE SKIP LOCKED``), sends each batch to the
+:class:`AccountingConnector` with a per-message idempotency key so a resent
+message does not create a second invoice, and writes the returned invoice
+numbers back with one UPDATE per model. Rows that already have an invoice
+number keep it. Failures are retried with exponential backoff; when the
+connector reports it is overloaded (HTTP 429/503) the batch is returned
+untouched, the dispatcher pauses for ``Retry-After`` and halves its batch
+size, growing it back as batches succeed.
+"""
+import json
+import logging
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .changes import logged_update
+from .models import Draw, InterestSchedule, LoanCard, OutboxMessage, SettlementCharge
+from .responses import dumps
+from .tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+# kind -> model whose invoice_number is written back
+KIND_MODELS = {
+    'schedule_posted': InterestSchedule,
+    'draw_created': Draw,
+    'charge_created': SettlementCharge,
+}
+MAX_RETRY_SECONDS = 3600
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ----------------------------------------------------------------------
+# Recording
+
+def _customer(loan):
+    return {
+        'card_number': loan.card_number,
+        'borrower': loan.borrower.name,
+        'property_address': loan.property_address,
+    }
+
+
+def _schedule_payload(schedule):
+    return {
+        'period_number': schedule.period_number,
+        'period_type': schedule.period_type,
+        'charge_date': schedule.charge_date,
+        'amount': schedule.effective_amount,
+        'received_date': schedule.received_date,
+        'payment_source': schedule.payment_source,
+    }
+
+
+def _draw_payload(draw):
+    return {
+        'draw_number': draw.draw_number,
+        'draw_date': draw.draw_date,
+        'amount': draw.amount,
+        'interest_rate': draw.interest_rate,
+        'draw_fee': draw.draw_fee,
+        'inspection_fee': draw.inspection_fee,
+    }
+
+
+def _charge_payload(charge):
+    return {
+        'charge_type': charge.charge_type.name,
+        'amount': charge.amount,
+    }
+
+
+PAYLOAD_BUILDERS = {
+    'schedule_posted': _schedule_payload,
+    'draw_created': _draw_payload,
+    'charge_created': _charge_payload,
+}
+
+
+def record_messages(kind, objs):
+    """Queue ``kind`` messages for saved ``objs``; an object already queued
+    for the same kind is skipped. Call inside the writing transaction."""
+    build = PAYLOAD_BUILDERS[kind]
+    loans = LoanCard.objects.select_related('borrower').only(
+        'card_number', 'property_address', 'borrower__name'
+    ).in_bulk({obj.loan_card_id for obj in objs})
+    messages = []
+    for obj in objs:
+        loan = loans[obj.loan_card_id]
+        messages.append(OutboxMessage(
+            kind=kind,
+            object_id=obj.pk,
+            card_number=loan.card_number,
+            idempotency_key=f'{kind}-{obj.pk}',
+            payload={
+                **_customer(loan),
+                **build(obj),
+                'invoice_number': obj.invoice_number or None,
+            },
+        ))
+    OutboxMessage.objects.bulk_create(messages, ignore_conflicts=True)
+    return len(messages)
+
+
+def _on_schedule_save(sender, instance, created, raw=False, **kwargs):
+    if raw or not instance.is_posted:
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if created or not loaded.get('is_posted'):
+        record_messages('schedule_posted', [instance])
+
+
+def _on_create(kind):
+    def receiver(sender, instance, created, raw=False, **kwargs):
+        if created and not raw:
+            record_messages(kind, [instance])
+    return receiver
+
+
+_on_draw_save = _on_create('draw_created')
+_on_charge_save = _on_create('charge_created')
+
+
+def connect_signals():
+    post_save.connect(_on_schedule_save, sender=InterestSchedule, dispatch_uid='outbox.schedule')
+    post_save.connect(_on_draw_save, sender=Draw, dispatch_uid='outbox.draw')
+    post_save.connect(_on_charge_save, sender=SettlementCharge, dispatch_uid='outbox.charge')
+
+
+# ----------------------------------------------------------------------
+# Connector
+
+class ConnectorError(Exception):
+    """The accounting system could not be reached or rejected the batch."""
+
+
+class ConnectorBusy(ConnectorError):
+    """The accounting system asked us to slow down."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AccountingConnector:
+    """POSTs invoice batches as JSON to ``<base_url>/invoices/batch``.
+
+    Request: ``{"invoices": [{"idempotency_key", "kind", "card_number",
+    "payload"}, ...]}``. Response: ``{"results": [{"idempotency_key",
+    "invoice_number"} or {"idempotency_key", "error", "retryable"}, ...]}``.
+    """
+
+    def __init__(self, base_url, token='', timeout=10):
+        self.url = base_url.rstrip('/') + '/invoices/batch'
+        self.token = token
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            _setting('ACCOUNTING_SYNC_URL', ''),
+            token=_setting('ACCOUNTING_SYNC_TOKEN', ''),
+            timeout=_setting('ACCOUNTING_SYNC_TIMEOUT', 10),
+        )
+
+    def send(self, invoices):
+        """Send one batch; returns ``{idempotency_key: result}``."""
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        request = urllib.request.Request(self.url, data=dumps({'invoices': invoices}), headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as exc:
+            if exc.code in (429, 503):
+                retry_after = exc.headers.get('Retry-After', '')
+                raise ConnectorBusy(
+                    f'HTTP {exc.code}',
+                    int(retry_after) if retry_after.isdigit() else 30,
+                ) from exc
+            raise ConnectorError(f'HTTP {exc.code}: {exc.read()[:500]!r}') from exc
+        except (urllib.error.URLError, OSError, ValueError) as exc:
+            raise ConnectorError(str(exc)) from exc
+        return {result.get('idempotency_key'): result for result in body.get('results', [])}
+
+
+# ----------------------------------------------------------------------
+# Dispatching
+
+def retry_delay(attempts):
+    base = _setting('ACCOUNTING_SYNC_RETRY_BASE_SECONDS', 30)
+    return min(base * 2 ** (attempts - 1), MAX_RETRY_SECONDS)
+
+
+def message_record(message):
+    return {
+        'idempotency_key': message.idempotency_key,
+        'kind': message.kind,
+        'card_number': message.card_number,
+        'payload': message.payload,
+    }
+
+
+def write_back_invoice_numbers(sent):
+    """Set ``invoice_number`` from ``{(kind, object_id): number}`` on rows
+    that still have none; one UPDATE per model. Returns rows updated."""
+    updated = 0
+    for kind, model in KIND_MODELS.items():
+        numbers = {object_id: number for (sent_kind, object_id), number in sent.items() if sent_kind == kind and number}
+        if not numbers:
+            continue
+        updated += logged_update(
+            model.objects.filter(pk__in=numbers).filter(Q(invoice_number__isnull=True) | Q(invoice_number='')),
+            invoice_number=Case(
+                *[When(pk=object_id, then=Value(number)) for object_id, number in numbers.items()],
+                output_field=CharField(),
+            ),
+        )
+    return updated
+
+
+class Dispatcher:
+    """Send due outbox messages to ``connector`` in adaptive batches."""
+
+    def __init__(self, connector, batch_size=50, max_attempts=8, lease_seconds=300):
+        self.connector = connector
+        self.max_batch_size = batch_size
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease = timedelta(seconds=lease_seconds)
+        self.paused_until = None
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status='pending', next_attempt_at__lte=now)
+                    | Q(status='sending', locked_until__lt=now)
+                )
+                .order_by('id')[:self.batch_size]
+            )
+            OutboxMessage.objects.filter(pk__in=[message.pk for message in batch]).update(
+                status='sending',
+                attempts=F('attempts') + 1,
+                locked_until=now + self.lease,
+            )
+        for message in batch:
+            message.attempts += 1
+        return batch
+
+    def dispatch_once(self):
+        """Send one batch; returns the number of messages claimed."""
+        if self.paused_until and timezone.now() < self.paused_until:
+            return 0
+        batch = self.claim()
+        if not batch:
+            return 0
+        with span('outbox.dispatch', messages=len(batch)) as dispatch_span:
+            try:
+                results = self.connector.send([message_record(message) for message in batch])
+            except ConnectorBusy as exc:
+                self._back_off(batch, exc.retry_after)
+                dispatch_span.set_attribute('busy', True)
+                return len(batch)
+            except ConnectorError as exc:
+                logger.warning("Outbox batch of %s failed: %s", len(batch), exc)
+                results = {message.idempotency_key: {'error': str(exc), 'retryable': True} for message in batch}
+            sent, failed = self._apply_results(batch, results)
+            dispatch_span.set_attributes(sent=sent, failed=failed)
+        if not failed:
+            self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+        return len(batch)
+
+    def _back_off(self, batch, retry_after):
+        now = timezone.now()
+        self.paused_until = now + timedelta(seconds=retry_after)
+        self.batch_size = max(1, self.batch_size // 2)
+        logger.info("Accounting system busy; pausing %ss, batch size now %s", retry_after, self.batch_size)
+        # Not counted as an attempt: the batch was never processed.
+        OutboxMessage.objects.filter(pk__in=[message.pk for message in batch]).update(
+            status='pending',
+            attempts=F('attempts') - 1,
+            locked_until=None,
+            next_attempt_at=self.paused_until,
+        )
+
+    def _apply_results(self, batch, results):
+        now = timezone.now()
+        sent = {}
+        sent_ids = []
+        failures = []
+        for message in batch:
+            result = results.get(message.idempotency_key) or {'error': 'No result returned', 'retryable': True}
+            if result.get('invoice_number') and not result.get('error'):
+                sent[(message.kind, message.object_id)] = result['invoice_number']
+                sent_ids.append((message.pk, result['invoice_number']))
+            else:
+                failures.append((message, result))
+
+        with transaction.atomic():
+            if sent_ids:
+                OutboxMessage.objects.filter(pk__in=[pk for pk, _ in sent_ids]).update(
+                    status='sent',
+                    sent_at=now,
+                    locked_until=None,
+                    last_error='',
+                    invoice_number=Case(
+                        *[When(pk=pk, then=Value(number)) for pk, number in sent_ids],
+                        output_field=CharField(),
+                    ),
+                )
+                write_back_invoice_numbers(sent)
+            # One UPDATE per distinct outcome (a whole-batch error is one).
+            outcomes = defaultdict(list)
+            for message, result in failures:
+                retry = bool(result.get('retryable', True)) and message.attempts < self.max_attempts
+                error = str(result.get('error', ''))[:2000]
+                outcomes[(retry, message.attempts if retry else 0, error)].append(message.pk)
+            for (retry, attempts, error), ids in outcomes.items():
+                OutboxMessage.objects.filter(pk__in=ids).update(
+                    status='pending' if retry else 'failed',
+                    locked_until=None,
+                    last_error=error,
+                    next_attempt_at=now + timedelta(seconds=retry_delay(attempts)) if retry else now,
+                )
+        return len(sent_ids), len(failures)
+
+    def run(self, stop, poll_interval=2.0):
+        while not stop.is_set():
+            claimed = self.dispatch_once()
+            if claimed < self.batch_size:
+                wait = poll_interval
+                if self.paused_until:
+                    wait = max(wait, (self.paused_until - timezone.now()).total_seconds())
+                stop.wait(wait)
@@ -2,12 +2,23 @@ import logging
 from decimal import Decimal, ROUND_FLOOR
 
 from .models import PrepaidInterest
+from .tracing import span
 
 
 PREPAID_CHARGE_NAME = "Prepaid Interest"
 logger = logging.getLogger(__name__)
 
 
+def prepaid_months_covered(amount, monthly_interest):
+    """Return (whole months covered, remainder) for a prepaid amount."""
+    if not monthly_interest or monthly_interest <= 0:
+        return 0, Decimal('0')
+    months_decimal = amount / monthly_interest
+    months = int(months_decimal.to_integral_value(rounding=ROUND_FLOOR))
+    remainder = (amount - (monthly_interest * Decimal(months))).quantize(Decimal('0.01'))
+    return months, remainder
+
+
 def ensure_prepaid_interest_for_loan(loan_card):
     """Create or update prepaid interest record when the charge exists."""
 
@@ -24,13 +35,8 @@ def ensure_prepaid_interest_for_loan(loan_card):
 
     monthly_interest = loan_card.get_monthly_interest_for_initial()
 
-    months = 0
-    remainder = Decimal('0')
+    months, remainder = prepaid_months_covered(prepaid_charge.amount, monthly_interest)
     if monthly_interest and monthly_interest > 0:
-        months_decimal = prepaid_charge.amount / monthly_interest
-        months = int(months_decimal.to_integral_value(rounding=ROUND_FLOOR))
-        remainder = prepaid_charge.amount - (monthly_interest * Decimal(months))
-        remainder = remainder.quantize(Decimal('0.01'))
         if remainder != Decimal('0.00'):
             logger.warning(
                 "Prepaid interest for loan %s has remainder %s when divided by monthly interest %s.",
@@ -53,10 +59,11 @@ def ensure_prepaid_interest_for_loan(loan_card):
         'monthly_amount': monthly_interest,
     }
 
-    prepaid_record, created = PrepaidInterest.objects.update_or_create(
-        loan_card=loan_card,
-        defaults=defaults,
-    )
+    with span('prepaid.ensure', card_number=loan_card.card_number, months_covered=months):
+        prepaid_record, created = PrepaidInterest.objects.update_or_create(
+            loan_card=loan_card,
+            defaults=defaults,
+        )
 
     if created:
         logger.info(
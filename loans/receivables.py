@@ -0,0 +1,160 @@
+"""
+Unpaid interest receivables.
+
+Unpaid interest is every unposted schedule row charged on or before the
+as-of date, at its effective amount (adjusted when set). :func:`aging_rows`
+groups it per loan or per borrower into days-past-charge buckets with one
+grouped query; the conditional sums are evaluated by the database, which
+reads only unposted rows through the ``idx_schedule_unposted_due`` partial
+index. :func:`collections_queue` lists the same rows one by one with their
+loan, borrower, status and prepaid balance joined in, for posting.
+"""
+import csv
+import io
+from datetime import timedelta
+
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .bulk import ZERO, effective_amount_expression
+from .models import InterestSchedule
+
+
+# (key, label, fewest days past charge, most days past charge or None)
+AGING_BUCKETS = [
+    ('current', '0-30', 0, 30),
+    ('days_31_60', '31-60', 31, 60),
+    ('days_61_90', '61-90', 61, 90),
+    ('days_over_90', '90+', 91, None),
+]
+BUCKET_KEYS = [key for key, _, _, _ in AGING_BUCKETS]
+GROUPINGS = {
+    'loan': ['loan_card__card_number', 'loan_card__borrower__name', 'status_code'],
+    'borrower': ['loan_card__borrower_id', 'loan_card__borrower__name'],
+}
+ROW_NAMES = {
+    'loan_card__card_number': 'card_number',
+    'loan_card__borrower__name': 'borrower',
+    'loan_card__borrower_id': 'borrower_id',
+    'status_code': 'status',
+}
+QUEUE_PAGE_SIZE = 50
+
+
+def unpaid_schedules(as_of):
+    """Unposted schedule rows due on or before ``as_of``."""
+    return InterestSchedule.objects.filter(is_posted=False, charge_date__lte=as_of)
+
+
+def _bucket_sums(as_of):
+    amount = effective_amount_expression()
+    sums = {}
+    for key, _, min_days, max_days in AGING_BUCKETS:
+        in_bucket = Q(charge_date__lte=as_of - timedelta(days=min_days))
+        if max_days is not None:
+            in_bucket &= Q(charge_date__gte=as_of - timedelta(days=max_days))
+        sums[key] = Sum(amount, filter=in_bucket, default=ZERO)
+    return sums
+
+
+def aging_rows(as_of, group_by='loan', status=None):
+    """Per-loan (or per-borrower) unpaid interest by aging bucket, oldest
+    balances first."""
+    fields = GROUPINGS[group_by]
+    queryset = unpaid_schedules(as_of).annotate(
+        status_code=Coalesce(F('loan_card__dynamic_status__code'), F('loan_card__status')),
+    )
+    if status:
+        queryset = queryset.filter(status_code__iexact=status)
+    return (
+        queryset.order_by()
+        .values(*fields)
+        .annotate(
+            periods=Count('id'),
+            oldest_charge_date=Min('charge_date'),
+            total=Sum(effective_amount_expression(), default=ZERO),
+            **_bucket_sums(as_of),
+        )
+        .order_by('oldest_charge_date', *fields)
+    )
+
+
+def aging_record(row):
+    return {ROW_NAMES.get(name, name): value for name, value in row.items()}
+
+
+def aging_totals(as_of, status=None):
+    """Portfolio totals per bucket in one aggregate query."""
+    queryset = unpaid_schedules(as_of)
+    if status:
+        queryset = queryset.annotate(
+            status_code=Coalesce(F('loan_card__dynamic_status__code'), F('loan_card__status')),
+        ).filter(status_code__iexact=status)
+    return queryset.aggregate(
+        periods=Count('id'),
+        total=Sum(effective_amount_expression(), default=ZERO),
+        **_bucket_sums(as_of),
+    )
+
+
+def iter_aging_csv(as_of, group_by='loan', status=None):
+    """Aging rows as CSV text chunks for ``StreamingHttpResponse``."""
+    columns = [ROW_NAMES[name] for name in GROUPINGS[group_by]]
+    columns += ['periods', 'oldest_charge_date', *BUCKET_KEYS, 'total']
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for index, row in enumerate(aging_rows(as_of, group_by, status).iterator(chunk_size=2000)):
+        record = aging_record(row)
+        writer.writerow([record[column] for column in columns])
+        if index % 500 == 499:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def collections_queue(due_by, status=None, search=None):
+    """Unposted rows due on or before ``due_by``, oldest first, annotated
+    with their loan, borrower, status and prepaid balance."""
+    queryset = unpaid_schedules(due_by).annotate(
+        status_code=Coalesce(F('loan_card__dynamic_status__code'), F('loan_card__status')),
+    )
+    if status:
+        queryset = queryset.filter(status_code__iexact=status)
+    if search:
+        queryset = queryset.filter(
+            Q(loan_card__card_number__icontains=search) | Q(loan_card__borrower__name__icontains=search)
+        )
+    return queryset.annotate(
+        amount=effective_amount_expression(),
+        card_number=F('loan_card__card_number'),
+        borrower=F('loan_card__borrower__name'),
+        status_name=F('loan_card__dynamic_status__name'),
+        prepaid_remaining=F('loan_card__prepaid_interest__remaining_balance'),
+    ).order_by('charge_date', 'loan_card__card_number', 'period_number')
+
+
+def queue_page(due_by, status=None, search=None, page=1, page_size=QUEUE_PAGE_SIZE):
+    """One page of :func:`collections_queue` with the queue's row count and
+    total; two queries."""
+    queue = collections_queue(due_by, status, search)
+    summary = queue.order_by().aggregate(count=Count('id'), total=Sum(effective_amount_expression(), default=ZERO))
+    pages = max((summary['count'] + page_size - 1) // page_size, 1)
+    page = min(max(page, 1), pages)
+    rows = list(
+        queue.values(
+            'id', 'period_number', 'charge_date', 'amount', 'card_number', 'borrower',
+            'status_code', 'status_name', 'prepaid_remaining',
+        )[(page - 1) * page_size:page * page_size]
+    )
+    for row in rows:
+        row['days_past_due'] = (due_by - row['charge_date']).days
+    return {
+        'due_by': due_by,
+        'page': page,
+        'pages': pages,
+        'count': summary['count'],
+        'total': summary['total'],
+        'rows': rows,
+    }
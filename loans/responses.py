@@ -0,0 +1,85 @@
+"""
+JSON encoding for API responses.
+
+:func:`dumps` encodes ``Decimal`` (as a string, so no digits are lost),
+``date``, ``datetime`` and ``time`` (ISO 8601) natively, so views can put
+model values straight into payloads instead of converting each one by hand.
+
+The encoder is chosen by the ``JSON_BACKEND`` setting: ``'orjson'`` when the
+optional ``orjson`` package is installed, ``'stdlib'`` for the standard
+library encoder, or ``'auto'`` (the default) for orjson when available.
+Both backends produce the same compact UTF-8 text; payloads orjson cannot
+encode (integers beyond 64 bits) fall back to the standard library.
+"""
+import json
+from datetime import date, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    # date covers datetime; orjson encodes both itself and never gets here.
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+_stdlib_encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def _dumps_stdlib(data):
+    return _stdlib_encoder.encode(data).encode('utf-8')
+
+
+def _dumps_orjson(data):
+    try:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # orjson refuses what the standard library accepts, such as integers
+        # outside the 64-bit range; the stdlib encoder gives the same text.
+        return _dumps_stdlib(data)
+
+
+BACKENDS = {'stdlib': _dumps_stdlib}
+if orjson is not None:
+    BACKENDS['orjson'] = _dumps_orjson
+
+
+def get_backend(name=None):
+    """Return the ``dumps`` function for ``name`` (default: the setting)."""
+    name = name or getattr(settings, 'JSON_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"JSON_BACKEND '{name}' is not available (choices: auto, {', '.join(BACKENDS)})"
+        )
+
+
+def dumps(data, backend=None):
+    """Encode ``data`` as UTF-8 JSON bytes."""
+    return get_backend(backend)(data)
+
+
+class JsonResponse(HttpResponse):
+    """``django.http.JsonResponse`` replacement that encodes with :func:`dumps`."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                'In order to allow non-dict objects to be serialized set the safe parameter to False.'
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,284 @@
+"""
+Monthly interest schedule generation.
+
+Existing schedules are kept current automatically: saving or deleting a
+``Draw`` or ``LoanExtension`` (receivers connected in ``LoansConfig.ready``)
+calls :func:`refresh_schedule` in the writer's transaction, which only
+recomputes the unposted periods from the change's date onward, or only
+appends periods past a new end date. Loans without a schedule are left
+alone until one is generated.
+"""
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+
+from .changes import record_changes, record_objects
+from .events import LoanTimeline
+from .models import Draw, InterestSchedule, LoanCard, LoanExtension
+from .tracing import span
+
+
+CENT = Decimal('0.01')
+
+
+def add_months(source_date, months):
+    """Add months to a date, handling month overflow correctly"""
+    month = source_date.month - 1 + months
+    year = source_date.year + month // 12
+    month = month % 12 + 1
+    day = min(source_date.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def schedule_end_date(loan, total_extension_months=None):
+    """Maturity date (or first loan date + 12 months) plus all extension months.
+
+    Pass ``total_extension_months`` when it is already known to skip the query.
+    """
+    end_date = loan.maturity_date
+    if end_date is None:
+        # If no maturity date set, default to 12 months from first loan date
+        end_date = add_months(loan.first_loan_date, 12)
+
+    # Add extension months to end date
+    if total_extension_months is None:
+        total_extension_months = loan.extensions.aggregate(
+            total=Sum('extension_months')
+        )['total'] or 0
+
+    if total_extension_months > 0:
+        end_date = add_months(end_date, total_extension_months)
+    return end_date
+
+
+def months_between(start, end):
+    """Whole calendar months from ``start``'s month to ``end``'s."""
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def regenerate_interest_schedule(loan, from_date=None, timeline=None, previous_end_date=None):
+    """Create or refresh the unposted monthly periods of a loan's schedule.
+
+    Posted periods are never touched. With ``from_date`` only the periods
+    charged on or after it are recomputed. Rates, principal and accrual
+    stops come from the loan's :class:`~loans.events.LoanTimeline` (pass
+    ``timeline`` if already built). Existing rows and draws are read once
+    and changes are written with one bulk insert and one bulk update of the
+    periods whose date or amount actually changed. When the term was
+    shortened, pass the old end as ``previous_end_date``: the unposted
+    periods generated for the months between the two ends are deleted.
+    Invoices added by hand (``is_manual``) are never changed or deleted; one
+    whose period number the term needs is renumbered past the schedule.
+    Returns the number of newly created periods.
+    """
+    with span('schedule.generate', card_number=loan.card_number):
+        with span('schedule.resolve_term', card_number=loan.card_number) as term_span:
+            end_date = schedule_end_date(loan)
+            term_span.set_attribute('end_date', end_date.isoformat())
+
+        with span('schedule.build_periods', card_number=loan.card_number) as periods_span:
+            # Periods fall on the first of each month from the first loan date.
+            first_period_date = loan.first_loan_date.replace(day=1)
+            skipped = 0
+            if from_date is not None and from_date > first_period_date:
+                skipped = months_between(first_period_date, from_date) + (from_date.day > 1)
+            existing = {}
+            manual = []
+            for schedule in loan.interest_schedules.filter(period_type='monthly', period_number__gt=skipped):
+                if schedule.is_manual:
+                    manual.append(schedule)
+                else:
+                    existing[schedule.period_number] = schedule
+            draws = list(loan.additional_draws.all())
+            timeline = timeline or LoanTimeline(loan)
+
+            current_date = add_months(first_period_date, skipped)
+            period_number = skipped + 1
+            to_create = []
+            to_update = []
+
+            while current_date <= end_date:
+                existing_schedule = existing.get(period_number)
+                if not (existing_schedule and existing_schedule.is_posted):
+                    monthly_interest = Decimal('0')
+                    if timeline.accrues_on(current_date):
+                        # Base interest plus interest from all draws active by this date
+                        monthly_interest = (timeline.principal_on(current_date) * timeline.rate_on(current_date)) / 12
+                        for draw in draws:
+                            if draw.draw_date <= current_date:
+                                monthly_interest += (draw.amount * draw.interest_rate) / 12
+
+                    if existing_schedule:
+                        stored_amount = monthly_interest.quantize(CENT)
+                        if (existing_schedule.charge_date, existing_schedule.calculated_amount) != (current_date, stored_amount):
+                            existing_schedule.charge_date = current_date
+                            existing_schedule.calculated_amount = stored_amount
+                            to_update.append(existing_schedule)
+                    else:
+                        to_create.append(InterestSchedule(
+                            loan_card=loan,
+                            period_number=period_number,
+                            period_type='monthly',
+                            charge_date=current_date,
+                            calculated_amount=monthly_interest,
+                            is_posted=False
+                        ))
+
+                current_date = add_months(current_date, 1)
+                period_number += 1
+            periods_span.set_attributes(periods=period_number - 1 - skipped, skipped=skipped)
+
+            # Invoices added by hand keep their dates and amounts; one sitting
+            # on a period number the term now needs moves past the schedule.
+            needed = {schedule.period_number for schedule in to_create}
+            renumbered = [schedule for schedule in manual if schedule.period_number in needed]
+            next_free = max([period_number - 1, *existing, *(schedule.period_number for schedule in manual)]) + 1
+            for schedule in renumbered:
+                schedule.period_number = next_free
+                next_free += 1
+
+        with span('schedule.write', card_number=loan.card_number) as write_span, transaction.atomic():
+            if renumbered:
+                InterestSchedule.objects.bulk_update(renumbered, ['period_number'])
+                record_objects(renumbered, 'update', ['period_number'])
+            InterestSchedule.objects.bulk_create(to_create)
+            InterestSchedule.objects.bulk_update(to_update, ['charge_date', 'calculated_amount'])
+            record_objects(to_create, 'create')
+            record_objects(to_update, 'update', ['calculated_amount', 'charge_date'])
+            beyond_term = []
+            if previous_end_date is not None and previous_end_date > end_date:
+                beyond_term = list(
+                    loan.interest_schedules.filter(
+                        period_type='monthly',
+                        is_posted=False,
+                        is_manual=False,
+                        period_number__gt=months_between(first_period_date, end_date) + 1,
+                        period_number__lte=months_between(first_period_date, previous_end_date) + 1,
+                    ).values_list('pk', flat=True)
+                )
+            if beyond_term:
+                InterestSchedule.objects.filter(pk__in=beyond_term).delete()
+                record_changes(InterestSchedule, [(pk, loan.card_number) for pk in beyond_term], 'delete')
+            write_span.set_attributes(created=len(to_create), updated=len(to_update), deleted=len(beyond_term))
+    return len(to_create)
+
+
+def refresh_schedule(loan, from_date=None, timeline=None, previous_end_date=None):
+    """Update an existing monthly schedule after a change effective
+    ``from_date``; without one, only periods past the last existing period
+    are added. ``previous_end_date`` is the end before a change that
+    shortened the term (see :func:`regenerate_interest_schedule`). Returns
+    the number of periods created, or None if the loan has no schedule."""
+    last_period_date = (
+        loan.interest_schedules.filter(period_type='monthly', is_manual=False)
+        .order_by('-period_number')
+        .values_list('charge_date', flat=True)
+        .first()
+    )
+    if last_period_date is None:
+        return None
+    if from_date is None:
+        from_date = last_period_date + timedelta(days=1)
+    return regenerate_interest_schedule(
+        loan, from_date=from_date, timeline=timeline, previous_end_date=previous_end_date
+    )
+
+
+def extend_schedules(chunk_size=500):
+    """Append the missing periods to every schedule whose last monthly period
+    falls before the loan's current end date (maturity moved or extensions
+    added since it was generated). Returns the number of loans extended."""
+    last_period = (
+        InterestSchedule.objects.filter(loan_card=OuterRef('pk'), period_type='monthly', is_manual=False)
+        .order_by('-charge_date')
+        .values('charge_date')[:1]
+    )
+    extension_months = (
+        LoanExtension.objects.filter(loan_card=OuterRef('pk'))
+        .order_by()
+        .values('loan_card')
+        .annotate(total=Sum('extension_months'))
+        .values('total')
+    )
+    loans = (
+        LoanCard.objects.annotate(
+            last_period=Subquery(last_period),
+            extension_months=Coalesce(Subquery(extension_months), 0),
+        )
+        .filter(last_period__isnull=False)
+        .order_by('pk')
+    )
+    extended = 0
+    with span('schedule.extend') as extend_span:
+        for loan in loans.iterator(chunk_size=chunk_size):
+            # Periods fall on the first of each month up to the end date.
+            last_due = schedule_end_date(loan, loan.extension_months).replace(day=1)
+            if loan.last_period < last_due:
+                with transaction.atomic():
+                    refresh_schedule(loan)
+                extended += 1
+        extend_span.set_attribute('extended', extended)
+    return extended
+
+
+# ----------------------------------------------------------------------
+# Automatic maintenance
+
+DRAW_TERMS = ('draw_date', 'amount', 'interest_rate')
+
+
+def _draw_value(name, value):
+    # Views may assign form strings; compare as the stored type.
+    return Draw._meta.get_field(name).to_python(value)
+
+
+def _on_draw_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', None)
+    dates = [_draw_value('draw_date', instance.draw_date)]
+    if not created and loaded:
+        if all(_draw_value(name, loaded[name]) == _draw_value(name, getattr(instance, name)) for name in DRAW_TERMS):
+            return
+        dates.append(loaded['draw_date'])
+    refresh_schedule(instance.loan_card, from_date=min(dates))
+
+
+def _loan_deleted(origin):
+    # The whole loan is going; its schedule goes with it.
+    return isinstance(origin, LoanCard) or getattr(origin, 'model', None) is LoanCard
+
+
+def _on_draw_delete(sender, instance, origin=None, **kwargs):
+    if not _loan_deleted(origin):
+        refresh_schedule(instance.loan_card, from_date=_draw_value('draw_date', instance.draw_date))
+
+
+def _on_extension_save(sender, instance, raw=False, **kwargs):
+    # Callers that refresh the schedule themselves set skip_schedule_refresh.
+    if raw or getattr(instance, 'skip_schedule_refresh', False):
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    removed_months = int(loaded.get('extension_months') or 0) - int(instance.extension_months)
+    previous_end_date = None
+    if removed_months > 0:
+        previous_end_date = add_months(schedule_end_date(instance.loan_card), removed_months)
+    refresh_schedule(instance.loan_card, previous_end_date=previous_end_date)
+
+
+def _on_extension_delete(sender, instance, origin=None, **kwargs):
+    if not _loan_deleted(origin):
+        loan = instance.loan_card
+        refresh_schedule(loan, previous_end_date=add_months(schedule_end_date(loan), instance.extension_months))
+
+
+def connect_signals():
+    post_save.connect(_on_draw_save, sender=Draw, dispatch_uid='schedule.draw.save')
+    post_delete.connect(_on_draw_delete, sender=Draw, dispatch_uid='schedule.draw.delete')
+    post_save.connect(_on_extension_save, sender=LoanExtension, dispatch_uid='schedule.extension.save')
+    post_delete.connect(_on_extension_delete, sender=LoanExtension, dispatch_uid='schedule.extension.delete')
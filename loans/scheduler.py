@@ -0,0 +1,241 @@
+"""
+Periodic job scheduling.
+
+:class:`~loans.models.PeriodicTask` rows hold crontab-style definitions
+(``minute hour day-of-month month day-of-week`` in ``TIME_ZONE``). The
+process started by ``manage.py run_scheduler`` queues a background job for
+each occurrence that comes due; ``run_workers`` runs it, so every run's
+timing lands in the job's ``BackgroundJobRun`` history.
+
+Several scheduler processes may run for availability, but only the one
+holding a PostgreSQL session advisory lock fires; the others wait to take
+over. Other backends have no such lock, so run a single scheduler there.
+
+Occurrences missed while no scheduler was running are handled per task:
+``latest`` queues one run, ``all`` queues each missed occurrence (up to
+``MAX_CATCH_UP_RUNS``), ``skip`` only fires occurrences that are less than
+``SCHEDULER_MISFIRE_GRACE_SECONDS`` late.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .jobs import PENDING_STATUSES, TASKS, enqueue
+from .models import PeriodicTask
+from .tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+# pg advisory lock key shared by every scheduler process ('LOANSCHD').
+LEADER_LOCK_KEY = 0x4C4F414E53434844 - (1 << 64)
+MAX_CATCH_UP_RUNS = 100
+# Field name, lowest and highest value, in crontab order.
+CRON_FIELDS = [('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7)]
+SEARCH_LIMIT = timedelta(days=366 * 5)
+
+
+class CronError(ValueError):
+    """The crontab expression cannot be parsed or never matches."""
+
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise CronError(f"Bad step in '{text}'")
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            if not (start_text.isdigit() and end_text.isdigit()):
+                raise CronError(f"Bad range in '{text}'")
+            start, end = int(start_text), int(end_text)
+        elif part.isdigit():
+            start = int(part)
+            end = high if step > 1 else start
+        else:
+            raise CronError(f"Bad value '{part}'")
+        if not low <= start <= end <= high:
+            raise CronError(f"'{text}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """A parsed five-field crontab expression."""
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise CronError('Expected five fields: minute hour day-of-month month day-of-week')
+        parsed = {
+            name: _parse_field(part, low, high)
+            for part, (name, low, high) in zip(parts, CRON_FIELDS)
+        }
+        self.minutes = parsed['minute']
+        self.hours = parsed['hour']
+        self.days = parsed['day']
+        self.months = parsed['month']
+        # Cron counts Sunday as 0 or 7; Python's weekday() has Monday = 0.
+        self.weekdays = {(value - 1) % 7 for value in parsed['weekday']}
+        # When both day fields are restricted, cron matches either of them.
+        self.day_restricted = parts[2] != '*'
+        self.weekday_restricted = parts[4] != '*'
+        self.expression = expression
+
+    def _day_matches(self, moment):
+        day_ok = moment.day in self.days
+        weekday_ok = moment.weekday() in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment):
+        """First matching minute strictly after the aware datetime ``moment``."""
+        tz = timezone.get_default_timezone()
+        local = timezone.localtime(moment, tz).replace(tzinfo=None, second=0, microsecond=0)
+        candidate = local + timedelta(minutes=1)
+        limit = local + SEARCH_LIMIT
+        while candidate <= limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = datetime(candidate.year + year, month + 1, 1)
+            elif not self._day_matches(candidate):
+                candidate = datetime.combine(candidate.date() + timedelta(days=1), datetime.min.time())
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return timezone.make_aware(candidate, tz)
+        raise CronError(f"'{self.expression}' never matches")
+
+    def occurrences(self, start, end, limit=MAX_CATCH_UP_RUNS):
+        """Matching times from ``start`` (inclusive) to ``end`` (inclusive), at most ``limit``."""
+        found = []
+        moment = self.next_after(start - timedelta(minutes=1))
+        while moment <= end and len(found) < limit:
+            found.append(moment)
+            moment = self.next_after(moment)
+        return found
+
+
+def _misfire_grace():
+    return timedelta(seconds=getattr(settings, 'SCHEDULER_MISFIRE_GRACE_SECONDS', 300))
+
+
+def fire_due_tasks(now=None):
+    """Queue jobs for every enabled periodic task that has come due; returns them."""
+    now = now or timezone.now()
+    queued = []
+    with transaction.atomic():
+        due = (
+            PeriodicTask.objects.select_for_update()
+            .filter(enabled=True)
+            .filter(Q(next_run_at__lte=now) | Q(next_run_at__isnull=True))
+        )
+        for periodic in due:
+            try:
+                schedule = CronSchedule(periodic.cron)
+                jobs = _fire(periodic, schedule, now) if periodic.next_run_at is not None else []
+                next_run_at = schedule.next_after(now)
+            except CronError as exc:
+                # A bad row must not stop the other tasks (or crash the loop
+                # every tick); disable it until someone fixes the expression.
+                logger.error("Periodic task %s has a bad cron expression, disabling it: %s", periodic.name, exc)
+                periodic.enabled = False
+                periodic.next_run_at = None
+                periodic.save(update_fields=['enabled', 'next_run_at', 'updated_at'])
+                continue
+            queued.extend(jobs)
+            periodic.next_run_at = next_run_at
+            periodic.save(update_fields=['last_scheduled_for', 'next_run_at', 'updated_at'])
+    return queued
+
+
+def _fire(periodic, schedule, now):
+    missed = schedule.occurrences(periodic.next_run_at, now)
+    if not missed:
+        return []
+    if periodic.catch_up == 'skip':
+        missed = [moment for moment in missed[-1:] if now - moment <= _misfire_grace()]
+    elif periodic.catch_up == 'latest':
+        missed = missed[-1:]
+    periodic.last_scheduled_for = missed[-1] if missed else periodic.last_scheduled_for
+
+    if periodic.task not in TASKS:
+        logger.error("Periodic task %s refers to unknown task '%s'", periodic.name, periodic.task)
+        return []
+    if periodic.catch_up != 'all' and periodic.jobs.filter(status__in=PENDING_STATUSES).exists():
+        logger.warning("Periodic task %s is still running; skipping %s", periodic.name, missed)
+        return []
+
+    jobs = []
+    for moment in missed:
+        jobs.append(enqueue(
+            periodic.task,
+            periodic.params,
+            created_by='scheduler',
+            periodic_task=periodic,
+            scheduled_for=moment,
+        ))
+        logger.info("Queued %s for %s (job %s)", periodic.name, moment.isoformat(), jobs[-1].pk)
+    return jobs
+
+
+class Scheduler:
+    """Leader-elected loop that fires periodic tasks every ``tick`` seconds."""
+
+    def __init__(self, tick=30):
+        self.tick = tick
+        self.is_leader = False
+
+    def acquire_leadership(self):
+        if connection.vendor != 'postgresql':
+            return True
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [LEADER_LOCK_KEY])
+            return cursor.fetchone()[0]
+
+    def check_connection(self):
+        # The lock belongs to the database session; if the connection has
+        # dropped, so has the lock.
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except DatabaseError:
+            connection.close()
+            return False
+
+    def run_once(self):
+        if self.is_leader and not self.check_connection():
+            logger.warning("Scheduler lost its database session; re-electing")
+            self.is_leader = False
+        if not self.is_leader:
+            self.is_leader = self.acquire_leadership()
+            if not self.is_leader:
+                return None
+            logger.info("Scheduler is now the leader")
+        with span('scheduler.tick') as tick_span:
+            queued = fire_due_tasks()
+            tick_span.set_attribute('queued', len(queued))
+        return queued
+
+    def run(self, stop):
+        while not stop.is_set():
+            try:
+                self.run_once()
+            except DatabaseError:
+                logger.exception("Scheduler tick failed")
+                self.is_leader = self.is_leader and self.check_connection()
+            stop.wait(self.tick)
@@ -0,0 +1,144 @@
+"""
+Serializers for the v2 REST API.
+
+Two request parameters shape every response:
+
+* ``?fields=a,b`` keeps only the listed top-level fields (sparse fieldsets).
+* ``?include=draws,charges`` adds related collections; they are absent
+  unless asked for, and the viewset only prefetches what is included.
+"""
+from rest_framework import serializers
+
+from .models import (
+    Borrower,
+    Draw,
+    InterestSchedule,
+    LoanCard,
+    LoanExtension,
+    PrepaidInterest,
+    SettlementCharge,
+)
+
+
+def _csv_param(request, name):
+    if request is None:
+        return set()
+    raw = request.query_params.get(name, '')
+    return {item.strip() for item in raw.split(',') if item.strip()}
+
+
+class SparseFieldsMixin:
+    """Drop fields not named in ``?fields=`` (top level only)."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.root is not self and self.root is not self.parent:
+            return fields
+        requested = _csv_param(self.context.get('request'), 'fields')
+        if requested:
+            for name in list(fields):
+                if name not in requested:
+                    fields.pop(name)
+        return fields
+
+
+class SettlementChargeSerializer(serializers.ModelSerializer):
+    charge_type = serializers.CharField(source='charge_type.name')
+
+    class Meta:
+        model = SettlementCharge
+        fields = ['id', 'charge_type', 'amount', 'invoice_number', 'notes', 'created_at']
+
+
+class DrawSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Draw
+        fields = [
+            'id', 'draw_number', 'draw_date', 'amount', 'interest_rate', 'invoice_number',
+            'draw_fee', 'inspection_fee', 'notes', 'created_at',
+        ]
+
+
+class LoanExtensionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoanExtension
+        fields = ['id', 'extension_months', 'extension_fee', 'has_interest', 'interest_rate', 'reason', 'created_date']
+
+
+class InterestScheduleSerializer(serializers.ModelSerializer):
+    effective_amount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = InterestSchedule
+        fields = [
+            'id', 'period_number', 'period_type', 'charge_date', 'calculated_amount', 'adjusted_amount',
+            'effective_amount', 'is_posted', 'received_date', 'invoice_number', 'posted_at', 'payment_source',
+        ]
+
+
+class PrepaidInterestSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PrepaidInterest
+        fields = ['initial_amount', 'remaining_balance', 'months_covered', 'monthly_amount', 'updated_at']
+
+
+# include name -> (response field, serializer class, many, model relation)
+LOAN_INCLUDES = {
+    'charges': ('settlement_charges', SettlementChargeSerializer, True, 'settlement_charges'),
+    'draws': ('draws', DrawSerializer, True, 'additional_draws'),
+    'extensions': ('extensions', LoanExtensionSerializer, True, 'extensions'),
+    'schedules': ('interest_schedules', InterestScheduleSerializer, True, 'interest_schedules'),
+    'prepaid': ('prepaid_interest', PrepaidInterestSerializer, False, 'prepaid_interest'),
+}
+
+
+def requested_includes(request):
+    return _csv_param(request, 'include') & LOAN_INCLUDES.keys()
+
+
+class LoanCardSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    borrower = serializers.CharField(source='borrower.name')
+    borrower_id = serializers.IntegerField()
+    dynamic_status = serializers.SerializerMethodField()
+    dynamic_status_display = serializers.SerializerMethodField()
+    checkpoint = serializers.DecimalField(
+        source='calculate_checkpoint', max_digits=13, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = LoanCard
+        fields = [
+            'card_number', 'borrower', 'borrower_id', 'property_address',
+            'advanced_loan_amount', 'advanced_loan_invoice', 'first_wired_amount',
+            'total_settlement_charges', 'checkpoint', 'first_loan_date', 'maturity_date',
+            'initial_interest_rate', 'day_count', 'dynamic_status', 'dynamic_status_display',
+            'notes', 'created_at', 'updated_at',
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for include in requested_includes(self.context.get('request')):
+            name, serializer_class, many, relation = LOAN_INCLUDES[include]
+            options = {'many': many, 'read_only': True}
+            if name != relation:
+                options['source'] = relation
+            fields[name] = serializer_class(**options)
+        return fields
+
+    def get_dynamic_status(self, loan):
+        status_obj = loan.dynamic_status
+        return ((status_obj.code or '').strip() or None) if status_obj else None
+
+    def get_dynamic_status_display(self, loan):
+        status_obj = loan.dynamic_status
+        if not status_obj:
+            return 'UNKNOWN'
+        return (status_obj.name or '').strip() or (status_obj.code or '').strip() or 'UNKNOWN'
+
+
+class BorrowerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    loan_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Borrower
+        fields = ['id', 'name', 'email', 'phone', 'address', 'loan_count', 'created_at', 'updated_at']
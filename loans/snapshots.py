@@ -0,0 +1,171 @@
+"""
+Month-end portfolio snapshots.
+
+:func:`build_snapshot` writes one :class:`~loans.models.PortfolioSnapshot`
+row per loan funded by a month-end with a single ``INSERT ... SELECT``: the
+balances are correlated subqueries over draws, schedule rows and prepaid
+records, so the whole portfolio is computed in one pass inside the
+database. Rebuilding a month replaces its rows.
+
+Amounts are as of the month-end: draws dated on or before it, schedule rows
+charged on or before it and postings received on or before it. Status and
+principal come from the loan's event history as of the month-end (the
+current values for loans without history); a closed loan has no
+outstanding principal.
+
+The ``build_portfolio_snapshot`` job runs monthly from the scheduler;
+``manage.py build_snapshots`` backfills a range of months.
+"""
+import calendar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .bulk import effective_amount_expression
+from .models import Draw, InterestSchedule, LoanCard, LoanEvent, PortfolioSnapshot, PrepaidInterest
+from .tracing import span
+
+
+AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=AMOUNT)
+CLOSED_STATUS_CODES = ('closed',)
+TOTAL_FIELDS = [
+    'funded_total',
+    'outstanding_principal',
+    'prepaid_remaining',
+    'interest_billed',
+    'interest_received',
+    'unpaid_interest',
+]
+
+
+def month_end(day):
+    """Last day of ``day``'s month."""
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def previous_month_end(day=None):
+    """The latest month-end strictly before ``day`` (default today)."""
+    day = day or timezone.localdate()
+    return day.replace(day=1) - timedelta(days=1)
+
+
+def month_ends(start, end):
+    """Every month-end from ``start``'s month to ``end``'s, inclusive."""
+    current = month_end(start)
+    found = []
+    while current <= end:
+        found.append(current)
+        current = month_end(current + timedelta(days=1))
+    return found
+
+
+def _sum(queryset, expression):
+    totals = queryset.order_by().values('loan_card').annotate(total=Sum(expression)).values('total')
+    return Coalesce(Subquery(totals, output_field=AMOUNT), ZERO)
+
+
+def snapshot_queryset(as_of):
+    """Loans funded by ``as_of`` annotated with the snapshot columns, in
+    ``PortfolioSnapshot`` column order."""
+    schedules = InterestSchedule.objects.filter(loan_card=OuterRef('pk'), charge_date__lte=as_of)
+    received = schedules.filter(is_posted=True).filter(
+        Q(received_date__lte=as_of) | Q(received_date__isnull=True, posted_at__date__lte=as_of)
+    )
+    prepaid_used = InterestSchedule.objects.filter(
+        loan_card=OuterRef('loan_card'),
+        is_posted=True,
+        payment_source='prepaid',
+        charge_date__lte=as_of,
+    )
+    prepaid_remaining = (
+        PrepaidInterest.objects.filter(loan_card=OuterRef('pk'))
+        .annotate(remaining=Greatest(
+            F('initial_amount') - _sum(prepaid_used, effective_amount_expression()),
+            ZERO,
+        ))
+        .values('remaining')
+    )
+
+    events = LoanEvent.objects.filter(loan_card=OuterRef('pk'), effective_date__lte=as_of).order_by('-effective_date', '-id')
+    status_at = events.filter(kind='status').values('status__code')[:1]
+    principal_at = events.filter(kind='principal').values('principal')[:1]
+
+    funded = ExpressionWrapper(
+        Coalesce(Subquery(principal_at), F('advanced_loan_amount')) + _sum(Draw.objects.filter(loan_card=OuterRef('pk'), draw_date__lte=as_of), 'amount'),
+        output_field=AMOUNT,
+    )
+    billed = _sum(schedules, effective_amount_expression())
+    paid = _sum(received, effective_amount_expression())
+    return (
+        LoanCard.objects.filter(first_loan_date__lte=as_of)
+        .order_by()
+        .annotate(
+            snap_month_end=Value(as_of),
+            snap_loan=F('pk'),
+            snap_card_number=F('card_number'),
+            snap_status_code=Coalesce(Subquery(status_at), F('dynamic_status__code'), F('status')),
+            snap_funded_total=funded,
+            snap_outstanding_principal=Case(
+                When(Q(snap_status_code__in=CLOSED_STATUS_CODES), then=ZERO),
+                default=funded,
+                output_field=AMOUNT,
+            ),
+            snap_prepaid_remaining=Coalesce(Subquery(prepaid_remaining, output_field=AMOUNT), ZERO),
+            snap_interest_billed=billed,
+            snap_interest_received=paid,
+            snap_unpaid_interest=ExpressionWrapper(billed - paid, output_field=AMOUNT),
+            snap_created_at=Value(timezone.now()),
+        )
+        .values_list(
+            'snap_month_end', 'snap_loan', 'snap_card_number', 'snap_status_code',
+            *[f'snap_{name}' for name in TOTAL_FIELDS], 'snap_created_at',
+        )
+    )
+
+
+def build_snapshot(as_of):
+    """Replace the snapshot rows for month-end ``as_of``; returns rows written."""
+    if as_of != month_end(as_of):
+        raise ValueError(f'{as_of} is not a month-end')
+    meta = PortfolioSnapshot._meta
+    columns = ['month_end', 'loan_card_id', 'card_number', 'status_code', *TOTAL_FIELDS, 'created_at']
+    quote = connection.ops.quote_name
+    select_sql, params = snapshot_queryset(as_of).query.sql_with_params()
+    insert_sql = 'INSERT INTO {} ({}) {}'.format(
+        quote(meta.db_table),
+        ', '.join(quote(meta.get_field(name).column) for name in columns),
+        select_sql,
+    )
+    with span('snapshots.build', month_end=as_of.isoformat()) as build_span:
+        with transaction.atomic():
+            PortfolioSnapshot.objects.filter(month_end=as_of).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(insert_sql, params)
+                written = cursor.rowcount
+        build_span.set_attribute('rows', written)
+    return written
+
+
+def available_month_ends():
+    return list(
+        PortfolioSnapshot.objects.order_by('-month_end').values_list('month_end', flat=True).distinct()
+    )
+
+
+def snapshot_summary(as_of):
+    """Portfolio totals and per-status totals for one month-end."""
+    by_status = list(
+        PortfolioSnapshot.objects.filter(month_end=as_of)
+        .order_by('status_code')
+        .values('status_code')
+        .annotate(loans=Count('id'), **{name: Sum(name) for name in TOTAL_FIELDS})
+    )
+    totals = {'loans': sum(row['loans'] for row in by_status)}
+    for name in TOTAL_FIELDS:
+        totals[name] = sum((row[name] for row in by_status), Decimal('0.00'))
+    return {'month_end': as_of, 'totals': totals, 'by_status': by_status}
@@ -1,3 +1,177 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+
+from .accrual import day_count
+from .jobs import claim_next, enqueue
+from .models import BackgroundJob, Borrower, InterestSchedule, LoanCard
+from .receivables import AGING_BUCKETS, aging_totals
+from .schedule import regenerate_interest_schedule
+from .scheduler import CronError, CronSchedule
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+def make_loan(card_number='T-001', **fields):
+    borrower = Borrower.objects.create(name='Test Borrower')
+    values = {
+        'first_loan_date': date(2025, 1, 1),
+        'maturity_date': date(2025, 6, 1),
+        'advanced_loan_amount': Decimal('120000'),
+        'first_wired_amount': Decimal('120000'),
+        'initial_interest_rate': Decimal('0.1000'),
+    }
+    values.update(fields)
+    return LoanCard.objects.create(card_number=card_number, borrower=borrower, **values)
+
+
+class CronScheduleTests(TestCase):
+    def test_next_after_is_strictly_after(self):
+        schedule = CronSchedule('0 2 * * *')
+        self.assertEqual(schedule.next_after(utc(2025, 3, 10, 1, 59)), utc(2025, 3, 10, 2, 0))
+        self.assertEqual(schedule.next_after(utc(2025, 3, 10, 2, 0)), utc(2025, 3, 11, 2, 0))
+
+    def test_next_after_rolls_over_month_and_year(self):
+        schedule = CronSchedule('30 6 1 * *')
+        self.assertEqual(schedule.next_after(utc(2025, 12, 15)), utc(2026, 1, 1, 6, 30))
+
+    def test_steps_and_sunday_as_seven(self):
+        self.assertEqual(CronSchedule('*/15 * * * *').next_after(utc(2025, 3, 10, 8, 16)), utc(2025, 3, 10, 8, 30))
+        # 2025-03-10 is a Monday.
+        self.assertEqual(CronSchedule('0 0 * * 7').next_after(utc(2025, 3, 10)), utc(2025, 3, 16))
+
+    def test_day_and_weekday_match_either(self):
+        # The 20th or any Monday, whichever comes first.
+        schedule = CronSchedule('0 0 20 * 1')
+        self.assertEqual(schedule.next_after(utc(2025, 3, 10)), utc(2025, 3, 17))
+        self.assertEqual(schedule.next_after(utc(2025, 3, 17)), utc(2025, 3, 20))
+
+    def test_occurrences_include_both_ends(self):
+        schedule = CronSchedule('0 * * * *')
+        found = schedule.occurrences(utc(2025, 3, 10, 1), utc(2025, 3, 10, 4))
+        self.assertEqual(found, [utc(2025, 3, 10, hour) for hour in range(1, 5)])
+        self.assertEqual(len(schedule.occurrences(utc(2025, 3, 10), utc(2025, 3, 11), limit=3)), 3)
+
+    def test_invalid_expressions(self):
+        for expression in ['* * * *', '61 * * * *', '*/0 * * * *']:
+            with self.assertRaises(CronError):
+                CronSchedule(expression)
+        with self.assertRaises(CronError):
+            CronSchedule('0 0 31 2 *').next_after(utc(2025, 1, 1))
+
+
+class DayCountTests(TestCase):
+    def test_actual_conventions_count_calendar_days(self):
+        self.assertEqual(day_count(date(2024, 2, 1), date(2024, 3, 1), 'act_360'), 29)
+        self.assertEqual(day_count(date(2025, 1, 1), date(2026, 1, 1), 'act_365'), 365)
+
+    def test_30_360_treats_every_month_as_thirty_days(self):
+        self.assertEqual(day_count(date(2025, 2, 1), date(2025, 3, 1), '30_360'), 30)
+        self.assertEqual(day_count(date(2025, 1, 1), date(2026, 1, 1), '30_360'), 360)
+        # The 31st counts as the 30th only at the start of a period.
+        self.assertEqual(day_count(date(2025, 1, 31), date(2025, 3, 1), '30_360'), 31)
+        self.assertEqual(day_count(date(2025, 3, 15), date(2025, 3, 15), '30_360'), 0)
+
+
+class AgingBucketTests(TestCase):
+    def test_bucket_boundaries(self):
+        loan = make_loan()
+        as_of = date(2025, 12, 31)
+        InterestSchedule.objects.all().delete()
+        for number, days in enumerate([0, 30, 31, 60, 61, 90, 91], start=1):
+            InterestSchedule.objects.create(
+                loan_card=loan, period_number=number, period_type='monthly',
+                charge_date=as_of - timedelta(days=days), calculated_amount=Decimal(days + 1),
+            )
+        # Not yet due: outside every bucket.
+        InterestSchedule.objects.create(
+            loan_card=loan, period_number=8, period_type='monthly',
+            charge_date=as_of + timedelta(days=1), calculated_amount=Decimal('1000'),
+        )
+
+        totals = aging_totals(as_of)
+
+        expected = {'current': 1 + 31, 'days_31_60': 32 + 61, 'days_61_90': 62 + 91, 'days_over_90': 92}
+        for key, _, _, _ in AGING_BUCKETS:
+            self.assertEqual(totals[key], Decimal(expected[key]), key)
+
+
+class RegenerateScheduleTests(TestCase):
+    def setUp(self):
+        self.loan = make_loan()
+        InterestSchedule.objects.filter(loan_card=self.loan).delete()
+        regenerate_interest_schedule(self.loan)
+
+    def periods(self):
+        return dict(self.loan.interest_schedules.values_list('period_number', 'calculated_amount'))
+
+    def test_generates_one_period_per_month(self):
+        self.assertEqual(self.periods(), {number: Decimal('1000.00') for number in range(1, 7)})
+
+    def test_from_date_leaves_earlier_periods_alone(self):
+        InterestSchedule.objects.filter(loan_card=self.loan).update(calculated_amount=Decimal('1'))
+        regenerate_interest_schedule(self.loan, from_date=date(2025, 4, 1))
+        periods = self.periods()
+        self.assertEqual([periods[number] for number in (1, 2, 3)], [Decimal('1.00')] * 3)
+        self.assertEqual([periods[number] for number in (4, 5, 6)], [Decimal('1000.00')] * 3)
+
+    def test_manual_rows_are_kept_and_renumbered(self):
+        self.loan.interest_schedules.filter(period_number__gte=5).delete()
+        manual = InterestSchedule.objects.create(
+            loan_card=self.loan, period_number=5, period_type='monthly', is_manual=True,
+            charge_date=date(2025, 4, 20), calculated_amount=Decimal('42.00'),
+        )
+
+        regenerate_interest_schedule(self.loan, from_date=date(2025, 5, 1))
+
+        manual.refresh_from_db()
+        self.assertEqual((manual.charge_date, manual.calculated_amount), (date(2025, 4, 20), Decimal('42.00')))
+        self.assertEqual(manual.period_number, 7)
+        generated = self.loan.interest_schedules.filter(is_manual=False)
+        self.assertEqual(sorted(generated.values_list('period_number', flat=True)), [1, 2, 3, 4, 5, 6])
+
+
+class ClaimNextTests(TestCase):
+    def test_claims_due_jobs_in_order(self):
+        later = enqueue('extend_schedules', run_after=timezone.now() + timedelta(hours=1))
+        first = enqueue('extend_schedules')
+        second = enqueue('extend_schedules')
+
+        job = claim_next('worker-1')
+        self.assertEqual((job.pk, job.status, job.attempts, job.worker), (first.pk, 'running', 1, 'worker-1'))
+        self.assertIsNotNone(job.locked_until)
+        self.assertEqual(claim_next('worker-1').pk, second.pk)
+        self.assertIsNone(claim_next('worker-1'))
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'queued')
+
+    def test_expired_lease_is_reclaimed(self):
+        job = enqueue('extend_schedules')
+        claim_next('worker-1')
+        BackgroundJob.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        reclaimed = claim_next('worker-2')
+
+        self.assertEqual((reclaimed.pk, reclaimed.worker, reclaimed.attempts), (job.pk, 'worker-2', 2))
+        self.assertGreater(reclaimed.locked_until, timezone.now())
+
+    def test_live_lease_is_not_reclaimed(self):
+        enqueue('extend_schedules')
+        claim_next('worker-1')
+        self.assertIsNone(claim_next('worker-2'))
+
+    def test_expired_lease_on_last_attempt_fails(self):
+        job = enqueue('extend_schedules', max_attempts=1)
+        claim_next('worker-1')
+        BackgroundJob.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNone(claim_next('worker-2'))
 
-# Create your tests here.
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNone(job.locked_until)
+        self.assertIn('worker-1', job.error)
@@ -0,0 +1,312 @@
+"""
+Lightweight tracing spans for latency breakdowns.
+
+Usage::
+
+    with span('search.draws', query=query) as s:
+        rows = list(queryset)
+        s.set_attribute('rows', len(rows))
+
+Spans nest per thread and are handed to a background batch processor that
+writes them to a JSONL file or POSTs them to an OTLP/HTTP collector (JSON
+encoding, e.g. an OpenTelemetry Collector on localhost:4318). When
+``TRACING_EXPORTER`` is empty, ``span()`` returns a shared no-op object.
+"""
+import atexit
+import functools
+import json
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'loan_system'
+
+_local = threading.local()
+_processor = None
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = (
+        'name', 'attributes', 'trace_id', 'span_id', 'parent_id',
+        'start_ns', 'end_ns', 'error', '_processor',
+    )
+
+    def __init__(self, name, attributes, processor):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = None
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = None
+        self.start_ns = None
+        self.end_ns = None
+        self.error = None
+        self._processor = processor
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = _span_stack()
+        if stack:
+            parent = stack[-1]
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        else:
+            self.trace_id = '%032x' % random.getrandbits(128)
+        stack.append(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.error = f'{exc_type.__name__}: {exc}'
+        stack = _span_stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self._processor.on_end(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': {key: _plain(value) for key, value in self.attributes.items()},
+            'error': self.error,
+        }
+
+
+def _plain(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _span_stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def span(name, **attributes):
+    """Start a span; a no-op when tracing export is disabled."""
+    processor = _processor if _configured else _configure()
+    if processor is None:
+        return NOOP_SPAN
+    return Span(name, attributes, processor)
+
+
+def traced(name=None):
+    """Decorator form of :func:`span`."""
+    def decorator(func):
+        span_name = name or f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracedDjangoTemplates(DjangoTemplates):
+    """Django template backend that wraps every render in a span."""
+
+    def get_template(self, template_name):
+        return _TracedTemplate(super().get_template(template_name), template_name)
+
+
+class _TracedTemplate:
+    def __init__(self, template, template_name):
+        self._template = template
+        self._template_name = template_name
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        with span('template.render', template=self._template_name):
+            return self._template.render(context, request)
+
+
+# ----------------------------------------------------------------------
+# Export
+
+class JsonlExporter:
+    """Append one JSON object per span to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, spans):
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            for item in spans:
+                handle.write(json.dumps(item.to_dict()))
+                handle.write('\n')
+
+
+class OtlpHttpExporter:
+    """POST spans to an OTLP/HTTP endpoint using the JSON protobuf mapping."""
+
+    def __init__(self, endpoint, timeout=2):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, spans):
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', SERVICE_NAME)]},
+                'scopeSpans': [{
+                    'scope': {'name': 'loans.tracing'},
+                    'spans': [self._encode(item) for item in spans],
+                }],
+            }],
+        }
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+    @staticmethod
+    def _encode(item):
+        encoded = {
+            'traceId': item.trace_id,
+            'spanId': item.span_id,
+            'name': item.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(item.start_ns),
+            'endTimeUnixNano': str(item.end_ns),
+            'attributes': [_otlp_attribute(key, value) for key, value in item.attributes.items()],
+            'status': {'code': 2, 'message': item.error} if item.error else {'code': 1},
+        }
+        if item.parent_id:
+            encoded['parentSpanId'] = item.parent_id
+        return encoded
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+
+class BatchSpanProcessor:
+    """Buffer finished spans and export them from a daemon thread.
+
+    The buffer is bounded; when the exporter cannot keep up new spans are
+    dropped rather than slowing down requests.
+    """
+
+    def __init__(self, exporter, max_batch_size=256, flush_interval=2.0, max_queue_size=10000):
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.dropped = 0
+        self._queue = deque()
+        self._wakeup = threading.Event()
+        self._export_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def on_end(self, finished):
+        if len(self._queue) >= self.max_queue_size:
+            self.dropped += 1
+            return
+        self._queue.append(finished)
+        if len(self._queue) >= self.max_batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._export_lock:
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.max_batch_size:
+                    batch.append(self._queue.popleft())
+                try:
+                    self.exporter.export(batch)
+                except (OSError, urllib.error.URLError) as exc:
+                    logger.warning('Dropped %s spans: export failed (%s)', len(batch), exc)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+def build_processor(exporter_name):
+    if exporter_name == 'jsonl':
+        exporter = JsonlExporter(getattr(settings, 'TRACING_JSONL_PATH', 'traces.jsonl'))
+    elif exporter_name == 'otlp':
+        exporter = OtlpHttpExporter(
+            getattr(settings, 'TRACING_OTLP_ENDPOINT', 'http://127.0.0.1:4318/v1/traces')
+        )
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER '{exporter_name}' (use 'jsonl' or 'otlp')")
+    return BatchSpanProcessor(
+        exporter,
+        max_batch_size=getattr(settings, 'TRACING_BATCH_SIZE', 256),
+        flush_interval=getattr(settings, 'TRACING_FLUSH_INTERVAL', 2.0),
+    )
+
+
+def _configure():
+    global _processor, _configured
+    with _configure_lock:
+        if not _configured:
+            exporter_name = (getattr(settings, 'TRACING_EXPORTER', '') or '').strip().lower()
+            _processor = build_processor(exporter_name) if exporter_name else None
+            _configured = True
+    return _processor
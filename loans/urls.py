@@ -5,13 +5,30 @@ urlpatterns = [
     # ===== STATIC/SPECIFIC PATHS FIRST (no parameters) =====
     path('loans/', views.loan_list, name='loan_list'),
     path('loans/create/', views.create_loan, name='create_loan'),
+    path('loans/import/', views.import_loans, name='import_loans'),
+    path('loans/export/', views.export_portfolio, name='export_portfolio'),
     path('borrowers/', views.borrower_list, name='borrower_list'),
     path('borrowers/create/', views.create_borrower, name='create_borrower'),
     path('post-interest-schedule/', views.post_interest_schedule, name='post_interest_schedule'),
+    path('collections/', views.collections_queue, name='collections_queue'),
+    path('collections/queue/', views.api_collections_queue, name='api_collections_queue'),  # /api/collections/queue/?due_by=&status=&q=&page=
+    path('maturities/', views.maturity_watchlist, name='maturity_watchlist'),
+    path('maturities/watchlist/', views.api_maturity_watchlist, name='api_maturity_watchlist'),  # /api/maturities/watchlist/?days=30&status=&past=0
+    path('profiles/', views.profile_list, name='profile_list'),
+    path('profiles/<int:profile_id>/download/', views.download_profile, name='download_profile'),
     
     # ===== API SEARCH ENDPOINT =====
     # Note: 'api/' prefix added by main urls.py, so these paths start without 'api/'
     path('loans/search/', views.search_loans, name='search_loans'),  # /api/loans/search/
+    path('loans/batch/', views.api_loan_batch, name='api_loan_batch'),  # /api/loans/batch/?cards=A,B
+    path('jobs/<int:job_id>/', views.api_job_status, name='api_job_status'),  # /api/jobs/42/
+    path('changes/', views.api_changes, name='api_changes'),  # /api/changes/?since=<cursor>
+    path('reports/portfolio/', views.api_portfolio_snapshots, name='api_portfolio_snapshots'),  # /api/reports/portfolio/
+    path('reports/portfolio/<str:month_end>/', views.api_portfolio_snapshot, name='api_portfolio_snapshot'),  # /api/reports/portfolio/2025-06-30/
+    path('reports/portfolio/<str:month_end>/loans/', views.api_portfolio_snapshot_loans, name='api_portfolio_snapshot_loans'),
+    path('reports/accrued-interest/', views.api_accrued_interest, name='api_accrued_interest'),  # ?as_of=&from=
+    path('reports/interest-forecast/', views.api_interest_forecast, name='api_interest_forecast'),  # ?months=24&start=2025-07
+    path('reports/receivables-aging/', views.api_receivables_aging, name='api_receivables_aging'),  # ?as_of=&group=loan|borrower&format=csv
     
     # ===== API DETAIL ENDPOINT =====
     path('loan/<str:card_number>/', views.api_loan_detail, name='api_loan_detail'),  # /api/loan/LC-001/
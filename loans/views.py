@@ -1,18 +1,40 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import transaction
 from django.db.models import Sum, Count
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_http_methods
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from decimal import Decimal, InvalidOperation
 from datetime import datetime, date, timedelta
-import calendar
+import json
 import logging
-from .models import LoanCard, Borrower, SettlementChargeType, SettlementCharge, Draw, InterestSchedule, InterestPayment, LoanStatus, LoanExtension
+from .models import LoanCard, Borrower, SettlementChargeType, SettlementCharge, Draw, InterestSchedule, InterestPayment, LoanStatus, LoanExtension, RequestProfile, BackgroundJob, PortfolioSnapshot
 from .prepaid import ensure_prepaid_interest_for_loan
-from django.db.models import Q, F, Value, CharField
+from .tracing import span
+from .imports import (
+    DrawImporter,
+    ExtensionImporter,
+    ImportFormatError,
+    LoanImporter,
+    detect_format,
+    open_uploaded_file,
+)
+from .schedule import add_months
+from .events import record_event
+from .export import CSV_TABLES, iter_csv, iter_ndjson
+from .changes import DEFAULT_PAGE_SIZE, change_page, entry_record, parse_cursor
+from .responses import JsonResponse
+from .jobs import enqueue, job_record, pending_job
+from .snapshots import TOTAL_FIELDS, available_month_ends, snapshot_summary
+from .accrual import accrual_summary, accrued_interest
+from .forecast import FORECAST_MONTHS, MAX_FORECAST_MONTHS, interest_forecast
+from .watchlist import DEFAULT_WATCH_DAYS, MAX_WATCH_DAYS, maturity_counts, watchlist_page
+from .receivables import AGING_BUCKETS, GROUPINGS as AGING_GROUPINGS, aging_record, aging_rows, aging_totals, iter_aging_csv, queue_page
+from django.db.models import Q, F, Value, CharField, Prefetch
 from django.db.models.functions import Coalesce
 
 
@@ -60,6 +82,7 @@ def loan_list(request):
         'total_loans': total_loans,
         'active_loans': active_loans,
         'total_portfolio': total_portfolio,
+        'maturity_counts': maturity_counts(timezone.localdate()),
     }
     
     return render(request, 'loans/loan_list.html', context)
@@ -112,6 +135,10 @@ def loan_detail(request, card_number):
             'low_balance': low_balance,
         }
 
+    today = timezone.localdate()
+    accrued_to_date = accrued_interest(loan, today)
+    accrued_this_month = accrued_interest(loan, today, start=today.replace(day=1))
+
     context = {
         'loan': loan,
         'total_funded': total_funded,
@@ -126,6 +153,9 @@ def loan_detail(request, card_number):
         'effective_status_display': status_display_code,
         'available_statuses': available_statuses,
         'prepaid_interest': prepaid_context,
+        'accrued_to_date': accrued_to_date,
+        'accrued_this_month': accrued_this_month,
+        'loan_events': loan.events.select_related('status').order_by('-effective_date', '-id'),
     }
 
     return render(request, 'loans/loan_detail.html', context)
@@ -146,42 +176,91 @@ def api_loans(request):
         data.append({
             'card_number': loan.card_number,
             'borrower': loan.borrower.name,
-            'advanced_loan_amount': str(loan.advanced_loan_amount),
+            'advanced_loan_amount': loan.advanced_loan_amount,
             'advanced_loan_invoice': loan.advanced_loan_invoice,
-            'first_wired_amount': str(loan.first_wired_amount),
-            'total_settlement_charges': str(loan.total_settlement_charges),
+            'first_wired_amount': loan.first_wired_amount,
+            'total_settlement_charges': loan.total_settlement_charges,
             'status': status_code_raw.lower() if status_code_raw else None,
             'dynamic_status': status_code_raw or None,
             'dynamic_status_display': status_display,
-            'checkpoint': str(loan.calculate_checkpoint()),
-            'created_at': loan.created_at.isoformat(),
+            'checkpoint': loan.calculate_checkpoint(),
+            'created_at': loan.created_at,
         })
     
     return JsonResponse({'loans': data})
 
-def api_loan_detail(request, card_number):
-    """API endpoint for loan details"""
-    loan = get_object_or_404(LoanCard, card_number=card_number)
-    
+@login_required
+@require_http_methods(["GET"])
+def export_portfolio(request):
+    """Stream every loan with its charges, draws, extensions and schedules"""
+    export_format = request.GET.get('format', 'ndjson')
+    stamp = timezone.localdate().isoformat()
+
+    if export_format == 'csv':
+        table = request.GET.get('table', 'loans')
+        if table not in CSV_TABLES:
+            return JsonResponse(
+                {'error': f"Unknown table '{table}'. Use one of: {', '.join(CSV_TABLES)}"},
+                status=400,
+            )
+        response = StreamingHttpResponse(iter_csv(table), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="portfolio-{table}-{stamp}.csv"'
+    elif export_format == 'ndjson':
+        response = StreamingHttpResponse(iter_ndjson(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="portfolio-{stamp}.ndjson"'
+    else:
+        return JsonResponse({'error': "format must be 'ndjson' or 'csv'"}, status=400)
+
+    logger.info("Portfolio export (%s) started by %s", export_format, request.user.username)
+    return response
+
+@require_http_methods(["GET"])
+def api_changes(request):
+    """Page through the change log after the ``since`` cursor"""
+    try:
+        since = parse_cursor(request.GET.get('since'))
+        limit = int(request.GET.get('limit') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'since must be a cursor from this feed and limit an integer'}, status=400)
+
+    models_param = request.GET.get('models', '')
+    models_filter = [name.strip().lower() for name in models_param.split(',') if name.strip()]
+    entries, next_cursor, has_more = change_page(
+        since=since,
+        limit=limit,
+        models=models_filter or None,
+        card_number=(request.GET.get('card_number') or '').strip() or None,
+    )
+    return JsonResponse({
+        'changes': [entry_record(entry) for entry in entries],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+    })
+
+def loan_detail_data(loan):
+    """Detail payload for one loan; reads related rows through ``.all()`` so
+    callers can prefetch them"""
     # Get settlement charges
     settlement_charges = []
     for charge in loan.settlement_charges.all():
         settlement_charges.append({
             'charge_type': charge.charge_type.name,
-            'amount': str(charge.amount),
+            'amount': charge.amount,
             'notes': charge.notes or '',
             'invoice_number': charge.invoice_number
         })
     
     # Get draws
     draws = []
+    draws_total = Decimal('0')
     for draw in loan.additional_draws.all():
+        draws_total += draw.amount
         draws.append({
             'draw_number': draw.draw_number,
-            'draw_date': draw.draw_date.isoformat(),
-            'amount': str(draw.amount),
-            'interest_rate': str(draw.interest_rate),
-            'monthly_interest': str(draw.monthly_interest)
+            'draw_date': draw.draw_date,
+            'amount': draw.amount,
+            'interest_rate': draw.interest_rate,
+            'monthly_interest': draw.monthly_interest
         })
     
     # Get interest payments
@@ -189,9 +268,9 @@ def api_loan_detail(request, card_number):
     for payment in loan.interest_payments.all():
         interest_payments.append({
             'period_number': payment.period_number,
-            'charge_date': payment.charge_date.isoformat(),
-            'amount': str(payment.amount),
-            'received_date': payment.received_date.isoformat() if payment.received_date else None,
+            'charge_date': payment.charge_date,
+            'amount': payment.amount,
+            'received_date': payment.received_date,
             'is_paid': payment.is_paid
         })
     
@@ -203,7 +282,7 @@ def api_loan_detail(request, card_number):
         display_candidate = (status_obj.name or '').strip()
         status_display = display_candidate or (status_code_raw or 'UNKNOWN')
 
-    data = {
+    return {
         'card_number': loan.card_number,
         'borrower': {
             'name': loan.borrower.name,
@@ -211,28 +290,277 @@ def api_loan_detail(request, card_number):
             'phone': loan.borrower.phone,
         },
         'property_address': loan.property_address,
-        'advanced_loan_amount': str(loan.advanced_loan_amount),
+        'advanced_loan_amount': loan.advanced_loan_amount,
         'advanced_loan_invoice': loan.advanced_loan_invoice,
-        'first_wired_amount': str(loan.first_wired_amount),
-        'total_settlement_charges': str(loan.total_settlement_charges),
-        'first_loan_date': loan.first_loan_date.isoformat(),
-        'maturity_date': loan.maturity_date.isoformat() if loan.maturity_date else None,
-        'initial_interest_rate': str(loan.initial_interest_rate),
+        'first_wired_amount': loan.first_wired_amount,
+        'total_settlement_charges': loan.total_settlement_charges,
+        'first_loan_date': loan.first_loan_date,
+        'maturity_date': loan.maturity_date,
+        'initial_interest_rate': loan.initial_interest_rate,
         'status': status_code_raw.lower() if status_code_raw else None,
         'dynamic_status': status_code_raw or None,
         'dynamic_status_display': status_display,
-        'checkpoint': str(loan.calculate_checkpoint()),
-        'total_funded_amount': str(loan.get_total_funded_amount()),
-        'monthly_interest_initial': str(loan.get_monthly_interest_for_initial()),
+        'checkpoint': loan.calculate_checkpoint(),
+        # Same as get_total_funded_amount(), from the draws already loaded
+        'total_funded_amount': loan.advanced_loan_amount + draws_total,
+        'monthly_interest_initial': loan.get_monthly_interest_for_initial(),
         'settlement_charges': settlement_charges,
         'draws': draws,
         'interest_payments': interest_payments,
-        'created_at': loan.created_at.isoformat(),
-        'updated_at': loan.updated_at.isoformat(),
+        'created_at': loan.created_at,
+        'updated_at': loan.updated_at,
     }
-    
-    return JsonResponse(data)
 
+def loan_detail_queryset():
+    return LoanCard.objects.select_related('borrower', 'dynamic_status').prefetch_related(
+        Prefetch('settlement_charges', queryset=SettlementCharge.objects.select_related('charge_type')),
+        'additional_draws',
+        'interest_payments',
+    )
+
+def api_loan_detail(request, card_number):
+    """API endpoint for loan details"""
+    loan = get_object_or_404(loan_detail_queryset(), card_number=card_number)
+    return JsonResponse(loan_detail_data(loan))
+
+MAX_BATCH_CARDS = 1000
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def api_loan_batch(request):
+    """Loan details for many card numbers at once, keyed by card number.
+
+    GET ``?cards=A,B,C``; POST a JSON body ``{"cards": [...]}`` (or a
+    ``cards`` form field) for long lists. The query count is fixed: one for
+    the loans and one per related table.
+    """
+    if request.method == 'POST' and request.content_type == 'application/json':
+        try:
+            cards = json.loads(request.body or b'{}').get('cards', [])
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Body must be a JSON object with a "cards" list'}, status=400)
+        if not isinstance(cards, list):
+            return JsonResponse({'error': '"cards" must be a list'}, status=400)
+    else:
+        params = request.POST if request.method == 'POST' else request.GET
+        cards = params.get('cards', '').split(',')
+
+    card_numbers = list(dict.fromkeys(str(card).strip() for card in cards if str(card).strip()))
+    if not card_numbers:
+        return JsonResponse({'error': 'Provide at least one card number in "cards"'}, status=400)
+    if len(card_numbers) > MAX_BATCH_CARDS:
+        return JsonResponse({'error': f'At most {MAX_BATCH_CARDS} cards per request'}, status=400)
+
+    with span('api.loan_batch', cards=len(card_numbers)):
+        loans = {
+            loan.card_number: loan
+            for loan in loan_detail_queryset().filter(card_number__in=card_numbers)
+        }
+        results = {}
+        not_found = []
+        for card_number in card_numbers:
+            loan = loans.get(card_number)
+            if loan is None:
+                results[card_number] = {'error': 'not_found'}
+                not_found.append(card_number)
+            else:
+                results[card_number] = loan_detail_data(loan)
+
+    return JsonResponse({'loans': results, 'not_found': not_found})
+
+
+MAX_SNAPSHOT_ROWS = 1000
+
+def _snapshot_month(month_end):
+    try:
+        return date.fromisoformat(month_end)
+    except ValueError:
+        return None
+
+@login_required
+@require_http_methods(["GET"])
+def api_portfolio_snapshots(request):
+    """Month-ends that have a portfolio snapshot, newest first"""
+    return JsonResponse({'month_ends': available_month_ends()})
+
+@login_required
+@require_http_methods(["GET"])
+def api_portfolio_snapshot(request, month_end):
+    """Portfolio totals as of a month-end, overall and per status"""
+    as_of = _snapshot_month(month_end)
+    if as_of is None:
+        return JsonResponse({'error': 'month_end must be YYYY-MM-DD'}, status=400)
+    summary = snapshot_summary(as_of)
+    if not summary['totals']['loans']:
+        return JsonResponse({'error': f'No snapshot for {as_of}'}, status=404)
+    return JsonResponse(summary)
+
+@login_required
+@require_http_methods(["GET"])
+def api_portfolio_snapshot_loans(request, month_end):
+    """Per-loan snapshot rows for a month-end; ``?status=``, ``?offset=``, ``?limit=``"""
+    as_of = _snapshot_month(month_end)
+    if as_of is None:
+        return JsonResponse({'error': 'month_end must be YYYY-MM-DD'}, status=400)
+    try:
+        offset = max(int(request.GET.get('offset') or 0), 0)
+        limit = min(max(int(request.GET.get('limit') or 100), 1), MAX_SNAPSHOT_ROWS)
+    except ValueError:
+        return JsonResponse({'error': 'offset and limit must be integers'}, status=400)
+
+    rows = PortfolioSnapshot.objects.filter(month_end=as_of).order_by('card_number')
+    status = (request.GET.get('status') or '').strip()
+    if status:
+        rows = rows.filter(status_code__iexact=status)
+    page = list(rows.values('card_number', 'status_code', *TOTAL_FIELDS)[offset:offset + limit + 1])
+    return JsonResponse({
+        'month_end': as_of,
+        'loans': page[:limit],
+        'next_offset': offset + limit if len(page) > limit else None,
+    })
+
+@login_required
+@require_http_methods(["GET"])
+def api_accrued_interest(request):
+    """Portfolio interest accrued through ``?as_of=`` (default today), from
+    ``?from=`` (default each loan's first loan date)"""
+    try:
+        as_of = date.fromisoformat(request.GET['as_of']) if request.GET.get('as_of') else timezone.localdate()
+        start = date.fromisoformat(request.GET['from']) if request.GET.get('from') else None
+    except ValueError:
+        return JsonResponse({'error': 'as_of and from must be YYYY-MM-DD'}, status=400)
+    if start and start > as_of:
+        return JsonResponse({'error': 'from must not be after as_of'}, status=400)
+    return JsonResponse(accrual_summary(as_of, start))
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_interest_forecast(request):
+    """Expected interest income per month and status; ``?months=`` (default
+    24) from ``?start=`` (YYYY-MM or YYYY-MM-DD, default this month)"""
+    try:
+        months = int(request.GET.get('months') or FORECAST_MONTHS)
+        start_param = (request.GET.get('start') or '').strip()
+        if len(start_param) == 7:
+            start_param += '-01'
+        start = date.fromisoformat(start_param) if start_param else None
+    except ValueError:
+        return JsonResponse({'error': 'months must be an integer and start YYYY-MM'}, status=400)
+    if not 1 <= months <= MAX_FORECAST_MONTHS:
+        return JsonResponse({'error': f'months must be between 1 and {MAX_FORECAST_MONTHS}'}, status=400)
+    return JsonResponse(interest_forecast(start, months))
+
+@login_required
+@require_http_methods(["GET"])
+def api_receivables_aging(request):
+    """Unpaid interest by days past charge date, per loan or per borrower.
+
+    ``?as_of=`` (default today), ``?group=loan|borrower``, ``?status=``,
+    ``?offset=``/``?limit=``; ``?format=csv`` streams every row.
+    """
+    try:
+        as_of = date.fromisoformat(request.GET['as_of']) if request.GET.get('as_of') else timezone.localdate()
+        offset = max(int(request.GET.get('offset') or 0), 0)
+        limit = min(max(int(request.GET.get('limit') or 100), 1), MAX_SNAPSHOT_ROWS)
+    except ValueError:
+        return JsonResponse({'error': 'as_of must be YYYY-MM-DD; offset and limit integers'}, status=400)
+    group_by = request.GET.get('group') or 'loan'
+    if group_by not in AGING_GROUPINGS:
+        return JsonResponse({'error': "group must be 'loan' or 'borrower'"}, status=400)
+    status = (request.GET.get('status') or '').strip() or None
+
+    if request.GET.get('format') == 'csv':
+        response = StreamingHttpResponse(iter_aging_csv(as_of, group_by, status), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="receivables-aging-{group_by}-{as_of}.csv"'
+        return response
+
+    with span('receivables.aging', as_of=as_of.isoformat(), group=group_by):
+        page = [aging_record(row) for row in aging_rows(as_of, group_by, status)[offset:offset + limit + 1]]
+        totals = aging_totals(as_of, status)
+    return JsonResponse({
+        'as_of': as_of,
+        'group': group_by,
+        'buckets': [{'key': key, 'label': label} for key, label, _, _ in AGING_BUCKETS],
+        'totals': totals,
+        'rows': page[:limit],
+        'next_offset': offset + limit if len(page) > limit else None,
+    })
+
+def _queue_filters(request):
+    """``(due_by, status, search, page)`` from the query string; raises ValueError."""
+    due_by = date.fromisoformat(request.GET['due_by']) if request.GET.get('due_by') else timezone.localdate()
+    status = (request.GET.get('status') or '').strip() or None
+    search = (request.GET.get('q') or '').strip()[:100] or None
+    return due_by, status, search, int(request.GET.get('page') or 1)
+
+@login_required
+@require_http_methods(["GET"])
+def collections_queue(request):
+    """Unposted schedule periods due by a date across all loans, for posting"""
+    try:
+        due_by, status, search, page = _queue_filters(request)
+    except ValueError:
+        messages.error(request, 'Enter a valid due date.')
+        due_by, status, search, page = timezone.localdate(), None, None, 1
+    context = {
+        'queue': queue_page(due_by, status, search, page),
+        'status': status or '',
+        'search': search or '',
+        'available_statuses': LoanStatus.objects.filter(is_active=True).order_by('order', 'name'),
+        'today': timezone.localdate(),
+    }
+    return render(request, 'loans/collections_queue.html', context)
+
+@login_required
+@require_http_methods(["GET"])
+def api_collections_queue(request):
+    """JSON collections queue; ``?due_by=``, ``?status=``, ``?q=``, ``?page=``"""
+    try:
+        due_by, status, search, page = _queue_filters(request)
+    except ValueError:
+        return JsonResponse({'error': 'due_by must be YYYY-MM-DD and page an integer'}, status=400)
+    return JsonResponse(queue_page(due_by, status, search, page))
+
+def _watchlist_filters(request):
+    """``(days, status, include_past, page)`` from the query string; raises ValueError."""
+    days = int(request.GET.get('days') or DEFAULT_WATCH_DAYS)
+    if not 0 <= days <= MAX_WATCH_DAYS:
+        raise ValueError(days)
+    status = (request.GET.get('status') or '').strip() or None
+    include_past = request.GET.get('past', '1') != '0'
+    return days, status, include_past, int(request.GET.get('page') or 1)
+
+@login_required
+@require_http_methods(["GET"])
+def maturity_watchlist(request):
+    """Open loans maturing soon or already past maturity"""
+    try:
+        days, status, include_past, page = _watchlist_filters(request)
+    except ValueError:
+        messages.error(request, f'Days must be a whole number between 0 and {MAX_WATCH_DAYS}.')
+        days, status, include_past, page = DEFAULT_WATCH_DAYS, None, True, 1
+    context = {
+        'watchlist': watchlist_page(timezone.localdate(), days, status, include_past, page),
+        'status': status or '',
+        'include_past': include_past,
+        'available_statuses': LoanStatus.objects.filter(is_active=True).order_by('order', 'name'),
+    }
+    return render(request, 'loans/maturity_watchlist.html', context)
+
+@login_required
+@require_http_methods(["GET"])
+def api_maturity_watchlist(request):
+    """JSON maturity watchlist; ``?days=`` (default 30), ``?status=``, ``?past=0``, ``?page=``"""
+    try:
+        days, status, include_past, page = _watchlist_filters(request)
+    except ValueError:
+        return JsonResponse({'error': f'days must be an integer from 0 to {MAX_WATCH_DAYS} and page an integer'}, status=400)
+    today = timezone.localdate()
+    return JsonResponse({
+        **watchlist_page(today, days, status, include_past, page),
+        'counts': maturity_counts(today, days),
+    })
 
 @login_required
 def search_loans(request):
@@ -267,6 +595,8 @@ def search_loans(request):
     card_matches = LoanCard.objects.filter(
         card_number__icontains=query
     ).select_related('borrower', 'dynamic_status')[:10]
+    with span('search.card_number', query=query) as search_span:
+        search_span.set_attribute('rows', len(card_matches))
     
     for loan in card_matches:
         status_display = 'Unknown'
@@ -290,6 +620,8 @@ def search_loans(request):
     borrower_matches = LoanCard.objects.filter(
         borrower__name__icontains=query
     ).select_related('borrower', 'dynamic_status')[:10]
+    with span('search.borrower_name', query=query) as search_span:
+        search_span.set_attribute('rows', len(borrower_matches))
     
     for loan in borrower_matches:
         # Skip if already added by card number search
@@ -319,6 +651,8 @@ def search_loans(request):
         advanced_loan_invoice__isnull=False,
         advanced_loan_invoice__icontains=query
     ).select_related('borrower', 'dynamic_status')[:10]
+    with span('search.advanced_loan_invoice', query=query) as search_span:
+        search_span.set_attribute('rows', len(loan_invoices))
     
     for loan in loan_invoices:
         status_display = 'Unknown'
@@ -333,8 +667,8 @@ def search_loans(request):
             'status': status_display,
             'detail_url': f'/api/loans/{loan.card_number}/',
             'invoice_number': loan.advanced_loan_invoice,
-            'amount': str(loan.advanced_loan_amount),
-            'date': loan.first_loan_date.isoformat(),
+            'amount': loan.advanced_loan_amount,
+            'date': loan.first_loan_date,
             'context': f'Advanced Loan: ${loan.advanced_loan_amount}',
             'icon': '📄',
             'color': 'purple'
@@ -345,6 +679,8 @@ def search_loans(request):
         invoice_number__isnull=False,
         invoice_number__icontains=query
     ).select_related('loan_card', 'loan_card__borrower', 'loan_card__dynamic_status', 'charge_type')[:20]
+    with span('search.settlement_charges', query=query) as search_span:
+        search_span.set_attribute('rows', len(settlement_invoices))
     
     for charge in settlement_invoices:
         loan = charge.loan_card
@@ -360,8 +696,8 @@ def search_loans(request):
             'status': status_display,
             'detail_url': f'/api/loans/{loan.card_number}/',
             'invoice_number': charge.invoice_number,
-            'amount': str(charge.amount),
-            'date': charge.created_at.date().isoformat(),
+            'amount': charge.amount,
+            'date': charge.created_at.date(),
             'charge_type': charge.charge_type.name,
             'context': f'{charge.charge_type.name}: ${charge.amount}',
             'icon': '💰',
@@ -373,6 +709,8 @@ def search_loans(request):
         invoice_number__isnull=False,
         invoice_number__icontains=query
     ).select_related('loan_card', 'loan_card__borrower', 'loan_card__dynamic_status')[:20]
+    with span('search.draws', query=query) as search_span:
+        search_span.set_attribute('rows', len(draw_invoices))
     
     for draw in draw_invoices:
         loan = draw.loan_card
@@ -388,8 +726,8 @@ def search_loans(request):
             'status': status_display,
             'detail_url': f'/api/loans/{loan.card_number}/',
             'invoice_number': draw.invoice_number,
-            'amount': str(draw.amount),
-            'date': draw.draw_date.isoformat(),
+            'amount': draw.amount,
+            'date': draw.draw_date,
             'charge_type': f'Draw #{draw.draw_number}',
             'context': f'Draw #{draw.draw_number}: ${draw.amount}',
             'icon': '📦',
@@ -402,6 +740,8 @@ def search_loans(request):
         invoice_number__icontains=query,
         is_posted=True
     ).select_related('loan_card', 'loan_card__borrower', 'loan_card__dynamic_status')[:20]
+    with span('search.interest_schedules', query=query) as search_span:
+        search_span.set_attribute('rows', len(interest_schedule_invoices))
     
     for schedule in interest_schedule_invoices:
         loan = schedule.loan_card
@@ -419,8 +759,8 @@ def search_loans(request):
             'status': status_display,
             'detail_url': f'/api/loans/{loan.card_number}/',
             'invoice_number': schedule.invoice_number,
-            'amount': str(amount),
-            'date': schedule.charge_date.isoformat(),
+            'amount': amount,
+            'date': schedule.charge_date,
             'charge_type': f'Period {schedule.period_number}',
             'context': f'Interest Period {schedule.period_number}: ${amount}',
             'icon': '📅',
@@ -432,6 +772,8 @@ def search_loans(request):
         invoice_number__isnull=False,
         invoice_number__icontains=query
     ).select_related('loan_card', 'loan_card__borrower', 'loan_card__dynamic_status')[:20]
+    with span('search.interest_payments', query=query) as search_span:
+        search_span.set_attribute('rows', len(interest_payment_invoices))
     
     for payment in interest_payment_invoices:
         loan = payment.loan_card
@@ -447,8 +789,8 @@ def search_loans(request):
             'status': status_display,
             'detail_url': f'/api/loans/{loan.card_number}/',
             'invoice_number': payment.invoice_number,
-            'amount': str(payment.amount),
-            'date': payment.charge_date.isoformat(),
+            'amount': payment.amount,
+            'date': payment.charge_date,
             'charge_type': 'Interest',
             'context': f'Interest: ${payment.amount}',
             'icon': '🕐',
@@ -478,6 +820,17 @@ def search_loans(request):
     return JsonResponse(response_data)
 
 
+def _effective_date(value):
+    """Parse an optional YYYY-MM-DD effective date; blank means today."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('Enter the effective date as YYYY-MM-DD.')
+
+
 @login_required
 @require_POST
 def change_loan_status(request, card_number):
@@ -505,8 +858,18 @@ def change_loan_status(request, card_number):
         messages.info(request, 'Status unchanged.')
         return redirect('loan_detail', card_number=card_number)
 
-    loan.dynamic_status = status_obj
-    loan.save(update_fields=['dynamic_status', 'updated_at'])
+    try:
+        effective_date = _effective_date(request.POST.get('effective_date'))
+        record_event(
+            loan,
+            'status',
+            status_obj,
+            effective_date=effective_date,
+            created_by=getattr(request.user, 'username', ''),
+        )
+    except ValueError as exc:
+        messages.error(request, str(exc))
+        return redirect('loan_detail', card_number=card_number)
     messages.success(request, f'Loan status updated to {(status_obj.name or status_obj.code).title()} successfully.')
     return redirect('loan_detail', card_number=card_number)
 
@@ -563,33 +926,35 @@ def create_loan(request):
                 messages.error(request, 'Active loan status is not configured. Please contact an administrator.')
                 return redirect('loan_list')
 
-            loan = LoanCard.objects.create(
-                card_number=request.POST.get('card_number'),
-                borrower_id=request.POST.get('borrower'),
-                property_address=request.POST.get('property_address', ''),
-                advanced_loan_amount=advanced,
-                advanced_loan_invoice=advanced_invoice or None,
-                first_wired_amount=first_wired,
-                total_settlement_charges=settlement_total,  # Set it directly
-                first_loan_date=request.POST.get('first_loan_date'),
-                initial_interest_rate=interest_rate_decimal,
-                dynamic_status=active_status
-            )
-            
-            # Create individual settlement charges
-            for charge_type, amount, invoice_number in charges_to_create:
-                SettlementCharge.objects.create(
-                    loan_card=loan,
-                    charge_type=charge_type,
-                    amount=amount,
-                    invoice_number=invoice_number or None
+            # Charges (and their outbox messages) commit with the loan.
+            with transaction.atomic():
+                loan = LoanCard.objects.create(
+                    card_number=request.POST.get('card_number'),
+                    borrower_id=request.POST.get('borrower'),
+                    property_address=request.POST.get('property_address', ''),
+                    advanced_loan_amount=advanced,
+                    advanced_loan_invoice=advanced_invoice or None,
+                    first_wired_amount=first_wired,
+                    total_settlement_charges=settlement_total,  # Set it directly
+                    first_loan_date=request.POST.get('first_loan_date'),
+                    initial_interest_rate=interest_rate_decimal,
+                    dynamic_status=active_status
                 )
-            
-            # Double-check by updating totals
-            loan.update_settlement_charges_total()
 
-            # Auto-create prepaid interest if configured charge exists
-            ensure_prepaid_interest_for_loan(loan)
+                # Create individual settlement charges
+                for charge_type, amount, invoice_number in charges_to_create:
+                    SettlementCharge.objects.create(
+                        loan_card=loan,
+                        charge_type=charge_type,
+                        amount=amount,
+                        invoice_number=invoice_number or None
+                    )
+
+                # Double-check by updating totals
+                loan.update_settlement_charges_total()
+
+                # Auto-create prepaid interest if configured charge exists
+                ensure_prepaid_interest_for_loan(loan)
             
             return redirect('loan_detail', card_number=loan.card_number)
         else:
@@ -614,6 +979,57 @@ def create_loan(request):
     return render(request, 'loans/create_loan.html', context)
 
 
+@login_required
+@require_http_methods(["GET", "POST"])
+def import_loans(request):
+    """Upload a CSV/JSONL file of loans, draws or extensions and bulk-create them"""
+    context = {'report': None, 'kind': request.POST.get('kind') or 'loans'}
+
+    if request.method == 'POST':
+        uploaded = request.FILES.get('file')
+        if not uploaded:
+            messages.error(request, 'Choose a CSV or JSONL file to import.')
+            return render(request, 'loans/import_loans.html', context)
+
+        try:
+            fmt = detect_format(uploaded.name)
+            dry_run = bool(request.POST.get('dry_run'))
+            if context['kind'] == 'draws':
+                importer = DrawImporter(dry_run=dry_run)
+            elif context['kind'] == 'extensions':
+                importer = ExtensionImporter(dry_run=dry_run)
+            else:
+                context['kind'] = 'loans'
+                importer = LoanImporter(
+                    create_borrowers=bool(request.POST.get('create_borrowers')),
+                    dry_run=dry_run,
+                )
+            report = importer.run(open_uploaded_file(uploaded), fmt)
+        except (ImportFormatError, UnicodeDecodeError) as e:
+            messages.error(request, f'Could not read file: {e}')
+            return render(request, 'loans/import_loans.html', context)
+
+        logger.info(
+            "Import (%s) by %s: file=%s rows=%s created=%s rejected=%s dry_run=%s",
+            context['kind'], request.user.username, uploaded.name, report.rows_read,
+            report.created, report.error_count, importer.dry_run,
+        )
+
+        if request.POST.get('report') == 'csv':
+            response = HttpResponse(content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{context["kind"]}-import-errors.csv"'
+            report.write_errors_csv(response)
+            return response
+
+        context.update({
+            'report': report,
+            'dry_run': importer.dry_run,
+            'errors': report.sorted_errors()[:500],
+        })
+
+    return render(request, 'loans/import_loans.html', context)
+
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def edit_loan_details(request, card_number):
@@ -627,11 +1043,14 @@ def edit_loan_details(request, card_number):
         property_address = (request.POST.get('property_address', '') or '').strip()
         notes_input = (request.POST.get('notes', '') or '').strip()
         interest_input = (request.POST.get('annual_interest_rate', '') or '').strip()
+        day_count = (request.POST.get('day_count', '') or '').strip() or loan.day_count
 
         form_data = {
             'property_address': property_address,
             'notes': notes_input,
             'annual_interest_rate': interest_input or rate_to_percent_string(loan.initial_interest_rate),
+            'rate_effective_date': (request.POST.get('rate_effective_date', '') or '').strip(),
+            'day_count': day_count,
         }
 
         errors = []
@@ -647,6 +1066,8 @@ def edit_loan_details(request, card_number):
                     new_interest_decimal = (interest_percent / Decimal('100')).quantize(Decimal('0.0001'))
             except (InvalidOperation, TypeError):
                 errors.append('Enter a valid annual interest rate.')
+        if day_count not in dict(LoanCard.DAY_COUNT_CHOICES):
+            errors.append('Choose a valid day-count convention.')
 
         if errors:
             for error in errors:
@@ -654,33 +1075,46 @@ def edit_loan_details(request, card_number):
             context = {
                 'loan': loan,
                 'form_data': form_data,
+                'day_count_choices': LoanCard.DAY_COUNT_CHOICES,
             }
             return render(request, 'loans/edit_loan_details.html', context)
 
-        notes_to_save = notes_input
         rate_changed = new_interest_decimal != loan.initial_interest_rate
-        if rate_changed:
-            old_rate_percent = (loan.initial_interest_rate * Decimal('100')).quantize(Decimal('0.01'))
-            new_rate_percent = (new_interest_decimal * Decimal('100')).quantize(Decimal('0.01'))
-            timestamp = timezone.now().strftime('%Y-%m-%d %H:%M:%S')
-            change_comment = f"Rate changed from {old_rate_percent}% to {new_rate_percent}% on {timestamp}"
-            notes_to_save = (notes_to_save + '\n\n' if notes_to_save else '') + change_comment
-            logger.info(
-                "Loan %s interest rate changed from %s%% to %s%% by user %s",
-                loan.card_number,
-                old_rate_percent,
-                new_rate_percent,
-                getattr(request.user, 'username', 'anonymous'),
-            )
-
-        loan.property_address = property_address
-        loan.notes = notes_to_save or None
-        loan.initial_interest_rate = new_interest_decimal
-        loan.save(update_fields=['property_address', 'notes', 'initial_interest_rate', 'updated_at'])
+        try:
+            rate_effective_date = _effective_date(request.POST.get('rate_effective_date'))
+        except ValueError as exc:
+            messages.error(request, str(exc))
+            return render(request, 'loans/edit_loan_details.html', {'loan': loan, 'form_data': form_data, 'day_count_choices': LoanCard.DAY_COUNT_CHOICES})
+
+        with transaction.atomic():
+            loan.property_address = property_address
+            loan.notes = notes_input or None
+            loan.day_count = day_count
+            loan.save(update_fields=['property_address', 'notes', 'day_count', 'updated_at'])
+            if rate_changed:
+                try:
+                    record_event(
+                        loan,
+                        'rate',
+                        new_interest_decimal,
+                        effective_date=rate_effective_date,
+                        created_by=getattr(request.user, 'username', ''),
+                    )
+                except ValueError as exc:
+                    transaction.set_rollback(True)
+                    messages.error(request, str(exc))
+                    return render(request, 'loans/edit_loan_details.html', {'loan': loan, 'form_data': form_data, 'day_count_choices': LoanCard.DAY_COUNT_CHOICES})
+                logger.info(
+                    "Loan %s interest rate changed to %s from %s by user %s",
+                    loan.card_number,
+                    new_interest_decimal,
+                    rate_effective_date or timezone.localdate(),
+                    getattr(request.user, 'username', 'anonymous'),
+                )
 
         messages.success(request, 'Loan details updated successfully.')
         if rate_changed:
-            messages.info(request, 'Future interest calculations will use the new rate. Posted payments remain unchanged.')
+            messages.info(request, 'Unposted schedule periods from the effective date use the new rate. Posted payments remain unchanged.')
 
         return redirect('loan_detail', card_number=card_number)
 
@@ -688,11 +1122,14 @@ def edit_loan_details(request, card_number):
         'property_address': loan.property_address or '',
         'notes': loan.notes or '',
         'annual_interest_rate': rate_to_percent_string(loan.initial_interest_rate),
+        'rate_effective_date': '',
+        'day_count': loan.day_count,
     }
 
     context = {
         'loan': loan,
         'form_data': form_data,
+        'day_count_choices': LoanCard.DAY_COUNT_CHOICES,
     }
     return render(request, 'loans/edit_loan_details.html', context)
 
@@ -708,16 +1145,17 @@ def add_draw(request, card_number):
         next_draw_number = (last_draw.draw_number + 1) if last_draw else 2
         
         try:
-            # Create the draw
-            draw = Draw.objects.create(
-                loan_card=loan,
-                draw_number=next_draw_number,
-                draw_date=request.POST.get('draw_date'),
-                amount=Decimal(request.POST.get('amount', '0')),
-                interest_rate=Decimal(request.POST.get('interest_rate', '0.13')),
-                invoice_number=request.POST.get('invoice_number', ''),
-                notes=request.POST.get('notes', '')
-            )
+            # Create the draw (atomic with its outbox message)
+            with transaction.atomic():
+                draw = Draw.objects.create(
+                    loan_card=loan,
+                    draw_number=next_draw_number,
+                    draw_date=request.POST.get('draw_date'),
+                    amount=Decimal(request.POST.get('amount', '0')),
+                    interest_rate=Decimal(request.POST.get('interest_rate', '0.13')),
+                    invoice_number=request.POST.get('invoice_number', ''),
+                    notes=request.POST.get('notes', '')
+                )
             return redirect('loan_detail', card_number=card_number)
         except Exception as e:
             context = {
@@ -803,18 +1241,41 @@ def add_extension(request, card_number):
             }
             return render(request, 'loans/add_extension.html', context)
 
-        LoanExtension.objects.create(
-            loan_card=loan,
-            extension_months=extension_months,
-            extension_fee=extension_fee,
-            has_interest=False,
-            interest_rate=None,
-            reason=form_data['reason']
-        )
+        with transaction.atomic():
+            extension = LoanExtension(
+                loan_card=loan,
+                extension_months=extension_months,
+                extension_fee=extension_fee,
+                has_interest=False,
+                interest_rate=None,
+                reason=form_data['reason']
+            )
+            # The maturity event below refreshes the schedule.
+            extension.skip_schedule_refresh = True
+            extension.save()
 
-        base_date = loan.maturity_date or loan.first_loan_date
-        loan.maturity_date = add_months(base_date, extension_months)
-        loan.save(update_fields=['maturity_date', 'updated_at'])
+            base_date = loan.maturity_date or loan.first_loan_date
+            error = None
+            try:
+                record_event(
+                    loan,
+                    'maturity',
+                    add_months(base_date, extension_months),
+                    created_by=getattr(request.user, 'username', ''),
+                    note=form_data['reason'],
+                )
+            except ValueError as exc:
+                transaction.set_rollback(True)
+                error = str(exc)
+
+        if error:
+            messages.error(request, error)
+            context = {
+                'loan': loan,
+                'existing_extensions': loan.extensions.all().order_by('created_date'),
+                'form_data': form_data,
+            }
+            return render(request, 'loans/add_extension.html', context)
 
         messages.success(
             request,
@@ -856,99 +1317,39 @@ def interest_schedule(request, card_number):
         'loan': loan,
         'schedules': schedules,
         'prepaid_interest': prepaid_context,
+        'schedule_job': pending_job('regenerate_schedule', loan.card_number),
     }
     return render(request, 'loans/interest_schedule.html', context)
 
 
-def add_months(source_date, months):
-    """Add months to a date, handling month overflow correctly"""
-    month = source_date.month - 1 + months
-    year = source_date.year + month // 12
-    month = month % 12 + 1
-    day = min(source_date.day, calendar.monthrange(year, month)[1])
-    return date(year, month, day)
-
-
 @login_required
 def generate_interest_schedule(request, card_number):
-    """Generate monthly interest payment schedule for a loan"""
+    """Queue regeneration of the monthly interest payment schedule for a loan"""
     loan = get_object_or_404(LoanCard, card_number=card_number)
     
     if request.method == 'POST':
-        try:
-            # Calculate the end date (maturity + extensions)
-            end_date = loan.maturity_date
-            if end_date is None:
-                # If no maturity date set, default to 12 months from first loan date
-                end_date = add_months(loan.first_loan_date, 12)
-            
-            # Add extension months to end date
-            total_extension_months = loan.extensions.aggregate(
-                total=Sum('extension_months')
-            )['total'] or 0
-            
-            if total_extension_months > 0:
-                end_date = add_months(end_date, total_extension_months)
-            
-            # Generate monthly schedule from first loan date to end date
-            current_date = loan.first_loan_date.replace(day=1)  # Start from first of the month
-            period_number = 1
-            created_count = 0
-            
-            while current_date <= end_date:
-                # Check if this period already exists and is posted
-                existing_schedule = loan.interest_schedules.filter(
-                    period_type='monthly',
-                    period_number=period_number
-                ).first()
-                
-                if existing_schedule and existing_schedule.is_posted:
-                    # Skip posted records
-                    current_date = add_months(current_date, 1)
-                    period_number += 1
-                    continue
-                
-                # Calculate total monthly interest
-                # Base interest from advanced loan amount
-                monthly_interest = (loan.advanced_loan_amount * loan.initial_interest_rate) / 12
-                
-                # Add interest from all draws that are active by this date
-                for draw in loan.additional_draws.all():
-                    if draw.draw_date <= current_date:
-                        monthly_interest += (draw.amount * draw.interest_rate) / 12
-                
-                # Create or update the schedule record
-                if existing_schedule and not existing_schedule.is_posted:
-                    # Update existing unpposted record
-                    existing_schedule.charge_date = current_date
-                    existing_schedule.calculated_amount = monthly_interest
-                    existing_schedule.save()
-                else:
-                    # Create new record
-                    InterestSchedule.objects.create(
-                        loan_card=loan,
-                        period_number=period_number,
-                        period_type='monthly',
-                        charge_date=current_date,
-                        calculated_amount=monthly_interest,
-                        is_posted=False
-                    )
-                    created_count += 1
-                
-                current_date = add_months(current_date, 1)
-                period_number += 1
-            
-            if created_count > 0:
-                messages.success(request, f'Generated {created_count} new interest schedule periods.')
-            else:
-                messages.info(request, 'Interest schedule already exists or all periods are posted.')
-                
-        except Exception as e:
-            messages.error(request, f'Error generating interest schedule: {str(e)}')
+        if pending_job('regenerate_schedule', loan.card_number):
+            messages.info(request, 'Schedule generation is already in progress.')
+        else:
+            enqueue(
+                'regenerate_schedule',
+                {'card_number': loan.card_number},
+                card_number=loan.card_number,
+                created_by=request.user.username,
+            )
+            messages.info(request, 'Schedule generation queued; this page updates when it finishes.')
     
     return redirect('interest_schedule', card_number=card_number)
 
 
+@login_required
+@require_http_methods(["GET"])
+def api_job_status(request, job_id):
+    """Status of a background job, polled by the UI"""
+    job = get_object_or_404(BackgroundJob.objects.prefetch_related('runs'), pk=job_id)
+    return JsonResponse(job_record(job))
+
+
 @login_required
 @csrf_exempt
 def post_interest_schedule(request):
@@ -997,26 +1398,29 @@ def post_interest_schedule(request):
             amount_to_post = schedule.adjusted_amount if schedule.adjusted_amount is not None else schedule.calculated_amount
             amount_to_post = amount_to_post.quantize(Decimal('0.01')) if amount_to_post is not None else Decimal('0.00')
 
-            if payment_source == 'prepaid':
-                prepaid_record = getattr(schedule.loan_card, 'prepaid_interest', None)
-                if not prepaid_record:
-                    return JsonResponse({'success': False, 'error': 'No prepaid balance available for this loan'}, status=400)
-
-                if amount_to_post > prepaid_record.remaining_balance:
-                    return JsonResponse({'success': False, 'error': 'Insufficient prepaid balance for this payment'}, status=400)
-
-                new_balance = (prepaid_record.remaining_balance - amount_to_post).quantize(Decimal('0.01'))
-                if new_balance < Decimal('0.00'):
-                    new_balance = Decimal('0.00')
-                prepaid_record.remaining_balance = new_balance
-                prepaid_record.save(update_fields=['remaining_balance', 'updated_at'])
-
-            # Mark as posted
-            schedule.is_posted = True
-            schedule.posted_at = timezone.now()
-            schedule.posted_by = 'Admin'  # You might want to use request.user.username if you have authentication
-            schedule.payment_source = payment_source
-            schedule.save()
+            # The prepaid deduction, the posting and its outbox message commit together.
+            with transaction.atomic():
+                if payment_source == 'prepaid':
+                    prepaid_record = getattr(schedule.loan_card, 'prepaid_interest', None)
+                    if not prepaid_record:
+                        return JsonResponse({'success': False, 'error': 'No prepaid balance available for this loan'}, status=400)
+
+                    if amount_to_post > prepaid_record.remaining_balance:
+                        return JsonResponse({'success': False, 'error': 'Insufficient prepaid balance for this payment'}, status=400)
+
+                    new_balance = (prepaid_record.remaining_balance - amount_to_post).quantize(Decimal('0.01'))
+                    if new_balance < Decimal('0.00'):
+                        new_balance = Decimal('0.00')
+                    prepaid_record.remaining_balance = new_balance
+                    with span('schedule.prepaid_deduction', schedule_id=schedule.id, amount=str(amount_to_post)):
+                        prepaid_record.save(update_fields=['remaining_balance', 'updated_at'])
+
+                # Mark as posted
+                schedule.is_posted = True
+                schedule.posted_at = timezone.now()
+                schedule.posted_by = 'Admin'  # You might want to use request.user.username if you have authentication
+                schedule.payment_source = payment_source
+                schedule.save()
             
             return JsonResponse({
                 'success': True, 
@@ -1061,7 +1465,8 @@ def add_interest_invoice(request, card_number):
             period_type='monthly',
             charge_date=request.POST.get('charge_date'),
             calculated_amount=request.POST.get('amount', 0),
-            is_posted=False
+            is_posted=False,
+            is_manual=True,
         )
         return JsonResponse({'success': True, 'id': schedule.id})
     except Exception as e:
@@ -1104,3 +1509,28 @@ def edit_loan_invoices(request, card_number):
         'settlement_charges': loan.settlement_charges.all()
     }
     return render(request, 'loans/edit_invoices.html', context)
+
+
+@staff_member_required
+def profile_list(request):
+    """List stored request profiles (staff only)"""
+    profiles = RequestProfile.objects.defer('stats_data')
+
+    path_filter = (request.GET.get('path', '') or '').strip()
+    if path_filter:
+        profiles = profiles.filter(path__icontains=path_filter)
+
+    context = {
+        'profiles': profiles[:200],
+        'path_filter': path_filter,
+    }
+    return render(request, 'loans/profile_list.html', context)
+
+
+@staff_member_required
+def download_profile(request, profile_id):
+    """Download a profile as a .prof file for pstats/snakeviz"""
+    profile = get_object_or_404(RequestProfile, id=profile_id)
+    response = HttpResponse(bytes(profile.stats_data), content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="request-{profile.id}.prof"'
+    return response
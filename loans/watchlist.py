@@ -0,0 +1,92 @@
+"""
+Maturity watchlist.
+
+Open loans maturing within a window of days, or already past maturity.
+``maturity_date`` already includes extensions (``add_extension`` records a
+maturity event that moves it), so the window is a range scan on the
+``idx_loancard_maturity`` index. Closed loans are left out.
+
+:func:`maturity_counts` feeds the dashboard header and is cached until the
+next logged write (see :func:`~loans.changes.cached_until_change`).
+"""
+from datetime import timedelta
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .changes import cached_until_change
+from .models import LoanCard, LoanExtension
+from .snapshots import CLOSED_STATUS_CODES
+
+
+DEFAULT_WATCH_DAYS = 30
+MAX_WATCH_DAYS = 366
+WATCHLIST_PAGE_SIZE = 50
+
+
+def open_loans():
+    return LoanCard.objects.filter(
+        Q(dynamic_status__isnull=True) | ~Q(dynamic_status__code__in=CLOSED_STATUS_CODES)
+    )
+
+
+def watchlist(today, days=DEFAULT_WATCH_DAYS, status=None, include_past=True):
+    """Open loans maturing by ``today + days`` (from ``today`` unless
+    ``include_past``), soonest first."""
+    loans = open_loans().filter(maturity_date__lte=today + timedelta(days=days))
+    if not include_past:
+        loans = loans.filter(maturity_date__gte=today)
+    if status:
+        loans = loans.filter(dynamic_status__code__iexact=status)
+    extension_months = (
+        LoanExtension.objects.filter(loan_card=OuterRef('pk'))
+        .order_by()
+        .values('loan_card')
+        .annotate(total=Sum('extension_months'))
+        .values('total')
+    )
+    return (
+        loans.annotate(
+            borrower_name=F('borrower__name'),
+            status_code=Coalesce(F('dynamic_status__code'), F('status')),
+            status_name=F('dynamic_status__name'),
+            extension_months=Coalesce(Subquery(extension_months), 0),
+        )
+        .order_by('maturity_date', 'card_number')
+    )
+
+
+def watchlist_page(today, days=DEFAULT_WATCH_DAYS, status=None, include_past=True, page=1, page_size=WATCHLIST_PAGE_SIZE):
+    loans = watchlist(today, days, status, include_past)
+    count = loans.count()
+    pages = max((count + page_size - 1) // page_size, 1)
+    page = min(max(page, 1), pages)
+    rows = list(
+        loans.values(
+            'card_number', 'borrower_name', 'status_code', 'status_name', 'maturity_date',
+            'advanced_loan_amount', 'initial_interest_rate', 'extension_months',
+        )[(page - 1) * page_size:page * page_size]
+    )
+    for row in rows:
+        row['days_to_maturity'] = (row['maturity_date'] - today).days
+        row['rate_percent'] = row['initial_interest_rate'] * 100
+    return {
+        'as_of': today,
+        'days': days,
+        'page': page,
+        'pages': pages,
+        'count': count,
+        'rows': rows,
+    }
+
+
+def maturity_counts(today, days=DEFAULT_WATCH_DAYS):
+    """``{'past_maturity', 'maturing', 'days'}`` for open loans; cached."""
+    def compute():
+        counts = open_loans().aggregate(
+            past_maturity=Count('id', filter=Q(maturity_date__lt=today)),
+            maturing=Count('id', filter=Q(maturity_date__gte=today, maturity_date__lte=today + timedelta(days=days))),
+        )
+        return {**counts, 'days': days}
+
+    return cached_until_change(f'maturity-counts:{today.isoformat()}:{days}', compute)